@@ -0,0 +1,6 @@
+"""
+PlatformIO builder scripts for the PIC 8-bit platform
+
+``main.py`` and the scripts under ``frameworks/`` are executed by SCons.
+The ``core`` subpackage holds the importable helpers they share.
+"""
@@ -0,0 +1,124 @@
+"""
+Shared build helpers for the PIC 8-bit frameworks
+
+⚠️  UNOFFICIAL PLATFORM - NOT SUPPORTED BY MICROCHIP ⚠️
+
+The framework scripts (``pic-xc8.py``, ``arduino.py``) are executed by SCons
+and cannot import each other, so everything they have in common lives here.
+``builder/main.py`` puts the platform directory on ``sys.path`` before the
+framework script is loaded.
+"""
+
+from .arduino_core import (
+    build_core_archive,
+    ensure_pin_map,
+    link_arduino_core,
+    pin_map,
+)
+from .banking import analyze_banking
+from .board_index import (
+    BoardFit,
+    FirmwareUsage,
+    build_board_index,
+    find_fitting_boards,
+    load_board_index,
+)
+from .cache import platform_cache_dir, write_atomic
+from .callgraph import StackReport, analyze_stack, build_call_graph
+from .device_header import ensure_device_header
+from .hex_patch import (
+    HexPatch,
+    HexPatchError,
+    advance_counters,
+    parse_hex_patches,
+    write_patched_firmware,
+)
+from .hexfile import HexFormatError, HexImage, memory_regions
+from .hosttest import discover_tests, run_host_tests
+from .lut import LutGeneratorError, generate_luts
+from .pipeline import (
+    BuildContext,
+    FrameworkConfig,
+    Pipeline,
+    default_pipeline,
+    make_build_action,
+)
+from .runtime_routines import analyze_runtime_routines, check_runtime_routines
+from .sfr import Register, load_device_registers, register_source
+from .size_report import SizeHistory, build_size_report, diff_size_reports
+from .stubs import ensure_device_stubs
+from .sweep import make_sweep_action, run_sweep
+from .templates import (
+    render_pic_includes,
+    render_template,
+    template_environment,
+    write_if_changed,
+)
+from .tokenized_log import LogDecoder, LogFormatError, tokenize_logs
+from .toolchain import (
+    XC8Toolchain,
+    find_xc8_toolchain,
+    normalize_device,
+    transpiler_include_paths,
+)
+from .xc8_outputs import Symbol, XC8Outputs
+
+__all__ = [
+    "advance_counters",
+    "analyze_banking",
+    "analyze_runtime_routines",
+    "analyze_stack",
+    "BoardFit",
+    "build_board_index",
+    "build_call_graph",
+    "build_core_archive",
+    "build_size_report",
+    "BuildContext",
+    "check_runtime_routines",
+    "default_pipeline",
+    "diff_size_reports",
+    "discover_tests",
+    "ensure_device_header",
+    "ensure_device_stubs",
+    "ensure_pin_map",
+    "find_fitting_boards",
+    "find_xc8_toolchain",
+    "FirmwareUsage",
+    "FrameworkConfig",
+    "generate_luts",
+    "HexFormatError",
+    "HexImage",
+    "HexPatch",
+    "HexPatchError",
+    "link_arduino_core",
+    "load_board_index",
+    "load_device_registers",
+    "LogDecoder",
+    "LogFormatError",
+    "LutGeneratorError",
+    "make_build_action",
+    "make_sweep_action",
+    "memory_regions",
+    "normalize_device",
+    "parse_hex_patches",
+    "pin_map",
+    "Pipeline",
+    "platform_cache_dir",
+    "Register",
+    "register_source",
+    "render_pic_includes",
+    "render_template",
+    "run_host_tests",
+    "run_sweep",
+    "SizeHistory",
+    "StackReport",
+    "Symbol",
+    "template_environment",
+    "tokenize_logs",
+    "transpiler_include_paths",
+    "write_atomic",
+    "write_if_changed",
+    "write_patched_firmware",
+    "XC8Outputs",
+    "XC8Toolchain",
+]
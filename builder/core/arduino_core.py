@@ -0,0 +1,313 @@
+"""
+Precompiled Arduino core library
+
+The Arduino framework links a small C core (``pinMode``, ``digitalWrite``,
+``millis``, ``delay``...) from ``builder/frameworks/arduino_core``. Its
+timing depends on ``_XTAL_FREQ`` and its registers on the part, so it is
+compiled with ``xc8-cc -c`` once per MCU, F_CPU, optimization flags and XC8
+version and archived with ``xc8-ar`` into ``libarduino.a`` under the
+platform cache, shared by every project. XC8 only links the library modules
+a program references.
+
+The pin map of the part (``pins_arduino.h``) is generated from its SFR
+layout: ``PIN_<name>`` numbers, the implemented pins of every port and
+``digitalWriteFast()``-style macros whose constant-pin expansion is a
+single ``BSF``/``BCF`` on the port latch.
+
+``Serial`` is interrupt driven: received bytes and bytes to send wait in
+ring buffers sized from the RAM of the part, so writes never block
+``loop()``.
+"""
+
+import hashlib
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .sfr import Register, read_registers, register_source
+from .templates import TEMPLATES_DIR, render_template, write_if_changed
+from .toolchain import XC8Toolchain, normalize_device
+from .xc8 import optimization_arguments
+
+CORE_DIR = Path(__file__).resolve().parent.parent / "frameworks" / "arduino_core"
+ARCHIVE_NAME = "libarduino.a"
+PINS_TEMPLATE = "pins_arduino.h.j2"
+PINS_HEADER = "pins_arduino.h"
+
+# Port letters in pin number order: pin = index * 8 + bit
+_PORTS = "ABCDE"
+
+# Serial ring buffers: powers of two (index wrap by masking), byte indices
+SERIAL_BUFFER_MIN = 8
+SERIAL_BUFFER_MAX = 64
+
+
+def core_sources() -> List[Path]:
+    return sorted(CORE_DIR.glob("*.c"))
+
+
+def _field_at(register: Register, bit: int) -> Optional[str]:
+    position = 0
+    for name, width in register.fields:
+        if position == bit and width == 1:
+            return name
+        position += width
+    return None
+
+
+def pin_map(registers: List[Register]) -> List[Dict]:
+    """Return the implemented I/O pins of a part, in pin number order.
+
+    A pin exists when its bit of ``PORTx`` is a named field (every bit of
+    registers without field information). Outputs go to ``LATx`` when the
+    part has one.
+    """
+    by_name = {register.name: register for register in registers}
+    pins = []
+    for index, letter in enumerate(_PORTS):
+        port = by_name.get(f"PORT{letter}")
+        if port is None:
+            continue
+        latch = f"LAT{letter}" if f"LAT{letter}" in by_name else f"PORT{letter}"
+        tris = f"TRIS{letter}" if f"TRIS{letter}" in by_name else None
+        for bit in range(8):
+            field = _field_at(port, bit)
+            if port.fields and field is None:
+                continue
+            name = field if field and field.startswith("R") else f"R{letter}{bit}"
+            pins.append(
+                {
+                    "name": name,
+                    "number": index * 8 + bit,
+                    "mask": 1 << bit,
+                    "port": f"PORT{letter}",
+                    "latch": latch,
+                    "tris": tris,
+                }
+            )
+    return pins
+
+
+def serial_pins(registers: List[Register]) -> Optional[Tuple[str, int]]:
+    """Return the TRIS register and mask of the USART TX and RX pins."""
+    for register in registers:
+        if not register.name.startswith("PORT"):
+            continue
+        tris = "TRIS" + register.name[4:]
+        tx, rx = register.bit("TX"), register.bit("RX")
+        if tx is not None and rx is not None:
+            if any(r.name == tris for r in registers):
+                return tris, (1 << tx) | (1 << rx)
+    return None
+
+
+def ensure_pin_map(
+    device: str,
+    toolchain: Optional[XC8Toolchain],
+    cache_root: Path,
+    data_dir: Optional[Path] = None,
+) -> Optional[Path]:
+    """Return the directory of the generated ``pins_arduino.h`` of a part.
+
+    Returns:
+        None if the SFR layout is unknown (the generic header of the core
+        is used instead)
+    """
+    source = register_source(device, toolchain, data_dir)
+    if source is None:
+        return None
+
+    device = normalize_device(device)
+    digest = hashlib.sha1(str(source.resolve()).encode("utf-8")).hexdigest()[:8]
+    header = Path(cache_root) / "arduino-core" / "pins" / f"pic{device}_{digest}"
+    header = header / PINS_HEADER
+
+    template_path = TEMPLATES_DIR / PINS_TEMPLATE
+    newest_input = max(source.stat().st_mtime, template_path.stat().st_mtime)
+    if header.is_file() and header.stat().st_mtime >= newest_input:
+        return header.parent
+
+    registers = read_registers(source)
+    pins = pin_map(registers)
+    if not pins:
+        return None
+    serial = serial_pins(registers)
+    port_masks = [0] * len(_PORTS)
+    for pin in pins:
+        port_masks[pin["number"] >> 3] |= pin["mask"]
+    content = render_template(
+        PINS_TEMPLATE,
+        device_upper=device.upper(),
+        source_name=source.name,
+        pins=pins,
+        port_masks=[f"0x{mask:02X}" for mask in port_masks],
+        serial_tris=serial[0] if serial else None,
+        serial_mask=f"0x{serial[1]:02X}" if serial else None,
+    )
+    if not write_if_changed(header, content):
+        header.touch()
+    return header.parent
+
+
+def serial_buffer_size(ram_bytes: int) -> int:
+    """Default size of each Serial buffer: about 1/16 of the part's RAM."""
+    size = SERIAL_BUFFER_MIN
+    while size * 2 <= min(ram_bytes // 16, SERIAL_BUFFER_MAX):
+        size *= 2
+    return size
+
+
+def _serial_defines(ctx) -> Optional[List[str]]:
+    default = serial_buffer_size(
+        int(ctx.env.BoardConfig().get("upload.maximum_ram_size", 368))
+    )
+    defines = []
+    for direction in ("rx", "tx"):
+        option = f"custom_serial_{direction}_buffer"
+        value = ctx.project_option(option, default)
+        try:
+            size = int(value)
+        except (TypeError, ValueError):
+            size = 0
+        if size < 2 or size > 128 or size & (size - 1):
+            print(
+                f"[ARDUINO] ❌ {option} must be a power of two from 2 to 128: {value}"
+            )
+            return None
+        defines.append(f"SERIAL_{direction.upper()}_BUFFER_SIZE={size}")
+    return defines
+
+
+def _cache_key(
+    toolchain: XC8Toolchain, flags: List[str], pins_dir: Optional[Path]
+) -> str:
+    compiler = toolchain.tool("xc8-cc")
+    try:
+        stamp = str(compiler.stat().st_mtime_ns)
+    except OSError:
+        stamp = "0"
+    digest = hashlib.sha1("\n".join(flags + [str(compiler), stamp]).encode("utf-8"))
+    inputs = sorted(CORE_DIR.glob("*.[ch]"))
+    if pins_dir is not None:
+        inputs.append(pins_dir / PINS_HEADER)
+    for path in inputs:
+        digest.update(path.name.encode("utf-8"))
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:12]
+
+
+def _run(cmd: List[str], cwd: str) -> bool:
+    try:
+        result = subprocess.run(cmd, cwd=cwd, capture_output=True, text=True)
+    except OSError as e:
+        print(f"[ARDUINO] Could not run {Path(cmd[0]).name}: {e}")
+        return False
+    if result.returncode != 0:
+        print(f"[ARDUINO] {Path(cmd[0]).name} failed: {result.stderr.strip()}")
+        return False
+    return True
+
+
+def build_core_archive(
+    toolchain: XC8Toolchain,
+    device: str,
+    f_cpu: str,
+    cache_root: Path,
+    flags: Optional[List[str]] = None,
+    pins_dir: Optional[Path] = None,
+) -> Optional[Path]:
+    """Return the cached core archive for a part, building it if needed.
+
+    Args:
+        toolchain: XC8 installation compiling the core
+        device: Value of ``build.mcu``
+        f_cpu: Clock frequency in Hz, without suffix
+        cache_root: Platform cache directory
+        flags: Extra compiler flags (optimization level)
+        pins_dir: Directory of the generated ``pins_arduino.h``
+
+    Returns:
+        Path of ``libarduino.a``, or None if it could not be built
+    """
+    device = normalize_device(device)
+    cflags = [f"-mcpu={device}", f"-D_XTAL_FREQ={f_cpu}", *(flags or [])]
+    if pins_dir is not None:
+        cflags.append(f"-I{pins_dir}")
+    archive_dir = (
+        Path(cache_root)
+        / "arduino-core"
+        / f"xc8-{toolchain.version}"
+        / f"{device}-{f_cpu}-{_cache_key(toolchain, cflags, pins_dir)}"
+    )
+    archive = archive_dir / ARCHIVE_NAME
+    if archive.is_file():
+        return archive
+
+    print(f"[ARDUINO] Compiling the Arduino core for {device.upper()} @ {f_cpu} Hz")
+    with tempfile.TemporaryDirectory(prefix="pic8bit-core-") as tmp:
+        objects = []
+        for source in core_sources():
+            obj = Path(tmp) / f"{source.stem}.p1"
+            cmd = [str(toolchain.tool("xc8-cc")), *cflags, f"-I{CORE_DIR}"]
+            if not _run(cmd + ["-c", str(source), "-o", str(obj)], tmp):
+                return None
+            objects.append(str(obj))
+
+        built = Path(tmp) / ARCHIVE_NAME
+        if not _run([str(toolchain.tool("xc8-ar")), "-r", str(built), *objects], tmp):
+            return None
+        # Move into place in one step so concurrent builds never see half of it
+        archive_dir.mkdir(parents=True, exist_ok=True)
+        staged = archive_dir / f".{ARCHIVE_NAME}.{Path(tmp).name}"
+        shutil.copy2(built, staged)
+        staged.replace(archive)
+    return archive
+
+
+def link_arduino_core(ctx) -> bool:
+    """Core stage: put the Arduino core on the include path and link it
+
+    ``custom_arduino_core = no`` leaves it out (for sketches that define
+    their own interrupt function). The Serial buffer sizes follow the RAM
+    of the board unless ``custom_serial_rx_buffer`` and
+    ``custom_serial_tx_buffer`` set them. Without an XC8 installation to
+    build the archive, the core sources are compiled with the project
+    instead.
+    """
+    enabled = str(ctx.project_option("custom_arduino_core", "yes")).lower()
+    if enabled in ("no", "false", "0", "off"):
+        return True
+
+    defines = _serial_defines(ctx)
+    if defines is None:
+        return False
+    ctx.defines.extend(defines)
+
+    # The generated pin map shadows the generic one of the core
+    pins_dir = ensure_pin_map(ctx.device, ctx.toolchain, ctx.cache_dir)
+    if pins_dir is not None:
+        ctx.include_dirs.append(str(pins_dir))
+    else:
+        print("[ARDUINO] ⚠️  SFR layout unknown - generic pin map, no fast macros")
+    ctx.include_dirs.append(str(CORE_DIR))
+    ctx.results["arduino_core"] = True
+    archive = None
+    if ctx.toolchain is not None:
+        archive = build_core_archive(
+            ctx.toolchain,
+            ctx.device,
+            ctx.clean_f_cpu,
+            ctx.cache_dir,
+            optimization_arguments(ctx) + [f"-D{define}" for define in defines],
+            pins_dir,
+        )
+    if archive is None:
+        print("[ARDUINO] ⚠️  No core archive - building the core with the project")
+        ctx.libraries.extend(str(source) for source in core_sources())
+        return True
+
+    print(f"[ARDUINO] Linking core library: {archive}")
+    ctx.libraries.append(str(archive))
+    return True
@@ -0,0 +1,265 @@
+"""
+RAM bank switching overhead of a link
+
+PIC16 data memory is banked: before touching a register outside the current
+bank the code selects another one, with ``BSF``/``BCF STATUS,RP0/RP1`` on
+mid-range parts (``FSR`` bits on baseline parts, ``MOVLB`` on enhanced
+cores). Each selection is a program word and a cycle, and in a loop mixing
+variables of different banks they often cost more than the work itself.
+
+The listing gives every selection, the function it is in and the register
+accessed right after it: the selections are counted per function (and inside
+loops, found from backward jumps), charged to the variables causing them, and
+the pairs of variables the code keeps switching between are suggested to be
+placed in the same bank (``__bank(n)``).
+"""
+
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .xc8_outputs import XC8Outputs, c_name
+
+# Assembly operand naming a variable, its function's locals (??_) or
+# parameters (?_)
+_OPERAND_RE = re.compile(r"\?{0,2}_[A-Za-z]\w*")
+# INDF, PCL, STATUS, FSR, PCLATH and INTCON of mid-range parts
+_CORE_REGISTERS = {0x00, 0x02, 0x03, 0x04, 0x0A, 0x0B}
+
+
+class _Core:
+    """Bank layout and encodings of an instruction set."""
+
+    def __init__(self, baseline: bool):
+        self.baseline = baseline
+        # Bank size, register holding the bank select bits, those bits
+        if baseline:
+            self.bank_size, self.select_register = 0x20, 0x04  # FSR
+            self.select_bits: Tuple[int, ...] = (5, 6, 7)
+        else:
+            self.bank_size, self.select_register = 0x80, 0x03  # STATUS RP0/RP1
+            self.select_bits = (5, 6)
+        self.all_bits = (1 << len(self.select_bits)) - 1
+
+    def select(self, opcode: int, bank: List[int]) -> bool:
+        """Apply a bank selection to ``bank`` (``[known bits, value]``).
+
+        Returns:
+            False if ``opcode`` does not select a bank
+        """
+        if self.baseline:
+            movlb = opcode & 0x07 if 0x010 <= opcode <= 0x017 else None
+            bit_op = 0x400 <= opcode < 0x600
+            value, bit, file = bool(opcode & 0x100), (opcode >> 5) & 7, opcode & 0x1F
+        else:
+            movlb = opcode & 0x1F if 0x0020 <= opcode <= 0x003F else None
+            bit_op = 0x1000 <= opcode < 0x1800
+            value, bit, file = bool(opcode & 0x400), (opcode >> 7) & 7, opcode & 0x7F
+        if movlb is not None:
+            bank[:] = [0xFF, movlb]
+            return True
+        if not bit_op or file != self.select_register or bit not in self.select_bits:
+            return False
+        mask = 1 << self.select_bits.index(bit)
+        bank[0] |= mask
+        bank[1] = bank[1] | mask if value else bank[1] & ~mask
+        return True
+
+    def file_operand(self, opcode: int) -> Optional[int]:
+        """Return the register of a byte or bit oriented instruction."""
+        if self.baseline:
+            if 0x020 <= opcode < 0x800 and not 0x040 <= opcode < 0x060:
+                return opcode & 0x1F
+        elif 0x0080 <= opcode < 0x2000 and not 0x0100 <= opcode < 0x0180:
+            return opcode & 0x7F
+        return None
+
+    def is_banked(self, file: int) -> bool:
+        # Core registers and common RAM are seen from every bank
+        if self.baseline:
+            return file >= 0x10
+        return file < 0x70 and file not in _CORE_REGISTERS
+
+    def is_call(self, opcode: int) -> bool:
+        if self.baseline:
+            return 0x900 <= opcode < 0xA00
+        return (opcode & 0x3800) == 0x2000
+
+    def jump_target(self, address: int, opcode: int) -> Optional[int]:
+        """Target of a ``GOTO`` in the page of ``address``."""
+        if self.baseline:
+            if 0xA00 <= opcode < 0xC00:
+                return (address & ~0x1FF) | (opcode & 0x1FF)
+        elif (opcode & 0x3800) == 0x2800:
+            return (address & ~0x7FF) | (opcode & 0x7FF)
+        return None
+
+
+def _variable_at(variables: Dict[str, Dict], address: int) -> Optional[str]:
+    for name, variable in variables.items():
+        if 0 <= address - variable["address"] < max(variable["size"], 1):
+            return name
+    return None
+
+
+def _display_name(operand: str) -> str:
+    if operand.startswith("??"):
+        return f"{c_name(operand[2:])} (locals)"
+    if operand.startswith("?"):
+        return f"{c_name(operand[1:])} (parameters)"
+    return c_name(operand)
+
+
+def analyze_banking(
+    outputs: XC8Outputs,
+    registers: Iterable = (),
+    data: Optional[Dict[str, Dict]] = None,
+    top: int = 10,
+) -> Optional[Dict]:
+    """Count the bank selections of a link (None without a listing).
+
+    Args:
+        outputs: XC8 link outputs
+        registers: SFRs of the device (:class:`Register`), to name them
+        data: ``{variable: {address, size}}`` of the size report, to name
+            the registers accessed by address
+        top: Number of variables and pairs kept
+
+    Returns:
+        ``{"selects", "in_loops", "functions", "variables", "pairs",
+        "suggestions"}``: selections per function (total and in loops),
+        selections charged to each variable or SFR with its bank, and the
+        pairs of variables of different banks most switched between
+    """
+    listing = outputs.listing()
+    if not listing:
+        return None
+    # Baseline (12-bit) code has no opcode above 0xFFF
+    core = _Core(all(line.opcode < 0x1000 for line in listing))
+
+    sfrs = {register.address: register.name for register in registers}
+
+    # Backward jumps of each function delimit its loops
+    loops: Dict[str, List[Tuple[int, int]]] = {}
+    for line in listing:
+        target = core.jump_target(line.address, line.opcode)
+        if line.function and target is not None and target <= line.address:
+            loops.setdefault(line.function, []).append((target, line.address))
+
+    functions: Dict[str, Dict[str, int]] = {}
+    variables: Dict[str, Dict] = {}
+    pairs: Dict[Tuple[str, str], int] = {}
+    bank = [0, 0]  # known bank select bits, their value
+    pending = 0
+    previous: Optional[Tuple[str, int]] = None
+    function = None
+    for line in listing:
+        if line.function != function:
+            function, bank, pending, previous = line.function, [0, 0], 0, None
+        if core.select(line.opcode, bank):
+            pending += 1
+            counts = functions.setdefault(
+                c_name(function or "?"), {"selects": 0, "in_loops": 0}
+            )
+            counts["selects"] += 1
+            if any(s <= line.address <= e for s, e in loops.get(function, ())):
+                counts["in_loops"] += 1
+            continue
+        if core.is_call(line.opcode):
+            bank, previous = [0, 0], None  # the callee may leave any bank selected
+            continue
+
+        file = core.file_operand(line.opcode)
+        if file is None or not core.is_banked(file):
+            continue
+        number = bank[1] if bank[0] & core.all_bits == core.all_bits else None
+        operand = _OPERAND_RE.search(line.text.split(";", 1)[0])
+        if operand:
+            name = _display_name(operand.group(0))
+        elif number is not None:
+            address = number * core.bank_size + file
+            name = sfrs.get(address)
+            if name is None:
+                name = _variable_at(data or {}, address) or f"0x{address:02X}"
+        else:
+            name = f"0x{file:02X}"
+        if number is None and data and name in data:
+            number = data[name]["address"] // core.bank_size
+        if pending:
+            variable = variables.setdefault(name, {"bank": number, "switches": 0})
+            variable["switches"] += pending
+            if previous and previous[0] != name and previous[1] != number is not None:
+                pair = tuple(sorted((previous[0], name)))
+                pairs[pair] = pairs.get(pair, 0) + pending
+            pending = 0
+        if number is not None:
+            variables.setdefault(name, {"bank": number, "switches": 0})
+            variables[name]["bank"] = number
+            previous = (name, number)
+
+    ranked = sorted(
+        ((name, v) for name, v in variables.items() if v["switches"]),
+        key=lambda item: (-item[1]["switches"], item[0]),
+    )[:top]
+    ranked_pairs = sorted(pairs.items(), key=lambda item: (-item[1], item[0]))[:top]
+    return {
+        "selects": sum(f["selects"] for f in functions.values()),
+        "in_loops": sum(f["in_loops"] for f in functions.values()),
+        "functions": functions,
+        "variables": dict(ranked),
+        "pairs": [[a, b, count] for (a, b), count in ranked_pairs],
+        "suggestions": _suggestions(ranked_pairs, variables, set(sfrs.values())),
+    }
+
+
+def _suggestions(pairs, variables: Dict[str, Dict], sfrs) -> List[str]:
+    suggestions = []
+    placed = set()
+    for (a, b), count in pairs:
+        if a in placed or b in placed:
+            continue  # already part of a suggestion
+        # SFRs, locals, parameters and unnamed registers stay where they are
+        movable = [name for name in (a, b) if name.isidentifier() and name not in sfrs]
+        if not movable:
+            continue
+        # Keep the variable causing the most switches where it is
+        movable.sort(key=lambda name: variables[name]["switches"])
+        moved = movable[0]
+        other = b if moved == a else a
+        bank = variables[other]["bank"]
+        placed.update((moved, other))
+        suggestions.append(
+            f"{moved} (bank {variables[moved]['bank']}) and {other} (bank {bank}) "
+            f"cause {count} bank switches - declare {moved} __bank({bank})"
+        )
+    return suggestions
+
+
+def summarize_banking(report: Dict, top: int = 5) -> List[str]:
+    """Return the console lines of a bank switching report."""
+    if not report["selects"]:
+        return ["Bank selects: none"]
+    lines = [f"Bank selects: {report['selects']} words, {report['in_loops']} in loops"]
+    functions = sorted(
+        report["functions"].items(),
+        key=lambda item: (-item[1]["in_loops"], -item[1]["selects"], item[0]),
+    )[:top]
+    lines.append(
+        "Most bank selects: "
+        + ", ".join(
+            f"{name} {f['selects']}"
+            + (f" ({f['in_loops']} in loops)" if f["in_loops"] else "")
+            for name, f in functions
+        )
+    )
+    variables = list(report["variables"].items())[:top]
+    if variables:
+        lines.append(
+            "Bank switches caused by: "
+            + ", ".join(
+                f"{name} {v['switches']}"
+                + (f" (bank {v['bank']})" if v["bank"] is not None else "")
+                for name, v in variables
+            )
+        )
+    lines.extend(f"Suggestion: {s}" for s in report["suggestions"][:top])
+    return lines
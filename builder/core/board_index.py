@@ -0,0 +1,265 @@
+"""
+Catalogue of the boards a firmware image fits on
+
+``builder/data/board_index.json`` summarizes every ``boards/*.json``
+manifest (program words, RAM and EEPROM bytes, hardware stack depth) with
+the SFR names of the part when its layout is known, so a search over the
+whole catalogue is a single JSON load. The index records a digest of the
+manifests and SFR data files it was built from; when they change it is
+rebuilt into the platform cache. ``scripts/create_board_index.py``
+regenerates the shipped copy.
+
+SFR names come from the SFR data files or an XC8 installation, and so do
+the EEPROM sizes the manifests lack (only a few have
+``upload.info.EepromSize``). The shipped copy was built without either: its
+SFRs are unknown and only the baseline parts (no EEPROM) and the manifests
+giving it have an EEPROM size. The search notes the checks it cannot make.
+"""
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from .cache import write_atomic
+from .callgraph import StackReport, stack_levels
+from .hexfile import EEPROM_WORD, MAX_EEPROM_SIZE, HexFormatError, HexImage
+from .sfr import SFR_DATA_DIR, load_device_registers
+from .size_report import REPORT_NAME
+from .toolchain import BASELINE_DEVICES, XC8Toolchain, normalize_device
+from .xc8_outputs import XC8Outputs
+
+BOARDS_DIR = Path(__file__).resolve().parent.parent.parent / "boards"
+INDEX_FILE = Path(__file__).resolve().parent.parent / "data" / "board_index.json"
+INDEX_VERSION = 1
+
+
+def _sources_digest(boards_dir: Path, sfr_dir: Path) -> str:
+    digest = hashlib.sha1()
+    for path in sorted(boards_dir.glob("*.json")):
+        digest.update(path.name.encode())
+        digest.update(path.read_bytes())
+    if sfr_dir.is_dir():
+        for path in sorted(sfr_dir.glob("*.json")):
+            stat = path.stat()
+            digest.update(f"{path.name}:{stat.st_size}".encode())
+    return digest.hexdigest()
+
+
+def board_entry(
+    board_id: str,
+    manifest: Dict,
+    toolchain: Optional[XC8Toolchain] = None,
+    sfr_dir: Optional[Path] = None,
+) -> Dict:
+    """Return the index entry of one board manifest."""
+    mcu = normalize_device(manifest.get("build", {}).get("mcu", board_id))
+    upload = manifest.get("upload", {})
+    info = upload.get("info", {})
+    registers = load_device_registers(mcu, toolchain, sfr_dir)
+    # Unknown (None) unless the manifest or the processor header gives it
+    if "EepromSize" in info:
+        eeprom = int(info["EepromSize"])
+    elif mcu in BASELINE_DEVICES:
+        eeprom = 0
+    else:
+        eeprom = toolchain.eeprom_size(mcu) if toolchain else None
+    return {
+        "id": board_id,
+        "mcu": mcu,
+        "name": manifest.get("name", board_id),
+        "flash": int(upload.get("maximum_size", 0)),
+        "ram": int(upload.get("maximum_ram_size", 0)),
+        "eeprom": eeprom,
+        "stack": stack_levels(mcu),
+        "sfrs": sorted({r.name for r in registers}) if registers else None,
+    }
+
+
+def build_board_index(
+    boards_dir: Path = BOARDS_DIR,
+    toolchain: Optional[XC8Toolchain] = None,
+    sfr_dir: Optional[Path] = None,
+) -> Dict:
+    """Index every board manifest of ``boards_dir``."""
+    sfr_dir = Path(sfr_dir or SFR_DATA_DIR)
+    boards = []
+    for path in sorted(Path(boards_dir).glob("*.json")):
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+        boards.append(board_entry(path.stem, manifest, toolchain, sfr_dir))
+    return {
+        "version": INDEX_VERSION,
+        "digest": _sources_digest(Path(boards_dir), sfr_dir),
+        "boards": boards,
+    }
+
+
+def load_board_index(
+    cache_dir: Optional[Path] = None,
+    toolchain: Optional[XC8Toolchain] = None,
+    boards_dir: Path = BOARDS_DIR,
+) -> Dict:
+    """Return an up-to-date board index.
+
+    The shipped index is used while it matches the manifests; otherwise the
+    copy in ``cache_dir`` is, and failing that a new one is built there.
+    """
+    digest = _sources_digest(Path(boards_dir), SFR_DATA_DIR)
+    candidates = [INDEX_FILE]
+    if cache_dir is not None:
+        candidates.append(Path(cache_dir) / INDEX_FILE.name)
+    for path in candidates:
+        try:
+            index = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        if index.get("version") == INDEX_VERSION and index.get("digest") == digest:
+            return index
+
+    print("[FIT] Board catalogue changed - rebuilding the board index")
+    index = build_board_index(boards_dir, toolchain)
+    if cache_dir is not None:
+        write_atomic(Path(cache_dir) / INDEX_FILE.name, json.dumps(index))
+    return index
+
+
+class FirmwareUsage:
+    """Resources a firmware image needs from a part.
+
+    Attributes:
+        flash: Program words
+        ram: Data bytes
+        eeprom: Data EEPROM bytes initialized by the image
+        stack: Worst-case hardware stack levels (0 if unknown)
+        sfrs: SFR names referenced, or None if unknown
+    """
+
+    def __init__(
+        self,
+        flash: int,
+        ram: int,
+        eeprom: int = 0,
+        stack: int = 0,
+        sfrs: Optional[Set[str]] = None,
+    ):
+        self.flash = flash
+        self.ram = ram
+        self.eeprom = eeprom
+        self.stack = stack
+        self.sfrs = sfrs
+
+    @classmethod
+    def from_build(cls, build_dir: Path, register_names: Set[str]) -> "FirmwareUsage":
+        """Read the usage from the size and stack reports of a build.
+
+        Args:
+            build_dir: ``$BUILD_DIR`` of a linked firmware
+            register_names: SFR names of the current device, used to tell
+                SFRs from other absolute symbols (empty: SFRs unchecked)
+        """
+        build_dir = Path(build_dir)
+        report = json.loads((build_dir / REPORT_NAME).read_text())
+
+        eeprom = 0
+        hex_path = build_dir / "output" / "firmware.hex"
+        if hex_path.exists():
+            try:
+                image = HexImage.load(hex_path)
+                eeprom = image.used_words(EEPROM_WORD, MAX_EEPROM_SIZE)
+            except HexFormatError:
+                eeprom = 0
+
+        stack = 0
+        stack_file = build_dir / "stack_depth.json"
+        if stack_file.exists():
+            try:
+                data = json.loads(stack_file.read_text())["report"]
+                stack = StackReport.from_dict(data).worst_case
+            except (ValueError, KeyError, TypeError):
+                stack = 0
+
+        sfrs = None
+        if register_names:
+            sfrs = set()
+            for symbol in XC8Outputs(build_dir / "output").symbols():
+                name = symbol.name[1:] if symbol.name.startswith("_") else symbol.name
+                if name.endswith("bits"):
+                    name = name[:-4]
+                if name in register_names:
+                    sfrs.add(name)
+        return cls(report["flash"]["used"], report["ram"]["used"], eeprom, stack, sfrs)
+
+
+class BoardFit:
+    """A board the firmware fits on.
+
+    Attributes:
+        board: Index entry of the board
+        headroom: Smallest free fraction of flash and RAM
+        notes: Checks that could not be made
+    """
+
+    def __init__(self, board: Dict, headroom: float, notes: List[str]):
+        self.board = board
+        self.headroom = headroom
+        self.notes = notes
+
+    def line(self, usage: FirmwareUsage) -> str:
+        board = self.board
+        text = (
+            f"{board['id']:<14} flash {usage.flash}/{board['flash']}"
+            f"  RAM {usage.ram}/{board['ram']}  headroom {100 * self.headroom:.0f}%"
+        )
+        if self.notes:
+            text += f"  ({', '.join(self.notes)})"
+        return text
+
+
+def find_fitting_boards(
+    index: Dict, usage: FirmwareUsage
+) -> Tuple[List[BoardFit], Dict[str, str]]:
+    """Return the boards ``usage`` fits on, most headroom first.
+
+    Returns:
+        ``(fits, {board id: reason})`` for the boards rejected
+    """
+    fits: List[BoardFit] = []
+    rejected: Dict[str, str] = {}
+    for board in index["boards"]:
+        if usage.flash > board["flash"]:
+            rejected[board["id"]] = f"flash {usage.flash} > {board['flash']} words"
+            continue
+        if usage.ram > board["ram"]:
+            rejected[board["id"]] = f"RAM {usage.ram} > {board['ram']} bytes"
+            continue
+        if usage.stack > board["stack"]:
+            rejected[board["id"]] = f"stack {usage.stack} > {board['stack']} levels"
+            continue
+
+        notes = []
+        if usage.eeprom:
+            if board["eeprom"] is None:
+                notes.append("EEPROM size unknown")
+            elif usage.eeprom > board["eeprom"]:
+                rejected[board["id"]] = (
+                    f"EEPROM {usage.eeprom} > {board['eeprom']} bytes"
+                )
+                continue
+        if usage.sfrs is not None:
+            if board["sfrs"] is None:
+                notes.append("SFRs unchecked")
+            else:
+                missing = sorted(usage.sfrs - set(board["sfrs"]))
+                if missing:
+                    rejected[board["id"]] = "no " + ", ".join(missing[:4])
+                    continue
+
+        headroom = min(
+            1 - usage.flash / board["flash"] if board["flash"] else 0.0,
+            1 - usage.ram / board["ram"] if board["ram"] else 0.0,
+        )
+        fits.append(BoardFit(board, headroom, notes))
+
+    # Fully checked boards first, then by headroom
+    fits.sort(key=lambda fit: (bool(fit.notes), -fit.headroom, fit.board["id"]))
+    return fits, rejected
@@ -0,0 +1,41 @@
+"""
+Location of the platform-wide build cache
+
+Artifacts that do not depend on a particular project (preprocessed device
+headers, generated stubs, template bytecode...) are stored once per host
+under ``<PlatformIO core dir>/.cache/pic8bit`` so every project reuses them.
+"""
+
+import os
+from pathlib import Path
+from typing import Optional
+
+CACHE_ENV_VAR = "PIC8BIT_CACHE_DIR"
+
+
+def platform_cache_dir(core_dir: Optional[str] = None) -> Path:
+    """Return (and create) the platform cache directory.
+
+    Args:
+        core_dir: PlatformIO core directory (``$PROJECT_CORE_DIR``)
+
+    Returns:
+        Path of the cache directory. ``PIC8BIT_CACHE_DIR`` overrides it.
+    """
+    override = os.environ.get(CACHE_ENV_VAR)
+    if override:
+        cache_dir = Path(override)
+    elif core_dir:
+        cache_dir = Path(core_dir) / ".cache" / "pic8bit"
+    else:
+        cache_dir = Path.home() / ".platformio" / ".cache" / "pic8bit"
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
+
+
+def write_atomic(path: Path, content: str) -> None:
+    """Write a text file so concurrent builds never see a partial file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(content, encoding="utf-8")
+    os.replace(str(tmp), str(path))
@@ -0,0 +1,289 @@
+"""
+Post-link stack depth analysis
+
+PIC16 parts return through a hardware stack of 8 levels (2 on baseline
+parts) that silently wraps around on overflow. After the link, the call
+graph is rebuilt from the XC8 listing, from the ``call``/``fcall``
+instructions of every function and the ``Call Graph Graphs`` section the
+code generator writes, and the deepest chain is measured from ``main()``
+and from the interrupt function. An interrupt may fire at the deepest point
+of ``main()``, so the worst case is ``main depth + 1 + ISR depth``.
+
+The result is stored next to the firmware with a SHA-1 of the outputs it
+was computed from, so builds whose link produced the same outputs reuse it.
+"""
+
+import hashlib
+import json
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from .cache import write_atomic
+from .toolchain import BASELINE_DEVICES, normalize_device
+from .xc8_outputs import XC8Outputs, c_name
+
+MIDRANGE_STACK_LEVELS = 8
+BASELINE_STACK_LEVELS = 2
+
+_CALL_RE = re.compile(r"\b(?:f?call)\s+([\w@$?.]+)", re.IGNORECASE)
+_GRAPH_HEADER_RE = re.compile(r"^\s*Call Graph Graphs:")
+_GRAPH_NODE_RE = re.compile(r"^(\s+)([\w@$?.]+)(\s+\(ROOT\))?\s*$")
+_GRAPH_END_RE = re.compile(r"^\s*(Address spaces:|-{10,}|[A-Z][\w ]+:\s*$)")
+_RETFIE = 0x0009
+
+
+def stack_levels(device: str, override=None) -> int:
+    """Return the hardware stack depth of a device."""
+    if override:
+        return int(override)
+    if normalize_device(device) in BASELINE_DEVICES:
+        return BASELINE_STACK_LEVELS
+    return MIDRANGE_STACK_LEVELS
+
+
+def read_call_graph_section(path: Path) -> Tuple[Dict[str, Set[str]], List[str]]:
+    """Parse the ``Call Graph Graphs`` section of an XC8 listing.
+
+    Each line names a function, indented one step deeper than its caller;
+    ``(ROOT)`` marks the entry points (``_main`` and the interrupt function).
+
+    Returns:
+        ``(edges, roots)``
+    """
+    edges: Dict[str, Set[str]] = {}
+    roots: List[str] = []
+    parents: List[Tuple[int, str]] = []
+    in_graph = False
+    for line in path.read_text(errors="replace").splitlines():
+        if not in_graph:
+            in_graph = bool(_GRAPH_HEADER_RE.match(line))
+            continue
+        if not line.strip():
+            continue
+        node = _GRAPH_NODE_RE.match(line)
+        if not node:
+            if _GRAPH_END_RE.match(line):
+                break
+            continue
+        indent, name = len(node.group(1)), node.group(2)
+        while parents and parents[-1][0] >= indent:
+            parents.pop()
+        if node.group(3):
+            roots.append(name)
+            parents = []
+        elif parents:
+            edges.setdefault(parents[-1][1], set()).add(name)
+        edges.setdefault(name, set())
+        parents.append((indent, name))
+    return edges, roots
+
+
+def build_call_graph(outputs: XC8Outputs) -> Dict[str, Set[str]]:
+    """Return ``{function: callees}`` from the listing of a link."""
+    graph: Dict[str, Set[str]] = {name: set() for _, name in outputs.functions()}
+    for line in outputs.listing():
+        if not line.function or (line.opcode & 0x3800) != 0x2000:
+            continue  # not a CALL instruction
+        match = _CALL_RE.search(line.text)
+        if match:
+            callee = match.group(1)
+        else:
+            # Operand without a symbol: CALL target in the caller's 2K page
+            target = (line.address & ~0x7FF) | (line.opcode & 0x7FF)
+            callee = _owner(outputs, target) or f"0x{target:04X}"
+        graph.setdefault(line.function, set()).add(callee)
+        graph.setdefault(callee, set())
+
+    listing = outputs.path(".lst")
+    if listing.exists():
+        for caller, callees in read_call_graph_section(listing)[0].items():
+            graph.setdefault(caller, set()).update(callees)
+            for callee in callees:
+                graph.setdefault(callee, set())
+    return graph
+
+
+def _owner(outputs: XC8Outputs, address: int) -> Optional[str]:
+    owner = None
+    for start, name in outputs.functions():
+        if start > address:
+            break
+        owner = name
+    return owner
+
+
+def deepest_chain(graph: Dict[str, Set[str]], root: str) -> Tuple[int, List[str]]:
+    """Return the number of stack levels below ``root`` and the chain using them.
+
+    Raises:
+        ValueError: If the call graph below ``root`` is recursive
+    """
+    memo: Dict[str, Tuple[int, List[str]]] = {}
+    active: List[str] = []
+
+    def visit(name: str) -> Tuple[int, List[str]]:
+        if name in memo:
+            return memo[name]
+        if name in active:
+            cycle = active[active.index(name) :] + [name]
+            raise ValueError(
+                "recursive call chain " + " -> ".join(c_name(n) for n in cycle)
+            )
+        active.append(name)
+        best: Tuple[int, List[str]] = (0, [name])
+        for callee in sorted(graph.get(name, ())):
+            depth, chain = visit(callee)
+            if depth + 1 > best[0]:
+                best = (depth + 1, [name] + chain)
+        active.pop()
+        memo[name] = best
+        return best
+
+    return visit(root)
+
+
+class StackReport:
+    """Worst-case hardware stack use of a firmware image."""
+
+    def __init__(
+        self,
+        limit: int,
+        main_depth: int,
+        main_chain: List[str],
+        isr: Optional[str] = None,
+        isr_depth: int = 0,
+        isr_chain: Optional[List[str]] = None,
+    ):
+        self.limit = limit
+        self.main_depth = main_depth
+        self.main_chain = main_chain
+        self.isr = isr
+        self.isr_depth = isr_depth
+        self.isr_chain = isr_chain or []
+
+    @property
+    def worst_case(self) -> int:
+        # Entering the ISR pushes the return address on top of main's chain
+        if self.isr is None:
+            return self.main_depth
+        return self.main_depth + 1 + self.isr_depth
+
+    @property
+    def fits(self) -> bool:
+        return self.worst_case <= self.limit
+
+    def lines(self) -> List[str]:
+        def chain(names: List[str]) -> str:
+            return " -> ".join(c_name(name) for name in names)
+
+        out = [f"main: {self.main_depth} levels ({chain(self.main_chain)})"]
+        if self.isr is not None:
+            out.append(
+                f"interrupt {c_name(self.isr)}: 1 + {self.isr_depth} levels "
+                f"({chain(self.isr_chain)})"
+            )
+        out.append(f"Worst case: {self.worst_case}/{self.limit} levels")
+        return out
+
+    def to_dict(self) -> Dict:
+        return {
+            "limit": self.limit,
+            "main_depth": self.main_depth,
+            "main_chain": self.main_chain,
+            "isr": self.isr,
+            "isr_depth": self.isr_depth,
+            "isr_chain": self.isr_chain,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "StackReport":
+        return cls(**data)
+
+
+def analyze_stack(outputs: XC8Outputs, limit: int) -> Optional[StackReport]:
+    """Compute the worst-case stack use of a link (None without a listing).
+
+    Raises:
+        ValueError: If the call graph is recursive
+    """
+    if not outputs.listing():
+        return None
+    graph = build_call_graph(outputs)
+    if "_main" not in graph:
+        return None
+    main_depth, main_chain = deepest_chain(graph, "_main")
+
+    # The interrupt function is the one returning with RETFIE
+    isr = next(
+        (line.function for line in outputs.listing() if line.opcode == _RETFIE),
+        None,
+    )
+    if isr is None:
+        roots = read_call_graph_section(outputs.path(".lst"))[1]
+        isr = next((root for root in roots if root != "_main"), None)
+    if isr is None or isr not in graph:
+        return StackReport(limit, main_depth, main_chain)
+    isr_depth, isr_chain = deepest_chain(graph, isr)
+    return StackReport(limit, main_depth, main_chain, isr, isr_depth, isr_chain)
+
+
+def _link_key(outputs: XC8Outputs) -> str:
+    # Every build relinks, rewriting the outputs: key on their content
+    digest = hashlib.sha1()
+    for suffix in (".hex", ".lst", ".sym"):
+        path = outputs.path(suffix)
+        if path.exists():
+            digest.update(suffix.encode("utf-8"))
+            digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def check_stack_depth(ctx) -> bool:
+    """Post-link stage: fail the build if the call depth exceeds the stack
+
+    ``custom_stack_check``: ``yes`` (default) fails the build, ``warn`` only
+    reports, ``no`` skips the analysis. ``board_build.stack_levels``
+    overrides the hardware stack depth.
+    """
+    mode = str(ctx.project_option("custom_stack_check", "yes")).lower()
+    if mode in ("no", "false", "0", "off"):
+        return True
+
+    outputs = XC8Outputs(ctx.output_dir)
+    limit = stack_levels(ctx.device, ctx.board_option("stack_levels"))
+    cache_file = ctx.build_dir / "stack_depth.json"
+    key = _link_key(outputs)
+
+    report = None
+    if cache_file.exists():
+        try:
+            cached = json.loads(cache_file.read_text())
+            if cached.get("key") == key and cached["report"]["limit"] == limit:
+                report = StackReport.from_dict(cached["report"])
+        except (ValueError, KeyError, TypeError):
+            report = None
+
+    if report is None:
+        try:
+            report = analyze_stack(outputs, limit)
+        except ValueError as e:
+            print(f"[STACK] ❌ {e}: stack depth is unbounded")
+            return mode == "warn"
+        if report is None:
+            print("[STACK] ⚠️  No XC8 listing with main() - stack depth not checked")
+            return True
+        write_atomic(
+            cache_file, json.dumps({"key": key, "report": report.to_dict()}, indent=2)
+        )
+
+    ctx.results["stack"] = report
+    for line in report.lines():
+        print(f"[STACK] {line}")
+    if report.fits:
+        return True
+    print(
+        f"[STACK] ❌ Worst-case call depth {report.worst_case} exceeds the "
+        f"{limit}-level hardware stack of {ctx.device.upper()}"
+    )
+    return mode == "warn"
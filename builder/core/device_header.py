@@ -0,0 +1,131 @@
+"""
+Per-device preprocessed ``<xc.h>`` cache
+
+``<xc.h>`` expands into the full processor header of the selected part
+(thousands of SFR declarations for a PIC16F877A) and every translation unit
+re-reads and re-expands it. The cache preprocesses it once per MCU and XC8
+version with ``xc8-cc -E -dD`` (macros kept) and stores the result as a
+drop-in ``xc.h``. Putting that directory first on the include path makes
+both XC8 and libclang pick up the flattened header.
+"""
+
+import hashlib
+import subprocess
+import tempfile
+from pathlib import Path
+from typing import Iterable, Optional
+
+from .cache import write_atomic
+from .toolchain import XC8Toolchain, normalize_device
+
+HEADER_NAME = "xc.h"
+# Marker left behind when the installed compiler cannot produce a usable
+# header, so the failing preprocessor run is not repeated on every build
+UNSUPPORTED_MARKER = ".unsupported"
+
+
+def _cache_key(toolchain: XC8Toolchain, defines: Iterable[str]) -> str:
+    compiler = toolchain.tool("xc8-cc")
+    try:
+        stamp = str(compiler.stat().st_mtime_ns)
+    except OSError:
+        stamp = "0"
+    payload = "\n".join(sorted(defines) + [str(compiler), stamp])
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
+
+
+def device_header_dir(
+    toolchain: XC8Toolchain, device: str, defines: Iterable[str], cache_root: Path
+) -> Path:
+    """Return the cache directory for a device/XC8 version/defines combination."""
+    device = normalize_device(device)
+    defines = list(defines)
+    return (
+        Path(cache_root)
+        / "device-headers"
+        / f"xc8-{toolchain.version}"
+        / f"{device}-{_cache_key(toolchain, defines)}"
+    )
+
+
+def _preprocess(toolchain: XC8Toolchain, device: str, defines: list) -> Optional[str]:
+    """Run the XC8 preprocessor on ``#include <xc.h>`` and return its output."""
+    with tempfile.TemporaryDirectory(prefix="pic8bit-xc-") as tmp:
+        tmp_path = Path(tmp)
+        source = tmp_path / "device.c"
+        output = tmp_path / "device.i"
+        source.write_text("#include <xc.h>\n")
+        cmd = [
+            str(toolchain.tool("xc8-cc")),
+            f"-mcpu={device}",
+            "-E",
+            "-dD",
+            *defines,
+            str(source),
+            "-o",
+            str(output),
+        ]
+        try:
+            result = subprocess.run(
+                cmd, cwd=tmp, capture_output=True, text=True, check=False
+            )
+        except OSError as e:
+            print(f"[CACHE] Could not run XC8 preprocessor: {e}")
+            return None
+        if result.returncode != 0:
+            print(f"[CACHE] XC8 preprocessor failed: {result.stderr.strip()}")
+            return None
+        if output.is_file():
+            return output.read_text(errors="replace")
+        return result.stdout or None
+
+
+def ensure_device_header(
+    toolchain: Optional[XC8Toolchain],
+    device: str,
+    defines: Iterable[str],
+    cache_root: Path,
+) -> Optional[Path]:
+    """Return a directory holding a preprocessed ``xc.h`` for ``device``.
+
+    The header is generated on first use and reused by every later build
+    with the same MCU, XC8 version and header-affecting defines.
+
+    Args:
+        toolchain: Active XC8 installation (None disables the cache)
+        device: Value of ``build.mcu``
+        defines: ``-D``/``-U`` flags that may change the header expansion
+        cache_root: Platform cache directory
+
+    Returns:
+        Directory to put first on the include path, or None to fall back to
+        the regular ``<xc.h>``
+    """
+    if toolchain is None:
+        return None
+    defines = list(defines)
+    target = device_header_dir(toolchain, device, defines, cache_root)
+    header = target / HEADER_NAME
+    if header.is_file():
+        return target
+    if (target / UNSUPPORTED_MARKER).exists():
+        return None
+
+    print(f"[CACHE] Preprocessing <xc.h> for {device} (XC8 {toolchain.version})...")
+    content = _preprocess(toolchain, normalize_device(device), defines)
+    # Without -dD support the macros (__delay_ms, NOP, bit masks...) are lost
+    # and the flattened header would break user code
+    if not content or "#define" not in content:
+        print("[CACHE] Preprocessed header unusable - using regular <xc.h>")
+        write_atomic(target / UNSUPPORTED_MARKER, "")
+        return None
+
+    guard = f"PIC8BIT_CACHED_XC_H_{normalize_device(device).upper()}"
+    write_atomic(
+        header,
+        f"// Preprocessed <xc.h> for {device}, XC8 {toolchain.version}\n"
+        f"// Generated by platform-pic8bit - do not edit\n"
+        f"#ifndef {guard}\n#define {guard}\n{content}\n#endif // {guard}\n",
+    )
+    print(f"[CACHE] Cached device header: {header}")
+    return target
@@ -0,0 +1,262 @@
+"""
+Per-unit values patched into the HEX image at upload time
+
+A production line builds ``firmware.hex`` once and programs it into hundreds
+of boards, each needing its own serial number or calibration constants.
+``custom_hex_patches`` reserves the locations, one per line::
+
+    custom_hex_patches =
+        serial  eeprom:0x00   4  counter:serial.txt
+        osccal  flash:0x1FF0  2  env:OSCCAL
+        trim    word:0x1FFE   1  0x2A5
+
+Each line gives a name, a location, a size and the value:
+
+* ``eeprom:<offset>``: bytes of the data EEPROM
+* ``flash:<word>``: bytes of a ``const`` array placed with ``__at()``, one
+  ``RETLW`` instruction per byte as XC8 stores them on PIC16 parts
+* ``word:<word>``: raw program words (14 bits, 12 on baseline parts)
+
+Multi-byte values are little-endian like XC8 integers. A value is a number,
+``env:<NAME>`` (an environment variable of the upload command) or
+``counter:<file>``, a serial number read from a file of the project and
+incremented after each successful upload.
+
+The patch is applied to a copy of the image in memory and written next to
+the firmware with its record checksums recomputed: XC8 is not run again.
+Flash locations must be erased or hold a ``RETLW`` placeholder, so code is
+never overwritten, and patches may not overlap.
+"""
+
+import os
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from .cache import write_atomic
+from .hexfile import HexImage
+
+PATCHED_HEX_NAME = "firmware.patched.hex"
+SPACES = ("eeprom", "flash", "word")
+
+# RETLW opcode, mask of its opcode bits, erased word and word bits per core
+_MIDRANGE = (0x3400, 0x3C00, 0x3FFF, 14)
+_BASELINE = (0x0800, 0x0F00, 0x0FFF, 12)
+
+
+class HexPatchError(ValueError):
+    """A patch that is malformed, out of range or has no value."""
+
+
+class HexPatch:
+    """One line of ``custom_hex_patches``.
+
+    Attributes:
+        name: Label printed with the value
+        space: ``eeprom``, ``flash`` or ``word``
+        address: EEPROM byte offset or program word address
+        size: Bytes (words for ``word``)
+        value: Number, ``env:<NAME>`` or ``counter:<file>``
+    """
+
+    def __init__(self, name: str, space: str, address: int, size: int, value: str):
+        self.name = name
+        self.space = space
+        self.address = address
+        self.size = size
+        self.value = value
+
+    @property
+    def bits(self) -> int:
+        return self.size * (14 if self.space == "word" else 8)
+
+    @property
+    def counter_file(self) -> Optional[str]:
+        kind, _, argument = self.value.partition(":")
+        return argument if kind == "counter" else None
+
+
+def parse_hex_patches(text: str) -> List[HexPatch]:
+    """Parse ``custom_hex_patches``.
+
+    Raises:
+        HexPatchError: for a malformed line
+    """
+    patches = []
+    for line in str(text).splitlines():
+        line = line.split(";", 1)[0].split("#", 1)[0].strip()
+        if not line:
+            continue
+        words = line.split()
+        if len(words) != 4:
+            raise HexPatchError(
+                f"expected <name> <space:address> <size> <value>: {line}"
+            )
+        name, location, size, value = words
+        space, sep, address = location.partition(":")
+        if not sep or space not in SPACES:
+            spaces = ", ".join(f"{space}:<address>" for space in SPACES)
+            raise HexPatchError(f"{name}: location must be {spaces}")
+        try:
+            patch = HexPatch(name, space, int(address, 0), int(size, 0), value)
+        except ValueError:
+            raise HexPatchError(f"{name}: invalid address or size") from None
+        if patch.size < 1:
+            raise HexPatchError(f"{name}: size must be at least 1")
+        patches.append(patch)
+    names = [patch.name for patch in patches]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise HexPatchError(f"several patches named {', '.join(duplicates)}")
+    _check_overlaps(patches)
+    return patches
+
+
+def _check_overlaps(patches: List[HexPatch]) -> None:
+    # flash: and word: patches share program memory
+    for i, patch in enumerate(patches):
+        for other in patches[:i]:
+            if (patch.space == "eeprom") != (other.space == "eeprom"):
+                continue
+            if (
+                patch.address < other.address + other.size
+                and other.address < patch.address + patch.size
+            ):
+                raise HexPatchError(f"{patch.name} overlaps {other.name}")
+
+
+def _counter_path(patch: HexPatch, project_dir: Path) -> Path:
+    return Path(project_dir) / patch.counter_file
+
+
+def resolve_values(
+    patches: List[HexPatch], project_dir: Path, environ: Mapping[str, str] = os.environ
+) -> Dict[str, int]:
+    """Return the value of every patch for this upload.
+
+    A missing counter file starts the serial numbers at 1.
+
+    Raises:
+        HexPatchError: for an unset variable, a non-numeric value or a value
+            too large for its size
+    """
+    values = {}
+    for patch in patches:
+        kind, _, argument = patch.value.partition(":")
+        if kind == "env":
+            if argument not in environ:
+                raise HexPatchError(f"{patch.name}: ${argument} is not set")
+            text = environ[argument]
+        elif kind == "counter":
+            path = _counter_path(patch, project_dir)
+            text = path.read_text().strip() if path.is_file() else "1"
+        else:
+            text = patch.value
+        try:
+            value = int(text, 0)
+        except ValueError:
+            raise HexPatchError(f"{patch.name}: {text!r} is not a number") from None
+        if not 0 <= value < 1 << patch.bits:
+            raise HexPatchError(
+                f"{patch.name}: {value} does not fit in {patch.size} "
+                f"{'words' if patch.space == 'word' else 'bytes'}"
+            )
+        values[patch.name] = value
+    return values
+
+
+def apply_patches(
+    image: HexImage,
+    patches: List[HexPatch],
+    values: Dict[str, int],
+    regions: Dict[str, Tuple[int, int]],
+    baseline: bool = False,
+) -> HexImage:
+    """Return a copy of ``image`` with the values written.
+
+    Args:
+        image: Firmware image
+        patches: Parsed ``custom_hex_patches``
+        values: Value of each patch (:func:`resolve_values`)
+        regions: Memories of the device (:func:`memory_regions`)
+        baseline: The device has the 12-bit instruction set
+
+    Raises:
+        HexPatchError: for a location outside the memory of the device, a
+            flash word holding code or a value too large for its words
+    """
+    retlw, opcode_mask, erased, word_bits = _BASELINE if baseline else _MIDRANGE
+    patched = image.copy()
+    for patch in patches:
+        value = values[patch.name]
+        if patch.space == "eeprom":
+            if "eeprom" not in regions:
+                raise HexPatchError(
+                    f"{patch.name}: no data EEPROM known for the device "
+                    "(upload.info EepromSize or the XC8 processor header)"
+                )
+            start, count = regions["eeprom"]
+            if patch.address + patch.size > count:
+                raise HexPatchError(
+                    f"{patch.name}: EEPROM offset 0x{patch.address:02X} + "
+                    f"{patch.size} is past its {count} bytes"
+                )
+            for i in range(patch.size):
+                patched.set_word(start + patch.address + i, (value >> 8 * i) & 0xFF)
+            continue
+
+        _, flash_words = regions["flash"]
+        if patch.address + patch.size > flash_words:
+            raise HexPatchError(
+                f"{patch.name}: word 0x{patch.address:04X} + {patch.size} is past "
+                f"the {flash_words} words of flash"
+            )
+        if patch.space == "word" and value >> word_bits * patch.size:
+            raise HexPatchError(
+                f"{patch.name}: {value} does not fit in {patch.size} "
+                f"{word_bits}-bit words"
+            )
+        for i in range(patch.size):
+            address = patch.address + i
+            current = image.get_word(address, erased)
+            if current != erased and current & opcode_mask != retlw:
+                raise HexPatchError(
+                    f"{patch.name}: word 0x{address:04X} holds code (0x{current:04X})"
+                )
+            if patch.space == "flash":
+                patched.set_word(address, retlw | (value >> 8 * i) & 0xFF)
+            else:
+                patched.set_word(address, (value >> word_bits * i) & erased)
+    return patched
+
+
+def write_patched_firmware(
+    hex_path: Path,
+    patches: List[HexPatch],
+    regions: Dict[str, Tuple[int, int]],
+    project_dir: Path,
+    environ: Mapping[str, str] = os.environ,
+    baseline: bool = False,
+) -> Dict[str, int]:
+    """Write the patched copy of ``hex_path`` as :data:`PATCHED_HEX_NAME`.
+
+    Returns:
+        The value of every patch
+
+    Raises:
+        HexPatchError: see :func:`resolve_values` and :func:`apply_patches`
+    """
+    values = resolve_values(patches, project_dir, environ)
+    image = apply_patches(HexImage.load(hex_path), patches, values, regions, baseline)
+    write_atomic(Path(hex_path).with_name(PATCHED_HEX_NAME), image.to_text())
+    return values
+
+
+def advance_counters(
+    patches: List[HexPatch], values: Dict[str, int], project_dir: Path
+) -> None:
+    """Store the next serial number of every counter after an upload."""
+    for patch in patches:
+        if patch.counter_file:
+            write_atomic(
+                _counter_path(patch, project_dir), f"{values[patch.name] + 1}\n"
+            )
@@ -0,0 +1,195 @@
+"""
+Intel HEX images of PIC firmware
+
+XC8 writes ``firmware.hex`` with byte addresses: program word ``n`` is stored
+little-endian at bytes ``2n``/``2n+1``, so the PIC16 configuration word at
+0x2007 lives at byte 0x400E and data EEPROM (word 0x2100) at byte 0x4200,
+one EEPROM byte in the low byte of each word.
+"""
+
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .toolchain import BASELINE_DEVICES, XC8Toolchain, normalize_device
+
+# Mid-range layout used when upload.info does not give it: data EEPROM at
+# word 0x2100 (0x2100-0x21FF at most), configuration words from 0x2007
+EEPROM_WORD = 0x2100
+MAX_EEPROM_SIZE = 256
+CONFIG_WORD = 0x2007
+CONFIG_WORDS = 2
+# Baseline parts keep their configuration word past the end of flash
+BASELINE_CONFIG_WORD = 0xFFF
+
+
+class HexFormatError(ValueError):
+    """Raised for malformed Intel HEX input."""
+
+
+def memory_regions(
+    upload: Dict,
+    device: Optional[str] = None,
+    toolchain: Optional[XC8Toolchain] = None,
+) -> Dict[str, Tuple[int, int]]:
+    """Return the ``(first word, word count)`` of each memory of a board.
+
+    Manifests without the EEPROM or configuration fields get the layout of
+    the ``device`` core: mid-range parts have their data EEPROM at word
+    0x2100, sized from the XC8 processor header (no ``eeprom`` region when
+    the size is unknown, as some parts have none), and configuration words
+    from 0x2007; baseline parts have no EEPROM and their configuration word
+    at 0xFFF. ``create_boards.py`` writes 0 for the fields it does not know.
+
+    Args:
+        upload: ``upload`` section of the board manifest; ``maximum_size``
+            and the ``Eeprom``/``EepromSize``/``Config``/``ConfigSize`` fields
+            of ``info`` (written by ``create_pic16_board``)
+        device: Value of ``build.mcu``, for the defaults
+        toolchain: XC8 installation giving the EEPROM size of ``device``
+
+    Returns:
+        ``flash`` and, when the board has them, ``eeprom`` and ``config``
+    """
+    info = upload.get("info", {})
+    regions = {"flash": (0, int(upload.get("maximum_size", 8192)))}
+    baseline = device is not None and normalize_device(device) in BASELINE_DEVICES
+
+    if "EepromSize" in info:
+        eeprom_size = int(info["EepromSize"])
+    elif device is not None and not baseline and toolchain is not None:
+        eeprom_size = toolchain.eeprom_size(device) or 0
+    else:
+        eeprom_size = 0
+    if eeprom_size:
+        start = int(str(info.get("Eeprom", EEPROM_WORD)), 0)
+        regions["eeprom"] = (start, eeprom_size)
+
+    if int(str(info.get("Config", 0)), 0):
+        start = int(str(info["Config"]), 0)
+        regions["config"] = (start, int(info.get("ConfigSize", 0)) or 1)
+    elif device is not None:
+        if baseline:
+            regions["config"] = (BASELINE_CONFIG_WORD, 1)
+        else:
+            regions["config"] = (CONFIG_WORD, CONFIG_WORDS)
+    return regions
+
+
+class HexImage:
+    """Sparse byte image loaded from (or written to) an Intel HEX file."""
+
+    def __init__(self, data: Optional[Dict[int, int]] = None):
+        self.data: Dict[int, int] = dict(data or {})
+
+    @classmethod
+    def from_text(cls, text: str) -> "HexImage":
+        data = {}
+        base = 0
+        for lineno, line in enumerate(text.splitlines(), 1):
+            line = line.strip()
+            if not line:
+                continue
+            if not line.startswith(":"):
+                raise HexFormatError(f"line {lineno}: missing ':'")
+            try:
+                raw = bytes.fromhex(line[1:])
+            except ValueError:
+                raise HexFormatError(f"line {lineno}: invalid hex digits") from None
+            if len(raw) < 5 or len(raw) != raw[0] + 5:
+                raise HexFormatError(f"line {lineno}: bad record length")
+            if sum(raw) & 0xFF:
+                raise HexFormatError(f"line {lineno}: bad checksum")
+
+            count, address, rectype = raw[0], (raw[1] << 8) | raw[2], raw[3]
+            payload = raw[4 : 4 + count]
+            if rectype == 0x00:
+                for offset, value in enumerate(payload):
+                    data[base + address + offset] = value
+            elif rectype == 0x01:
+                break
+            elif rectype == 0x02:
+                base = ((payload[0] << 8) | payload[1]) << 4
+            elif rectype == 0x04:
+                base = ((payload[0] << 8) | payload[1]) << 16
+            # 0x03/0x05 (start address) are meaningless on PIC and ignored
+        return cls(data)
+
+    @classmethod
+    def load(cls, path) -> "HexImage":
+        return cls.from_text(Path(path).read_text(encoding="ascii", errors="replace"))
+
+    def copy(self) -> "HexImage":
+        return HexImage(self.data)
+
+    # Word access (PIC program/config/EEPROM words)
+
+    def get_word(
+        self, word_address: int, default: Optional[int] = None
+    ) -> Optional[int]:
+        low = self.data.get(2 * word_address)
+        high = self.data.get(2 * word_address + 1)
+        if low is None and high is None:
+            return default
+        return (low or 0) | ((high or 0) << 8)
+
+    def set_word(self, word_address: int, value: int) -> None:
+        self.data[2 * word_address] = value & 0xFF
+        self.data[2 * word_address + 1] = (value >> 8) & 0xFF
+
+    def words(self, start: int, count: int, fill: int = 0x3FFF) -> List[int]:
+        """Return ``count`` words from word address ``start`` (gaps filled)."""
+        return [self.get_word(start + i, fill) for i in range(count)]
+
+    def word_addresses(self) -> List[int]:
+        """Return the sorted word addresses holding data."""
+        return sorted({address >> 1 for address in self.data})
+
+    def region(self, start_word: int, count: int) -> "HexImage":
+        """Return a new image restricted to ``count`` words from ``start_word``."""
+        low, high = 2 * start_word, 2 * (start_word + count)
+        return HexImage({a: v for a, v in self.data.items() if low <= a < high})
+
+    def used_words(self, start: int, count: int) -> int:
+        """Return how many words of a region hold data."""
+        return sum(1 for a in self.word_addresses() if start <= a < start + count)
+
+    # Serialization
+
+    def _segments(self) -> Iterable[Tuple[int, bytes]]:
+        """Yield (address, bytes) runs of consecutive data, split at 16 bytes."""
+        run_start, run = None, bytearray()
+        for address in sorted(self.data):
+            if run and (
+                address != run_start + len(run)
+                or len(run) == 16
+                or address >> 16 != run_start >> 16
+            ):
+                yield run_start, bytes(run)
+                run_start, run = None, bytearray()
+            if not run:
+                run_start = address
+            run.append(self.data[address])
+        if run:
+            yield run_start, bytes(run)
+
+    @staticmethod
+    def _record(address: int, rectype: int, payload: bytes) -> str:
+        raw = bytes([len(payload), (address >> 8) & 0xFF, address & 0xFF, rectype])
+        raw += payload
+        checksum = (-sum(raw)) & 0xFF
+        return ":" + (raw + bytes([checksum])).hex().upper()
+
+    def to_text(self) -> str:
+        """Serialize the image, recomputing every record checksum."""
+        lines = []
+        upper = 0
+        for address, payload in self._segments():
+            if address >> 16 != upper:
+                upper = address >> 16
+                lines.append(self._record(0, 0x04, bytes([upper >> 8, upper & 0xFF])))
+            lines.append(self._record(address & 0xFFFF, 0x00, payload))
+        lines.append(self._record(0, 0x01, b""))
+        return "\n".join(lines) + "\n"
+
+    def write(self, path) -> None:
+        Path(path).write_text(self.to_text(), encoding="ascii")
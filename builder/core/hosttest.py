@@ -0,0 +1,308 @@
+"""
+Host-native unit tests: project C code compiled with the system compiler
+
+``pio run -t hosttest`` builds every test in the project ``test/`` directory
+(``test_*.c`` files, or ``test_*/`` directories of C files) together with
+the project C sources, minus the one defining ``main()``, and runs them as
+ordinary Linux programs. ``<xc.h>`` is replaced by a generated header
+neutralizing the XC8 keywords and including the device stubs (or
+``pic_universal_stubs.h``). A generated shim defines the SFR storage.
+Objects are rebuilt only when a source or header changes; tests are
+compiled and run in parallel processes.
+"""
+
+import fnmatch
+import hashlib
+import os
+import re
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from .sfr import read_registers, register_source
+from .stubs import ensure_device_stubs
+from .templates import render_template, template_environment, write_if_changed
+from .toolchain import normalize_device
+
+HOST_FLAGS = ["-std=gnu99", "-g", "-O0", "-Wall", "-Wno-unknown-pragmas"]
+
+_MAIN_RE = re.compile(r"^\s*(?:void|int)\s+main\s*\(", re.MULTILINE)
+_STUB_SYMBOL_RE = re.compile(r"extern\s+volatile\s+\w+\s+(\w+)\s*;")
+
+# Each SFR of pic_universal_stubs.h gets its own slot (no addresses known)
+_UNIVERSAL_SLOT = 4
+
+
+def _family(name: str, names) -> Tuple[str, int]:
+    """Return the slot owner of a stub symbol and its offset in the slot.
+
+    ``<name>L``/``<name>H`` are the bytes of the 16-bit ``<name>`` (TMR1,
+    ADRES...) when the header declares both or the whole register.
+    """
+    if name.endswith("bits"):
+        name = name[:-4]
+    root, half = name[:-1], name[-1:]
+    if half in ("L", "H") and (
+        root in names or f"{root}{'H' if half == 'L' else 'L'}" in names
+    ):
+        return root, int(half == "H")
+    return name, 0
+
+
+def host_symbols(stubs_header: Path, registers) -> Tuple[List[Tuple[str, int]], int]:
+    """Return the ``(symbol, offset)`` pairs of the SFR shim and its size.
+
+    With a register layout every register sits at its data address;
+    otherwise the symbols of the stubs header get consecutive slots, the
+    ``<name>L``/``<name>H`` bytes overlapping ``<name>`` like on the device.
+    """
+    symbols = []
+    if registers:
+        for reg in registers:
+            symbols.append((reg.name, reg.address))
+            if reg.fields:
+                symbols.append((f"{reg.name}bits", reg.address))
+        size = max(reg.address + reg.size for reg in registers)
+    else:
+        slots = {}
+        declared = _STUB_SYMBOL_RE.findall(stubs_header.read_text())
+        for name in declared:
+            base, offset = _family(name, set(declared))
+            slots.setdefault(base, len(slots) * _UNIVERSAL_SLOT)
+            symbols.append((name, slots[base] + offset))
+        size = len(slots) * _UNIVERSAL_SLOT
+    # Bit-field structs are accessed as 32-bit units
+    return symbols, size + 4
+
+
+def generate_host_support(ctx, host_dir: Path) -> Path:
+    """Write the host ``xc.h`` and SFR shim; return the shim source."""
+    include_dir = host_dir / "include"
+    device = normalize_device(ctx.device)
+
+    device_stubs = ensure_device_stubs(ctx.device, ctx.toolchain, ctx.cache_dir)
+    if device_stubs:
+        stubs_path = device_stubs
+        source = register_source(ctx.device, ctx.toolchain)
+        registers = read_registers(source)
+    else:
+        stubs_path = ctx.framework_dir / "pic_universal_stubs.h"
+        registers = []
+    symbols, size = host_symbols(stubs_path, registers)
+
+    write_if_changed(
+        include_dir / "xc.h",
+        render_template(
+            "pic_host_xc.h.j2",
+            device=device,
+            device_upper=device.upper(),
+            f_cpu=ctx.f_cpu,
+            clean_f_cpu=ctx.clean_f_cpu,
+            stubs_path=stubs_path.as_posix(),
+        ),
+    )
+    shim = host_dir / "pic_host_sfr.c"
+    write_if_changed(
+        shim,
+        render_template(
+            "pic_host_sfr.c.j2",
+            device_upper=device.upper(),
+            source_name=stubs_path.name,
+            symbols=symbols,
+            size=size,
+        ),
+    )
+    print(f"[HOSTTEST] SFR shim: {len(symbols)} symbols from {stubs_path.name}")
+    return shim
+
+
+def discover_tests(test_dir: Path, pattern: str = "*") -> List[Tuple[str, List[Path]]]:
+    """Return ``(name, sources)`` of each test matching ``pattern``."""
+    tests = []
+    if not test_dir.is_dir():
+        return tests
+    for entry in sorted(test_dir.iterdir()):
+        if not entry.name.startswith("test_") or not fnmatch.fnmatch(
+            entry.name, pattern
+        ):
+            continue
+        if entry.is_dir():
+            sources = sorted(entry.rglob("*.c"))
+            if sources:
+                tests.append((entry.name, sources))
+        elif entry.suffix == ".c":
+            tests.append((entry.stem, [entry]))
+    return tests
+
+
+def _up_to_date(obj: Path, depfile: Path) -> bool:
+    """True if ``obj`` is newer than every dependency listed by -MMD."""
+    if not obj.exists() or not depfile.exists():
+        return False
+    text = depfile.read_text().replace("\\\n", " ")
+    deps = text.split(":", 1)[1].split() if ":" in text else []
+    built = obj.stat().st_mtime
+    try:
+        return all(Path(dep).stat().st_mtime <= built for dep in deps)
+    except OSError:
+        return False
+
+
+class HostCompiler:
+    """System C compiler invocations with per-object dependency checks."""
+
+    def __init__(self, cc: str, flags: List[str], obj_dir: Path):
+        self.cc = cc
+        self.flags = flags
+        self.obj_dir = obj_dir
+
+    def object_for(self, source: Path) -> Path:
+        # Unique, readable object names for sources from any directory; the
+        # compiler and flags are part of the name so that changing them
+        # (-D, -I, custom_host_flags) never reuses an object built with others
+        key = "\n".join([str(source.resolve()), self.cc, *self.flags])
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:8]
+        return self.obj_dir / f"{source.stem}_{digest}.o"
+
+    def compile(self, source: Path) -> Tuple[Optional[Path], str]:
+        obj = self.object_for(source)
+        depfile = obj.with_suffix(".d")
+        if _up_to_date(obj, depfile):
+            return obj, ""
+        cmd = [
+            self.cc,
+            *self.flags,
+            "-MMD",
+            "-MF",
+            str(depfile),
+            "-c",
+            str(source),
+            "-o",
+            str(obj),
+        ]
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            return None, result.stderr or result.stdout
+        return obj, result.stderr
+
+    def link(self, objects: List[Path], output: Path) -> Tuple[bool, str]:
+        result = subprocess.run(
+            [self.cc, *[str(o) for o in objects], "-o", str(output)],
+            capture_output=True,
+            text=True,
+        )
+        return result.returncode == 0, result.stderr or result.stdout
+
+
+def _host_flags(ctx, include_dir: Path) -> List[str]:
+    device = normalize_device(ctx.device).upper()
+    flags = list(HOST_FLAGS)
+    flags += [
+        "-DPIC_HOST_TEST=1",
+        f"-D_{device}",
+        f"-D__{device}__",
+        f"-D_XTAL_FREQ={ctx.clean_f_cpu}UL",
+        f"-I{include_dir}",
+        f"-I{ctx.framework_dir}",
+        f"-I{ctx.project_src_dir}",
+    ]
+    project_include = ctx.project_dir / "include"
+    if project_include.is_dir():
+        flags.append(f"-I{project_include}")
+    # Only preprocessor flags of build_flags make sense on the host
+    flags += [
+        flag
+        for flag in ctx.env.get("BUILD_FLAGS", [])
+        if flag.startswith(("-D", "-U", "-I"))
+    ]
+    extra = ctx.project_option("custom_host_flags", "")
+    flags += extra.split() if isinstance(extra, str) else list(extra)
+    return flags
+
+
+def _run_test(executable: Path, timeout: float) -> Tuple[bool, str]:
+    try:
+        result = subprocess.run(
+            [str(executable)], capture_output=True, text=True, timeout=timeout
+        )
+    except subprocess.TimeoutExpired:
+        return False, f"timed out after {timeout:g} s"
+    output = (result.stdout + result.stderr).strip()
+    if result.returncode != 0:
+        output += f"\nexit status {result.returncode}"
+    return result.returncode == 0, output
+
+
+def run_host_tests(ctx) -> bool:
+    """Build and run the host unit tests; return True if all passed."""
+    test_dir = ctx.env.subst("$PROJECT_TEST_DIR")
+    test_dir = (
+        Path(test_dir) if test_dir and "$" not in test_dir else ctx.project_dir / "test"
+    )
+    pattern = ctx.project_option("custom_host_test_filter", "*")
+    tests = discover_tests(test_dir, pattern)
+    if not tests:
+        print(f"[HOSTTEST] No test_*.c tests found in {test_dir}")
+        return True
+
+    template_environment(ctx.cache_dir)
+    host_dir = ctx.build_dir / "hosttest"
+    obj_dir = host_dir / "obj"
+    obj_dir.mkdir(parents=True, exist_ok=True)
+    shim = generate_host_support(ctx, host_dir)
+
+    cc = ctx.project_option("custom_host_cc", "") or os.environ.get("CC", "cc")
+    jobs = int(ctx.project_option("custom_host_test_jobs", 0) or os.cpu_count() or 1)
+    timeout = float(ctx.project_option("custom_host_test_timeout", 10))
+    compiler = HostCompiler(cc, _host_flags(ctx, host_dir / "include"), obj_dir)
+
+    # Project sources shared by every test: all C files except main()
+    project_sources = [
+        Path(f)
+        for f in ctx.c_files
+        if not _MAIN_RE.search(Path(f).read_text(errors="replace"))
+    ]
+    all_sources = list(
+        dict.fromkeys(
+            [shim, *project_sources, *(src for _, sources in tests for src in sources)]
+        )
+    )
+    print(f"[HOSTTEST] Compiling {len(all_sources)} sources with {cc} ({jobs} jobs)")
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        compiled = dict(zip(all_sources, pool.map(compiler.compile, all_sources)))
+    failed = False
+    for source, (obj, messages) in compiled.items():
+        if messages:
+            print(messages.rstrip())
+        if obj is None:
+            print(f"[HOSTTEST] ❌ Failed to compile {source}")
+            failed = True
+    if failed:
+        return False
+
+    common = [compiled[shim][0]] + [compiled[src][0] for src in project_sources]
+
+    def build_and_run(test):
+        name, sources = test
+        executable = host_dir / name
+        ok, messages = compiler.link(
+            common + [compiled[s][0] for s in sources], executable
+        )
+        if not ok:
+            return name, False, f"link failed:\n{messages}"
+        return (name, *_run_test(executable, timeout))
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        results = list(pool.map(build_and_run, tests))
+
+    passed = 0
+    for name, ok, output in results:
+        print(f"[HOSTTEST] {'✅ PASS' if ok else '❌ FAIL'} {name}")
+        if output and not ok:
+            for line in output.splitlines():
+                print(f"[HOSTTEST]     {line}")
+        passed += ok
+    print(f"[HOSTTEST] {passed}/{len(results)} tests passed")
+    return passed == len(results)
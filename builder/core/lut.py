@@ -0,0 +1,293 @@
+"""
+Lookup tables generated at build time
+
+``custom_lut_generators`` declares Python functions computing tables
+(sines, CRCs, calibration curves...), one per line::
+
+    custom_lut_generators =
+        tables/sine.py:sine length=256 amplitude=127
+        tables/crc.py:crc8_table poly=0x07
+
+The path is relative to the project. The parameters are Python literals
+(strings otherwise), passed as keyword arguments; a ``target`` argument, when
+the function has one, receives the MCU, flash words, RAM bytes and clock of
+the board. A function returns a sequence of integers, or a mapping of C names
+to sequences. Each table becomes a ``const`` array in flash of the smallest
+integer type holding its values, in ``lut_<function>.c`` with a
+``lut_<function>.h`` header under ``$BUILD_DIR/lut``.
+
+A table is only recomputed when the generator file, its parameters or the
+target change. On PIC16 parts every table byte takes a program word
+(``RETLW``); the stage fails when the tables would take more than
+``custom_lut_flash_percent`` (default 50) of the flash.
+"""
+
+import ast
+import hashlib
+import importlib.util
+import inspect
+import json
+import re
+import shlex
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+from .templates import write_if_changed
+
+LUT_DIR_NAME = "lut"
+# Bumped when the generated C changes for the same inputs
+LUT_FORMAT = 1
+
+# Smallest first: (C type, bytes, min, max)
+C_TYPES = [
+    ("unsigned char", 1, 0, 0xFF),
+    ("signed char", 1, -0x80, 0x7F),
+    ("unsigned int", 2, 0, 0xFFFF),
+    ("int", 2, -0x8000, 0x7FFF),
+    ("unsigned long", 4, 0, 0xFFFFFFFF),
+    ("long", 4, -0x80000000, 0x7FFFFFFF),
+]
+
+_NAME_RE = re.compile(r"[A-Za-z_]\w*")
+
+
+class LutGeneratorError(ValueError):
+    """A lookup table generator that cannot be run or whose output is invalid."""
+
+
+class LutGenerator:
+    """One line of ``custom_lut_generators``.
+
+    Attributes:
+        path: Generator file
+        function: Name of the generating function
+        params: Keyword arguments
+    """
+
+    def __init__(self, path: Path, function: str, params: Dict):
+        self.path = path
+        self.function = function
+        self.params = params
+
+    @property
+    def stem(self) -> str:
+        return f"lut_{self.function}"
+
+
+def parse_generators(text: str, project_dir: Path) -> List[LutGenerator]:
+    """Parse ``custom_lut_generators``.
+
+    Raises:
+        LutGeneratorError: for a malformed line
+    """
+    generators = []
+    for line in str(text).splitlines():
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+        words = shlex.split(line)
+        path, sep, function = words[0].rpartition(":")
+        if not sep or not _NAME_RE.fullmatch(function):
+            raise LutGeneratorError(f"expected <file.py>:<function>: {words[0]}")
+        params = {}
+        for word in words[1:]:
+            key, sep, value = word.partition("=")
+            if not sep or not _NAME_RE.fullmatch(key):
+                raise LutGeneratorError(f"expected name=value: {word}")
+            try:
+                params[key] = ast.literal_eval(value)
+            except (ValueError, SyntaxError):
+                params[key] = value
+        generators.append(LutGenerator(Path(project_dir) / path, function, params))
+    return generators
+
+
+def target_info(ctx) -> Dict:
+    """The ``target`` argument of the generators."""
+    board = ctx.env.BoardConfig()
+    return {
+        "mcu": ctx.device,
+        "flash_words": int(board.get("upload.maximum_size", 8192)),
+        "ram_bytes": int(board.get("upload.maximum_ram_size", 368)),
+        "f_cpu": int(ctx.clean_f_cpu),
+    }
+
+
+def c_type_for(values: Sequence[int]) -> Tuple[str, int]:
+    """Return the smallest C type holding every value, and its size."""
+    low, high = min(values), max(values)
+    for name, size, minimum, maximum in C_TYPES:
+        if minimum <= low and high <= maximum:
+            return name, size
+    raise LutGeneratorError(f"values {low}..{high} do not fit in 32 bits")
+
+
+def _tables(generator: LutGenerator, result) -> Dict[str, List[int]]:
+    if isinstance(result, dict):
+        items = list(result.items())
+    else:
+        items = [(generator.function, result)]
+    tables = {}
+    for name, values in items:
+        if not isinstance(name, str) or not _NAME_RE.fullmatch(name):
+            raise LutGeneratorError(f"invalid C name for a table: {name!r}")
+        try:
+            values = list(values)
+        except TypeError:
+            raise LutGeneratorError(f"{name}: not a sequence of integers") from None
+        if not values:
+            raise LutGeneratorError(f"{name}: empty table")
+        for value in values:
+            # bool is an int, floats need an explicit scaling to fixed point
+            if not isinstance(value, int) or isinstance(value, bool):
+                raise LutGeneratorError(
+                    f"{name}: {value!r} is not an integer (scale to fixed point)"
+                )
+        tables[name] = values
+    return tables
+
+
+def run_generator(generator: LutGenerator, target: Dict) -> Dict[str, List[int]]:
+    """Import the generator file and call its function.
+
+    Raises:
+        LutGeneratorError: when the file, the function or its output is invalid
+    """
+    spec = importlib.util.spec_from_file_location(
+        f"pic8bit_lut_{generator.path.stem}", generator.path
+    )
+    module = importlib.util.module_from_spec(spec)
+    try:
+        spec.loader.exec_module(module)
+    except Exception as e:
+        raise LutGeneratorError(f"{generator.path.name}: {e}") from e
+    function = getattr(module, generator.function, None)
+    if not callable(function):
+        raise LutGeneratorError(
+            f"{generator.path.name} has no function {generator.function}()"
+        )
+
+    params = dict(generator.params)
+    if "target" in inspect.signature(function).parameters:
+        params["target"] = target
+    try:
+        result = function(**params)
+    except Exception as e:
+        raise LutGeneratorError(f"{generator.function}(): {e}") from e
+    return _tables(generator, result)
+
+
+def _literal(value: int) -> str:
+    # 2147483648 is not a long: the smallest long is written as an expression
+    return "(-2147483647L - 1)" if value == -0x80000000 else str(value)
+
+
+def render_tables(stem: str, tables: Dict[str, List[int]]) -> Tuple[str, str]:
+    """Return the C source and header of a generator's tables."""
+    guard = f"{stem.upper()}_H"
+    header = [
+        "// Generated by the lut stage - do not edit",
+        f"#ifndef {guard}",
+        f"#define {guard}",
+        "",
+    ]
+    source = ["// Generated by the lut stage - do not edit", f'#include "{stem}.h"']
+    for name, values in tables.items():
+        c_type, _ = c_type_for(values)
+        header.append(f"#define {name.upper()}_LENGTH {len(values)}")
+        header.append(f"extern const {c_type} {name}[{len(values)}];")
+        source.append("")
+        source.append(f"const {c_type} {name}[{len(values)}] = {{")
+        for start in range(0, len(values), 12):
+            row = ", ".join(_literal(value) for value in values[start : start + 12])
+            source.append(f"    {row},")
+        source.append("};")
+    header.extend(["", f"#endif // {guard}"])
+    return "\n".join(source) + "\n", "\n".join(header) + "\n"
+
+
+def _cache_key(generator: LutGenerator, target: Dict) -> str:
+    digest = hashlib.sha1(generator.path.read_bytes())
+    digest.update(
+        json.dumps(
+            [LUT_FORMAT, generator.function, generator.params, target],
+            sort_keys=True,
+            default=repr,
+        ).encode("utf-8")
+    )
+    return digest.hexdigest()
+
+
+def generate_tables(
+    generator: LutGenerator, target: Dict, out_dir: Path
+) -> Tuple[Path, int, bool]:
+    """Write the tables of one generator unless its inputs are unchanged.
+
+    Returns:
+        ``(C source, table bytes, regenerated)``
+    """
+    if not generator.path.is_file():
+        raise LutGeneratorError(f"generator not found: {generator.path}")
+    source = out_dir / f"{generator.stem}.c"
+    stamp = out_dir / f"{generator.stem}.json"
+    key = _cache_key(generator, target)
+    try:
+        cached = json.loads(stamp.read_text())
+    except (OSError, ValueError):
+        cached = {}
+    if cached.get("key") == key and source.is_file():
+        return source, int(cached.get("bytes", 0)), False
+
+    tables = run_generator(generator, target)
+    c_source, c_header = render_tables(generator.stem, tables)
+    write_if_changed(source, c_source)
+    write_if_changed(out_dir / f"{generator.stem}.h", c_header)
+    size = sum(len(values) * c_type_for(values)[1] for values in tables.values())
+    stamp.write_text(json.dumps({"key": key, "bytes": size, "tables": list(tables)}))
+    return source, size, True
+
+
+def generate_luts(ctx) -> bool:
+    """Lut stage: run the ``custom_lut_generators`` and add their tables"""
+    text = ctx.project_option("custom_lut_generators", "")
+    if not str(text).strip():
+        return True
+    try:
+        generators = parse_generators(text, ctx.project_dir)
+    except LutGeneratorError as e:
+        print(f"[LUT] ❌ custom_lut_generators: {e}")
+        return False
+    stems = [generator.stem for generator in generators]
+    duplicates = sorted({stem for stem in stems if stems.count(stem) > 1})
+    if duplicates:
+        print(f"[LUT] ❌ Several generators named {', '.join(duplicates)}")
+        return False
+
+    out_dir = ctx.build_dir / LUT_DIR_NAME
+    out_dir.mkdir(parents=True, exist_ok=True)
+    target = target_info(ctx)
+    total = 0
+    for generator in generators:
+        try:
+            source, size, regenerated = generate_tables(generator, target, out_dir)
+        except LutGeneratorError as e:
+            print(f"[LUT] ❌ {e}")
+            return False
+        state = "generated" if regenerated else "cached"
+        print(f"[LUT] {generator.stem}: {size} bytes ({state})")
+        total += size
+        ctx.c_files.append(str(source))
+        ctx.sources.append(str(source))
+
+    # Every table byte is a RETLW instruction in program memory
+    percent = float(ctx.project_option("custom_lut_flash_percent", 50))
+    limit = int(target["flash_words"] * percent / 100)
+    if total > limit:
+        print(
+            f"[LUT] ❌ Tables take {total} program words, more than {percent:g}% "
+            f"of the {target['flash_words']} words of flash"
+        )
+        return False
+    ctx.include_dirs.append(str(out_dir))
+    print(f"[LUT] {len(generators)} generators, {total} program words of tables")
+    return True
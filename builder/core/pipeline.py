@@ -0,0 +1,212 @@
+"""
+Build pipeline shared by the PIC frameworks
+
+A build is a sequence of named stages (discover, lut, transpile, logs,
+compile, link, stack, runtime, size, postprocess) operating on a
+:class:`BuildContext`. Frameworks describe their differences in a
+:class:`FrameworkConfig` and may insert extra stages before or after the
+standard ones, so caching, parallelism and instrumentation only have to be
+written once.
+"""
+
+import time
+import traceback
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .cache import platform_cache_dir
+from .templates import template_environment
+from .toolchain import XC8Toolchain, find_xc8_toolchain
+
+# A stage returns False to abort the build
+StageFunction = Callable[["BuildContext"], bool]
+
+
+class FrameworkConfig:
+    """Framework specific behaviour of the shared pipeline.
+
+    Attributes:
+        name: Framework name as used in ``platformio.ini``
+        tag: Log prefix of the transpile stage (``C++``, ``ARDUINO``)
+        allow_assembly: Collect and build assembly sources
+        missing_main: What to do when a transpiled ``main.cpp`` has no
+            ``main()`` nor ``setup()``/``loop()``: ``"error"`` aborts the
+            build, ``"stub"`` adds empty Arduino ``setup()``/``loop()``
+        manual_transpile_fallback: Try ``cpp-multi/manual_transpile.py``
+            when xc8plusplus is not installed
+    """
+
+    def __init__(
+        self,
+        name: str,
+        tag: str,
+        allow_assembly: bool = True,
+        missing_main: str = "error",
+        manual_transpile_fallback: bool = False,
+    ):
+        self.name = name
+        self.tag = tag
+        self.allow_assembly = allow_assembly
+        self.missing_main = missing_main
+        self.manual_transpile_fallback = manual_transpile_fallback
+
+
+class BuildContext:
+    """State threaded through the stages of one build."""
+
+    def __init__(self, env, config: FrameworkConfig, target=None):
+        board = env.BoardConfig()
+        self.env = env
+        self.config = config
+        self.target = target
+
+        self.device = board.get("build.mcu", "pic16f876a")
+        self.f_cpu = str(board.get("build.f_cpu", "4000000L"))
+        self.clean_f_cpu = self.f_cpu.rstrip("LUlu")
+
+        self.project_dir = Path(env.subst("$PROJECT_DIR"))
+        self.project_src_dir = Path(env.subst("$PROJECT_SRC_DIR"))
+        self.build_dir = Path(env.subst("$BUILD_DIR"))
+        self.output_dir = self.build_dir / "output"
+        self.output_hex = self.output_dir / "firmware.hex"
+        self.platform_dir = Path(env.PioPlatform().get_dir())
+        self.framework_dir = self.platform_dir / "builder" / "frameworks"
+
+        self.cache_dir = platform_cache_dir(env.subst("$PROJECT_CORE_DIR"))
+        self.toolchain: Optional[XC8Toolchain] = find_xc8_toolchain(
+            env.GetProjectOption("custom_xc8_path", None)
+        )
+
+        # Filled by the stages
+        self.cpp_files: List[str] = []
+        self.c_files: List[str] = []
+        self.asm_files: List[str] = []
+        self.header_files: List[str] = []
+        self.sources: List[str] = []
+        # Added by framework stages: include directories, preprocessor
+        # definitions (NAME=value), libraries to link. <pic_log.h> is
+        # available to every build.
+        self.include_dirs: List[str] = [str(self.framework_dir / "pic_log")]
+        self.defines: List[str] = []
+        self.libraries: List[str] = []
+        self.xc8_args: List[str] = []
+        self.has_assembly = False
+        self.has_c_files = False
+        # -O flags replacing OPTIMIZATION_LEVEL and build_flags (sweep builds)
+        self.optimization_flags: Optional[List[str]] = None
+        # Free-form results of optional stages (reports, analyses...)
+        self.results: Dict[str, object] = {}
+
+    def board_option(self, name: str, default=None):
+        """Return a ``board_build.<name>`` option."""
+        return self.env.BoardConfig().get(f"build.{name}", default)
+
+    def project_option(self, name: str, default=None):
+        """Return a ``platformio.ini`` option of the current environment."""
+        return self.env.GetProjectOption(name, default)
+
+
+class Pipeline:
+    """Ordered list of named build stages."""
+
+    def __init__(self, stages: Optional[List[Tuple[str, StageFunction]]] = None):
+        self.stages: List[Tuple[str, StageFunction]] = list(stages or [])
+
+    def names(self) -> List[str]:
+        return [name for name, _ in self.stages]
+
+    def _index(self, name: str) -> int:
+        try:
+            return self.names().index(name)
+        except ValueError:
+            raise KeyError(f"Unknown pipeline stage: {name}") from None
+
+    def add(
+        self,
+        name: str,
+        stage: StageFunction,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+    ) -> "Pipeline":
+        """Register a stage, appended or positioned relative to another one."""
+        if before is not None:
+            self.stages.insert(self._index(before), (name, stage))
+        elif after is not None:
+            self.stages.insert(self._index(after) + 1, (name, stage))
+        else:
+            self.stages.append((name, stage))
+        return self
+
+    def replace(self, name: str, stage: StageFunction) -> "Pipeline":
+        """Swap the implementation of an existing stage."""
+        self.stages[self._index(name)] = (name, stage)
+        return self
+
+    def run(self, ctx: BuildContext) -> int:
+        """Run every stage in order.
+
+        Returns:
+            0 on success, 1 if a stage failed (SCons action convention)
+        """
+        template_environment(ctx.cache_dir)
+        timings = []
+        try:
+            for name, stage in self.stages:
+                started = time.perf_counter()
+                ok = stage(ctx)
+                timings.append((name, time.perf_counter() - started))
+                if not ok:
+                    print(f"[ERROR] Build stage '{name}' failed")
+                    return 1
+        except Exception as e:
+            print(f"[ERROR] Build error: {e}")
+            traceback.print_exc()
+            return 1
+        finally:
+            if timings:
+                summary = ", ".join(f"{name} {secs:.2f}s" for name, secs in timings)
+                print(f"[PIPELINE] Stage timings: {summary}")
+        return 0
+
+
+def default_pipeline() -> Pipeline:
+    """Return the standard pipeline, from source discovery to firmware.hex."""
+    from .callgraph import check_stack_depth
+    from .lut import generate_luts
+    from .runtime_routines import check_runtime_routines
+    from .size_report import report_size
+    from .sources import discover_sources
+    from .tokenized_log import tokenize_logs
+    from .transpile import transpile_sources
+    from .xc8 import compile_arguments, copy_firmware, link_firmware
+
+    return Pipeline(
+        [
+            ("discover", discover_sources),
+            ("lut", generate_luts),
+            ("transpile", transpile_sources),
+            ("logs", tokenize_logs),
+            ("compile", compile_arguments),
+            ("link", link_firmware),
+            ("stack", check_stack_depth),
+            ("runtime", check_runtime_routines),
+            ("size", report_size),
+            ("postprocess", copy_firmware),
+        ]
+    )
+
+
+def make_build_action(config: FrameworkConfig, pipeline: Pipeline):
+    """Wrap a pipeline into an SCons action building ``firmware.hex``."""
+
+    def build_firmware(target, source, env):
+        print("=" * 80)
+        print(
+            f"[BUILD] *** {config.name} build *** "
+            "Starting XC8 build with xc8-wrapper..."
+        )
+        print(f"[BUILD] Stages: {' -> '.join(pipeline.names())}")
+        print("=" * 80)
+        return pipeline.run(BuildContext(env, config, target))
+
+    return build_firmware
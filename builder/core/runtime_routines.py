@@ -0,0 +1,220 @@
+"""
+Post-link detection of costly XC8 runtime routines
+
+A ``float`` variable, a ``long`` division or a ``printf()`` quietly links
+XC8 library routines of hundreds of words, each call costing hundreds to
+thousands of cycles on a PIC16 without hardware multiply or divide. After
+the link, the listing tells which of these routines are in the image, their
+size (with the helpers only they use), the source lines calling them and
+whether the interrupt function reaches them.
+
+The cycle figures are typical costs of one call on a mid-range core, to
+rank the routines; ``pio run -t profile`` measures the real ones.
+"""
+
+import json
+import re
+from typing import Dict, List, Optional, Set, Tuple
+
+from .cache import write_atomic
+from .callgraph import build_call_graph
+from .xc8_outputs import XC8Outputs, c_name
+
+REPORT_NAME = "runtime_routines.json"
+
+# (assembly name pattern, category, typical cycles per call)
+HEAVY_ROUTINES: List[Tuple[str, str, int]] = [
+    (r"___(ft|fl)(add|sub)", "float", 400),
+    (r"___(ft|fl)mul", "float", 900),
+    (r"___(ft|fl)div", "float", 1500),
+    (r"___(ft|fl)\w+|___\w+to(ft|fl)", "float", 150),
+    (
+        r"_(sin|cos|tan|asin|acos|atan|atan2|sinh|cosh|tanh|exp|log|log10|pow"
+        r"|sqrt|fmod|floor|ceil|frexp|ldexp|modf|round|trunc|atof|strtod)f?",
+        "float math",
+        5000,
+    ),
+    (r"___[al]l(div|mod)", "32-bit divide", 1000),
+    (r"___lmul", "32-bit multiply", 500),
+    (r"___[al]t(div|mod)|___tmul", "24-bit arithmetic", 400),
+    (r"___[al]w(div|mod)", "16-bit divide", 250),
+    (r"___wmul", "16-bit multiply", 150),
+    (r"___[al]?b(div|mod|mul)", "8-bit multiply/divide", 60),
+    (r"_(v?s?n?printf|vfprintf|fprintf|cprintf)|_+doprnt|_vfp\w+", "printf", 5000),
+]
+_PATTERNS = [
+    (re.compile(f"(?:{pattern})$"), category, cycles)
+    for pattern, category, cycles in HEAVY_ROUTINES
+]
+
+
+def classify(name: str) -> Optional[Tuple[str, int]]:
+    """Return ``(category, typical cycles)`` of a heavy routine, or None."""
+    for pattern, category, cycles in _PATTERNS:
+        if pattern.match(name):
+            return category, cycles
+    return None
+
+
+def _is_library(name: str) -> bool:
+    return name.startswith("__") or classify(name) is not None
+
+
+def _reachable(graph: Dict[str, Set[str]], root: str) -> Set[str]:
+    seen = {root}
+    stack = [root]
+    while stack:
+        for callee in graph.get(stack.pop(), ()):
+            if callee not in seen:
+                seen.add(callee)
+                stack.append(callee)
+    return seen
+
+
+def _isr_name(outputs: XC8Outputs) -> Optional[str]:
+    # The interrupt function is the one returning with RETFIE
+    return next(
+        (line.function for line in outputs.listing() if line.opcode == 0x0009),
+        None,
+    )
+
+
+def analyze_runtime_routines(outputs: XC8Outputs) -> Optional[Dict]:
+    """Find the heavy runtime routines of a link (None without a listing).
+
+    Returns:
+        ``{"routines": [...], "shared_helper_words": n, "isr": name,
+        "isr_routines": [...]}``; each routine has its category, own words,
+        words of the helpers no other heavy routine reaches, typical cycles,
+        call sites (``file:line`` of direct calls) and the user functions
+        calling it. Helpers reached by several heavy routines are counted
+        once, in ``shared_helper_words``
+    """
+    listing = outputs.listing()
+    if not listing:
+        return None
+    graph = build_call_graph(outputs)
+    words: Dict[str, int] = {}
+    for line in listing:
+        if line.function:
+            words[line.function] = words.get(line.function, 0) + 1
+
+    isr = _isr_name(outputs)
+    heavy = {name: classify(name) for name in graph if classify(name)}
+
+    sites: Dict[str, List[str]] = {name: [] for name in heavy}
+    for line in listing:
+        if not line.function or (line.opcode & 0x3800) != 0x2000:
+            continue  # not a CALL instruction
+        for callee in graph.get(line.function, ()):
+            if callee in heavy and re.search(rf"\b{re.escape(callee)}\b", line.text):
+                where = f"{line.source[0]}:{line.source[1]}" if line.source else "?"
+                if not _is_library(line.function):
+                    where = f"{c_name(line.function)} ({where})"
+                else:
+                    where = c_name(line.function)
+                if where not in sites[callee]:
+                    sites[callee].append(where)
+
+    # Library helpers (packing, normalization...) below each heavy routine
+    helpers = {
+        name: {
+            callee
+            for callee in _reachable(graph, name) - {name}
+            if _is_library(callee) and callee not in heavy
+        }
+        for name in heavy
+    }
+    users: Dict[str, int] = {}
+    for reached in helpers.values():
+        for helper in reached:
+            users[helper] = users.get(helper, 0) + 1
+
+    routines = []
+    for name, (category, cycles) in sorted(heavy.items()):
+        callers = sorted(
+            c_name(caller)
+            for caller, callees in graph.items()
+            if name in callees and not _is_library(caller)
+        )
+        # Helpers pulled in by this routine only
+        own_helpers = [helper for helper in helpers[name] if users[helper] == 1]
+        routines.append(
+            {
+                "name": c_name(name),
+                "category": category,
+                "words": words.get(name, 0),
+                "helper_words": sum(words.get(helper, 0) for helper in own_helpers),
+                "cycles": cycles,
+                "callers": callers,
+                "sites": sites[name],
+            }
+        )
+
+    isr_routines = []
+    if isr is not None:
+        isr_routines = sorted(
+            c_name(name) for name in _reachable(graph, isr) if name in heavy
+        )
+    shared = [helper for helper, count in users.items() if count > 1]
+    return {
+        "routines": routines,
+        "shared_helper_words": sum(words.get(helper, 0) for helper in shared),
+        "isr": isr and c_name(isr),
+        "isr_routines": isr_routines,
+    }
+
+
+def summarize_runtime_routines(report: Dict) -> List[str]:
+    """Return the console lines of a report."""
+    routines = report["routines"]
+    if not routines:
+        return ["No float, long division or printf routines linked"]
+    shared = report.get("shared_helper_words", 0)
+    total = sum(r["words"] + r["helper_words"] for r in routines) + shared
+    lines = [f"{len(routines)} costly runtime routines linked, {total} words:"]
+    for r in sorted(routines, key=lambda r: -(r["words"] + r["helper_words"])):
+        size = r["words"] + r["helper_words"]
+        callers = ", ".join(r["sites"][:3]) or "library only"
+        if len(r["sites"]) > 3:
+            callers += f" +{len(r['sites']) - 3}"
+        lines.append(
+            f"  {r['name']:<12} {r['category']:<20} {size:>5} words "
+            f"~{r['cycles']} cycles/call  <- {callers}"
+        )
+    if shared:
+        lines.append(f"  {shared} words of helpers shared by several routines")
+    if report["isr_routines"]:
+        lines.append(
+            f"Interrupt {report['isr']} reaches: {', '.join(report['isr_routines'])}"
+        )
+    return lines
+
+
+def check_runtime_routines(ctx) -> bool:
+    """Post-link stage: report float, long division and printf routines
+
+    ``custom_runtime_check``: ``report`` (default) only reports, ``isr``
+    fails the build when the interrupt function reaches one of them, ``no``
+    skips the analysis.
+    """
+    mode = str(ctx.project_option("custom_runtime_check", "report")).lower()
+    if mode in ("no", "false", "0", "off"):
+        return True
+
+    report = analyze_runtime_routines(XC8Outputs(ctx.output_dir))
+    if report is None:
+        print("[RUNTIME] ⚠️  No XC8 listing - runtime routines not checked")
+        return True
+    ctx.results["runtime"] = report
+    write_atomic(ctx.build_dir / REPORT_NAME, json.dumps(report, indent=2))
+    for line in summarize_runtime_routines(report):
+        print(f"[RUNTIME] {line}")
+
+    if mode == "isr" and report["isr_routines"]:
+        print(
+            "[RUNTIME] ❌ The interrupt function calls "
+            f"{', '.join(report['isr_routines'])} (custom_runtime_check = isr)"
+        )
+        return False
+    return True
@@ -0,0 +1,197 @@
+"""
+Special function register (SFR) layout of PIC devices
+
+The register layout is read from SFR data files exported from the device
+descriptions (``edc/<DEVICE>.PIC``) of the AtPacks by
+``scripts/create_boards.py --sfr-dir`` (``builder/sfr/*.json``). No data file
+is shipped with the platform: when none was exported for a part, the layout
+is recovered from the processor header of the installed XC8 compiler.
+"""
+
+import json
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .toolchain import XC8Toolchain, normalize_device
+
+# Default location of the SFR data files exported from the AtPacks
+SFR_DATA_DIR = Path(__file__).resolve().parent.parent / "sfr"
+
+
+class Register:
+    """A special function register and its bit fields.
+
+    Attributes:
+        name: Register name as used in C (``PORTB``)
+        address: Data memory address
+        size: Width in bytes (1 for 8-bit, 2 for 16-bit pairs like TMR1)
+        fields: ``(name, width)`` tuples from bit 0 upwards; ``name`` is None
+            for unimplemented bits
+        aliases: Alternate field layouts naming the same bits (``PS0``...)
+    """
+
+    def __init__(
+        self,
+        name: str,
+        address: int,
+        size: int = 1,
+        fields: Optional[List[Tuple[Optional[str], int]]] = None,
+        aliases: Optional[List[List[Tuple[Optional[str], int]]]] = None,
+    ):
+        self.name = name
+        self.address = address
+        self.size = size
+        self.fields = list(fields or [])
+        self.aliases = [list(layout) for layout in aliases or []]
+
+    def __repr__(self) -> str:
+        return f"Register({self.name!r}, 0x{self.address:03X}, size={self.size})"
+
+    def bit(self, field_name: str) -> Optional[int]:
+        """Return the bit position of a field, or None."""
+        for layout in [self.fields] + self.aliases:
+            position = 0
+            for name, width in layout:
+                if name == field_name:
+                    return position
+                position += width
+        return None
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "address": self.address,
+            "size": self.size,
+            "fields": [[name, width] for name, width in self.fields],
+            "aliases": [
+                [[name, width] for name, width in layout] for layout in self.aliases
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Register":
+        return cls(
+            data["name"],
+            int(data["address"]),
+            int(data.get("size", 1)),
+            [(name, int(width)) for name, width in data.get("fields", [])],
+            [
+                [(name, int(width)) for name, width in layout]
+                for layout in data.get("aliases", [])
+            ],
+        )
+
+
+def sfr_data_file(device: str, data_dir: Optional[Path] = None) -> Path:
+    """Return the path of the SFR data file for ``device``."""
+    return Path(data_dir or SFR_DATA_DIR) / f"pic{normalize_device(device)}.json"
+
+
+def save_registers(path: Path, device: str, registers: List[Register]) -> None:
+    """Write an SFR data file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = {
+        "device": f"PIC{normalize_device(device).upper()}",
+        "registers": [r.to_dict() for r in registers],
+    }
+    path.write_text(json.dumps(data, indent=2) + "\n", encoding="utf-8")
+
+
+def load_registers(path: Path) -> List[Register]:
+    """Read an SFR data file."""
+    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    return [Register.from_dict(r) for r in data.get("registers", [])]
+
+
+# extern volatile unsigned char PORTB __at(0x006);   (XC8 v2+)
+# volatile unsigned char PORTB @ 0x006;              (XC8 v1.x)
+_REGISTER_RE = re.compile(
+    r"^\s*(?:extern\s+)?volatile\s+unsigned\s+(char|short|int|short\s+long|long)\s+"
+    r"(\w+)\s+(?:__at\s*\(\s*|@\s*)(0x[0-9A-Fa-f]+|\d+)",
+    re.MULTILINE,
+)
+_BITS_TYPE_RE = re.compile(
+    r"typedef\s+union\s*\{((?:(?!typedef).)*?)\}\s*(\w+)bits_t\s*;", re.DOTALL
+)
+_STRUCT_RE = re.compile(r"struct\s*\{(.*?)\}\s*;", re.DOTALL)
+_FIELD_RE = re.compile(r"unsigned\s+(\w+)?\s*:\s*(\d+)\s*;")
+
+_SIZES = {"char": 1, "short": 2, "int": 2, "short long": 3, "long": 4}
+
+
+def parse_processor_header(text: str) -> List[Register]:
+    """Extract the SFR layout from an XC8 processor header.
+
+    Args:
+        text: Content of ``pic/include/proc/pic<device>.h``
+
+    Returns:
+        Registers sorted by address
+    """
+    layouts_by_register = {}
+    for body, name in _BITS_TYPE_RE.findall(text):
+        # The first struct of the union holds the primary bit names, the
+        # following ones alternate names for the same bits
+        layouts = [
+            [(field or None, int(width)) for field, width in _FIELD_RE.findall(struct)]
+            for struct in _STRUCT_RE.findall(body)
+        ]
+        layouts = [layout for layout in layouts if layout]
+        if layouts:
+            layouts_by_register[name] = layouts
+
+    registers = {}
+    for kind, name, address in _REGISTER_RE.findall(text):
+        if name in registers:
+            continue
+        layouts = layouts_by_register.get(name, [])
+        registers[name] = Register(
+            name,
+            int(address, 0),
+            _SIZES.get(" ".join(kind.split()), 1),
+            layouts[0] if layouts else None,
+            layouts[1:],
+        )
+    return sorted(registers.values(), key=lambda r: (r.address, r.name))
+
+
+def register_source(
+    device: str,
+    toolchain: Optional[XC8Toolchain] = None,
+    data_dir: Optional[Path] = None,
+) -> Optional[Path]:
+    """Return the file the SFR layout of ``device`` is read from.
+
+    The AtPack SFR data file wins over the XC8 processor header.
+
+    Args:
+        device: Value of ``build.mcu``
+        toolchain: XC8 installation used when no SFR data file exists
+        data_dir: Directory of the SFR data files (default ``builder/sfr``)
+
+    Returns:
+        Path of a ``.json`` data file or ``.h`` processor header, or None
+    """
+    data_file = sfr_data_file(device, data_dir)
+    if data_file.is_file():
+        return data_file
+    return toolchain.processor_header(device) if toolchain else None
+
+
+def read_registers(source: Path) -> List[Register]:
+    """Read the SFR layout from a data file or processor header."""
+    source = Path(source)
+    if source.suffix == ".json":
+        return load_registers(source)
+    return parse_processor_header(source.read_text(errors="replace"))
+
+
+def load_device_registers(
+    device: str,
+    toolchain: Optional[XC8Toolchain] = None,
+    data_dir: Optional[Path] = None,
+) -> List[Register]:
+    """Return the SFR layout of a device (empty list if unknown)."""
+    source = register_source(device, toolchain, data_dir)
+    return read_registers(source) if source else []
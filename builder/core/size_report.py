@@ -0,0 +1,397 @@
+"""
+Flash and RAM size attribution of a link
+
+Every link writes ``$BUILD_DIR/size_report.json``: program words per
+function and per source file (from the instructions of the XC8 listing, or
+the ``__end_of_<function>`` symbols without one), data bytes per RAM bank
+(from the psects of the map file) and per variable. The previous report is
+kept as ``size_report.prev.json`` and each new snapshot is appended to a
+SQLite history database in the project's ``.pio`` directory together with
+the git commit it was built from, so growth can be traced back to a commit.
+The bank selections of the listing (see :mod:`.banking`) are reported with
+the RAM usage.
+"""
+
+import json
+import re
+import sqlite3
+import subprocess
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .banking import analyze_banking, summarize_banking
+from .cache import write_atomic
+from .hexfile import HexFormatError, HexImage
+from .sfr import load_device_registers
+from .xc8_outputs import XC8Outputs, c_name
+
+REPORT_NAME = "size_report.json"
+PREVIOUS_REPORT_NAME = "size_report.prev.json"
+HISTORY_NAME = "size_history.sqlite"
+
+# Psect table rows of the map: name, link, load, length, selector, space
+_MAP_PSECT_RE = re.compile(
+    r"^\s+(\w+)\s+([0-9A-Fa-f]+)\s+([0-9A-Fa-f]+)\s+([0-9A-Fa-f]+)"
+    r"\s+([0-9A-Fa-f]+)\s+(\d)\b"
+)
+_MAP_CLASS_RE = re.compile(r"^\s*CLASS\s+(\w+)\s*$")
+_DATA_SPACE = 1
+_BANK_SIZE = 0x80
+_RAM_CLASSES = ("COMMON", "BANK", "BIGRAM", "RAM")
+
+
+def read_map_psects(path: Path) -> Dict[str, Tuple[str, int, int, int]]:
+    """Return ``{psect: (class, link address, length, space)}`` from a map."""
+    psects: Dict[str, Tuple[str, int, int, int]] = {}
+    cls = ""
+    for line in path.read_text(errors="replace").splitlines():
+        header = _MAP_CLASS_RE.match(line)
+        if header:
+            cls = header.group(1)
+            continue
+        row = _MAP_PSECT_RE.match(line)
+        if not row:
+            continue
+        name = row.group(1)
+        link, length = int(row.group(2), 16), int(row.group(4), 16)
+        space = int(row.group(6))
+        if name not in psects or cls:
+            psects[name] = (cls or psects.get(name, ("",))[0], link, length, space)
+    return psects
+
+
+def _bank_name(cls: str, address: int) -> str:
+    if cls.upper() == "COMMON":
+        return "COMMON"
+    return f"BANK{address // _BANK_SIZE}"
+
+
+def _function_words(outputs: XC8Outputs) -> Dict[str, int]:
+    words: Dict[str, int] = {}
+    listing = outputs.listing()
+    if listing:
+        for line in listing:
+            name = c_name(line.function) if line.function else "(startup)"
+            words[name] = words.get(name, 0) + 1
+        return words
+    # No listing: XC8 brackets each function with __end_of_<name>
+    for symbol in outputs.symbols():
+        if symbol.is_function:
+            end = outputs.symbol(f"__end_of{symbol.name}")
+            if end is not None and end.address > symbol.address:
+                words[c_name(symbol.name)] = end.address - symbol.address
+    return words
+
+
+def _file_words(outputs: XC8Outputs) -> Dict[str, int]:
+    words: Dict[str, int] = {}
+    for line in outputs.listing():
+        name = Path(line.source[0]).name if line.source else "(runtime)"
+        words[name] = words.get(name, 0) + 1
+    return words
+
+
+def _ram_usage(outputs: XC8Outputs) -> Tuple[Dict[str, int], Dict[str, Dict]]:
+    """Return bytes per bank and ``{variable: {bank, address, size}}``."""
+    banks: Dict[str, int] = {}
+    psect_ends: Dict[str, int] = {}
+    map_path = outputs.path(".map")
+    if map_path.exists():
+        for name, (cls, link, length, space) in read_map_psects(map_path).items():
+            if space != _DATA_SPACE or not length:
+                continue
+            bank = _bank_name(cls, link)
+            banks[bank] = banks.get(bank, 0) + length
+            psect_ends[name] = link + length
+
+    data = [
+        symbol
+        for symbol in outputs.symbols()
+        if symbol.name.startswith("_")
+        and not symbol.name.startswith("__")
+        and symbol.cls.upper().startswith(_RAM_CLASSES)
+    ]
+    data.sort(key=lambda symbol: symbol.address)
+    variables: Dict[str, Dict] = {}
+    for i, symbol in enumerate(data):
+        # A variable extends to the next one or to the end of its psect
+        end = psect_ends.get(symbol.psect)
+        if i + 1 < len(data) and data[i + 1].psect == symbol.psect:
+            end = data[i + 1].address if end is None else min(end, data[i + 1].address)
+        size = end - symbol.address if end is not None and end > symbol.address else 0
+        variables[c_name(symbol.name)] = {
+            "bank": _bank_name(symbol.cls, symbol.address),
+            "address": symbol.address,
+            "size": size,
+        }
+    if not banks:
+        for variable in variables.values():
+            banks[variable["bank"]] = banks.get(variable["bank"], 0) + variable["size"]
+    return banks, variables
+
+
+def build_size_report(
+    outputs: XC8Outputs, device: str, flash_words: int, ram_bytes: int
+) -> Dict:
+    """Return the size attribution of the link in ``outputs``.
+
+    Args:
+        outputs: XC8 link outputs
+        device: Device name, recorded in the report
+        flash_words: Program memory size (``upload.maximum_size``)
+        ram_bytes: Data memory size (``upload.maximum_ram_size``)
+    """
+    flash_used = 0
+    hex_path = outputs.path(".hex")
+    if hex_path.exists():
+        try:
+            flash_used = HexImage.load(hex_path).used_words(0, flash_words)
+        except HexFormatError:
+            flash_used = 0
+    functions = _function_words(outputs)
+    if not flash_used:
+        flash_used = sum(functions.values())
+    banks, variables = _ram_usage(outputs)
+    return {
+        "device": device,
+        "flash": {"used": flash_used, "total": flash_words},
+        "ram": {"used": sum(banks.values()), "total": ram_bytes},
+        "functions": functions,
+        "files": _file_words(outputs),
+        "banks": banks,
+        "variables": variables,
+    }
+
+
+def _percent(used: int, total: int) -> str:
+    return f" ({100 * used / total:.1f}%)" if total else ""
+
+
+def summarize_size(report: Dict, top: int = 5) -> List[str]:
+    """Return the totals, the bank usage and the largest functions."""
+    flash, ram = report["flash"], report["ram"]
+    out = [
+        f"Flash: {flash['used']}/{flash['total']} words"
+        + _percent(flash["used"], flash["total"]),
+        f"RAM: {ram['used']}/{ram['total']} bytes"
+        + _percent(ram["used"], ram["total"]),
+    ]
+    if report["banks"]:
+        banks = ", ".join(
+            f"{bank} {size}" for bank, size in sorted(report["banks"].items())
+        )
+        out.append(f"RAM by bank: {banks}")
+    largest = sorted(report["functions"].items(), key=lambda item: -item[1])[:top]
+    if largest:
+        out.append(
+            "Largest functions: "
+            + ", ".join(f"{name} {words}" for name, words in largest)
+        )
+    return out
+
+
+def _changes(old: Dict[str, int], new: Dict[str, int]) -> List[Tuple[str, int, int]]:
+    changes = []
+    for name in set(old) | set(new):
+        before, after = old.get(name, 0), new.get(name, 0)
+        if before != after:
+            changes.append((name, before, after))
+    changes.sort(key=lambda change: (-abs(change[2] - change[1]), change[0]))
+    return changes
+
+
+def diff_size_reports(old: Dict, new: Dict, limit: int = 20) -> List[str]:
+    """Return the differences between two size reports, largest first."""
+
+    def delta(before: int, after: int) -> str:
+        return f"{after - before:+d}"
+
+    out = []
+    for title, memory, unit in (("Flash", "flash", "words"), ("RAM", "ram", "bytes")):
+        before, after = old[memory]["used"], new[memory]["used"]
+        out.append(f"{title}: {before} -> {after} {unit} ({delta(before, after)})")
+    sections = (
+        ("Function", "functions", "words"),
+        ("File", "files", "words"),
+        ("Bank", "banks", "bytes"),
+        ("Variable", "variables", "bytes"),
+    )
+    for title, key, unit in sections:
+        old_sizes, new_sizes = old.get(key, {}), new.get(key, {})
+        if key == "variables":
+            old_sizes = {name: var["size"] for name, var in old_sizes.items()}
+            new_sizes = {name: var["size"] for name, var in new_sizes.items()}
+        changes = _changes(old_sizes, new_sizes)
+        for name, before, after in changes[:limit]:
+            state = " (new)" if not before else " (removed)" if not after else ""
+            out.append(
+                f"{title} {name}: {before} -> {after} {unit} "
+                f"({delta(before, after)}){state}"
+            )
+        if len(changes) > limit:
+            out.append(f"... {len(changes) - limit} more {key} changed")
+    return out
+
+
+def git_revision(project_dir: Path) -> str:
+    """Return the short commit of the project (``+`` when modified), or ``""``."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=project_dir,
+            capture_output=True,
+            text=True,
+            timeout=10,
+        )
+        if commit.returncode != 0:
+            return ""
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=project_dir,
+            capture_output=True,
+            text=True,
+            timeout=10,
+        )
+        return commit.stdout.strip() + ("+" if dirty.stdout.strip() else "")
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+class SizeHistory:
+    """SQLite database of the size reports of every build.
+
+    Args:
+        path: Database file, created on first use
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(self.path), timeout=30)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS snapshots ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " env TEXT NOT NULL,"
+            " revision TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " flash_used INTEGER NOT NULL,"
+            " ram_used INTEGER NOT NULL,"
+            " report TEXT NOT NULL)"
+        )
+        self.db.commit()
+
+    def close(self) -> None:
+        self.db.close()
+
+    def append(self, env_name: str, revision: str, report: Dict) -> bool:
+        """Store a report unless it is identical to the last one of ``env_name``.
+
+        Returns:
+            True if a snapshot was added
+        """
+        text = json.dumps(report, sort_keys=True)
+        last = self.db.execute(
+            "SELECT revision, report FROM snapshots WHERE env = ? "
+            "ORDER BY id DESC LIMIT 1",
+            (env_name,),
+        ).fetchone()
+        if last is not None and last == (revision, text):
+            return False
+        self.db.execute(
+            "INSERT INTO snapshots "
+            "(env, revision, created, flash_used, ram_used, report) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                env_name,
+                revision,
+                time.time(),
+                report["flash"]["used"],
+                report["ram"]["used"],
+                text,
+            ),
+        )
+        self.db.commit()
+        return True
+
+    def entries(
+        self, env_name: str, limit: int = 20
+    ) -> List[Tuple[str, float, int, int]]:
+        """Return ``(revision, time, flash words, RAM bytes)``, oldest first."""
+        rows = self.db.execute(
+            "SELECT revision, created, flash_used, ram_used FROM snapshots "
+            "WHERE env = ? ORDER BY id DESC LIMIT ?",
+            (env_name, limit),
+        ).fetchall()
+        return list(reversed(rows))
+
+    def report(self, env_name: str, revision: str) -> Optional[Dict]:
+        """Return the latest report built from ``revision`` (prefix allowed)."""
+        row = self.db.execute(
+            "SELECT report FROM snapshots WHERE env = ? AND revision LIKE ? "
+            "ORDER BY id DESC LIMIT 1",
+            (env_name, f"{revision}%"),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+
+def report_size(ctx) -> bool:
+    """Post-link stage: write the size report and record it in the history
+
+    ``custom_size_report = no`` disables it. The report never fails the
+    build.
+    """
+    enabled = str(ctx.project_option("custom_size_report", "yes")).lower()
+    if enabled in ("no", "false", "0", "off"):
+        return True
+
+    board = ctx.env.BoardConfig()
+    outputs = XC8Outputs(ctx.output_dir)
+    report = build_size_report(
+        outputs,
+        ctx.device,
+        int(board.get("upload.maximum_size", 8192)),
+        int(board.get("upload.maximum_ram_size", 368)),
+    )
+    registers = load_device_registers(ctx.device, ctx.toolchain)
+    banking = analyze_banking(outputs, registers, report["variables"])
+    if banking is not None:
+        report["banking"] = banking
+    ctx.results["size"] = report
+
+    report_path = ctx.build_dir / REPORT_NAME
+    if report_path.exists():
+        report_path.replace(ctx.build_dir / PREVIOUS_REPORT_NAME)
+    write_atomic(report_path, json.dumps(report, indent=2, sort_keys=True))
+
+    for line in summarize_size(report):
+        print(f"[SIZE] {line}")
+    if banking is not None:
+        for line in summarize_banking(banking):
+            print(f"[SIZE] {line}")
+    previous = ctx.build_dir / PREVIOUS_REPORT_NAME
+    if previous.exists():
+        try:
+            old = json.loads(previous.read_text())
+            change = report["flash"]["used"] - old["flash"]["used"]
+            ram_change = report["ram"]["used"] - old["ram"]["used"]
+            print(
+                f"[SIZE] Since previous build: flash {change:+d}, RAM {ram_change:+d}"
+            )
+        except (ValueError, KeyError):
+            pass
+
+    try:
+        history = SizeHistory(
+            Path(ctx.env.subst("$PROJECT_WORKSPACE_DIR")) / HISTORY_NAME
+        )
+        try:
+            history.append(
+                ctx.env.subst("$PIOENV"), git_revision(ctx.project_dir), report
+            )
+        finally:
+            history.close()
+    except sqlite3.Error as e:
+        print(f"[SIZE] ⚠️  Size history not updated: {e}")
+    print(f"[SIZE] Report: {report_path}")
+    return True
@@ -0,0 +1,50 @@
+"""
+Discover stage: collect the project sources
+
+Uses PlatformIO's ``MatchSourceFiles`` so ``build_src_filter`` is honoured,
+then sorts the files by language for the later stages.
+"""
+
+from pathlib import Path
+
+CPP_EXTENSIONS = (".cpp", ".cxx", ".cc")
+C_EXTENSIONS = (".c",)
+HEADER_EXTENSIONS = (".h", ".hpp", ".hxx")
+ASSEMBLY_EXTENSIONS = (".s", ".asm", ".as")
+
+
+def discover_sources(ctx) -> bool:
+    """Collect source files from PROJECT_SRC_DIR, respecting build_src_filter"""
+    print("[SOURCES] *** COLLECTING SOURCE FILES ***")
+
+    src_dir = str(ctx.project_src_dir)
+    all_files = [
+        str(Path(src_dir) / str(f))
+        for f in ctx.env.MatchSourceFiles(src_dir, ctx.env.get("SRC_FILTER"))
+    ]
+
+    ctx.cpp_files = [f for f in all_files if f.endswith(CPP_EXTENSIONS)]
+    ctx.c_files = [f for f in all_files if f.endswith(C_EXTENSIONS)]
+    ctx.header_files = [f for f in all_files if f.endswith(HEADER_EXTENSIONS)]
+    if ctx.config.allow_assembly:
+        ctx.asm_files = [
+            f for f in all_files if Path(f).suffix.lower() in ASSEMBLY_EXTENSIONS
+        ]
+
+    print(f"[SOURCES] Found {len(all_files)} total files:")
+    for label, files in (
+        ("C++ source files", ctx.cpp_files),
+        ("C source files", ctx.c_files),
+        ("Assembly source files", ctx.asm_files),
+        ("Header files", ctx.header_files),
+    ):
+        print(f"[SOURCES]   - {label}: {len(files)}")
+        for f in files:
+            print(f"[SOURCES]     * {f}")
+
+    # Until the transpile stage runs, C and assembly files are built as-is
+    ctx.sources = ctx.c_files + ctx.asm_files
+    if not ctx.sources and not ctx.cpp_files:
+        print("[ERROR] No source files found!")
+        return False
+    return True
@@ -0,0 +1,68 @@
+"""
+Device-accurate transpilation stubs
+
+Generates, for one device, a libclang-friendly header declaring exactly the
+SFRs the part implements (plain ``extern volatile`` registers and bit-field
+structs), from the SFR layout in :mod:`builder.core.sfr`. Generated headers
+are cached per MCU in the platform cache and only rebuilt when their source
+data or the template change.
+"""
+
+import hashlib
+from pathlib import Path
+from typing import Optional
+
+from .sfr import read_registers, register_source
+from .templates import TEMPLATES_DIR, render_template, write_if_changed
+from .toolchain import XC8Toolchain, normalize_device
+
+STUBS_TEMPLATE = "pic_device_stubs.h.j2"
+
+
+def ensure_device_stubs(
+    device: str,
+    toolchain: Optional[XC8Toolchain],
+    cache_root: Path,
+    data_dir: Optional[Path] = None,
+) -> Optional[Path]:
+    """Return the generated stubs header for ``device``.
+
+    Args:
+        device: Value of ``build.mcu``
+        toolchain: XC8 installation (used when no AtPack SFR data exists)
+        cache_root: Platform cache directory
+        data_dir: Directory of the SFR data files (default ``builder/sfr``)
+
+    Returns:
+        Path of the stubs header, or None if the SFR layout is unknown (the
+        caller then falls back to ``pic_universal_stubs.h``)
+    """
+    source = register_source(device, toolchain, data_dir)
+    if source is None:
+        return None
+
+    device = normalize_device(device)
+    digest = hashlib.sha1(str(source.resolve()).encode("utf-8")).hexdigest()[:8]
+    stubs = Path(cache_root) / "stubs" / f"pic{device}_{digest}.h"
+
+    template_path = TEMPLATES_DIR / STUBS_TEMPLATE
+    newest_input = max(source.stat().st_mtime, template_path.stat().st_mtime)
+    if stubs.is_file() and stubs.stat().st_mtime >= newest_input:
+        return stubs
+
+    registers = read_registers(source)
+    if not registers:
+        return None
+
+    content = render_template(
+        STUBS_TEMPLATE,
+        device_upper=device.upper(),
+        source_name=source.name,
+        registers=registers,
+    )
+    if not write_if_changed(stubs, content):
+        # Refresh the timestamp so the next build skips regeneration
+        stubs.touch()
+        return stubs
+    print(f"[STUBS] Generated {len(registers)} SFR stubs for {device}: {stubs}")
+    return stubs
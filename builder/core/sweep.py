@@ -0,0 +1,270 @@
+"""
+Optimization sweep: build one project with several XC8 option sets
+
+Each option set is built by the framework's own pipeline into
+``$BUILD_DIR/sweep/<name>``: the stages up to ``compile`` run one variant
+after the other, then the XC8 links, which take most of the time, run in
+parallel. Every image is measured (program words, RAM bytes and, on
+mid-range parts, simulated cycles: until the firmware stops, or per pass of
+its main loop) and the best option set for ``custom_sweep_objective`` is
+reported. The results go to ``$BUILD_DIR/sweep/sweep.json``.
+"""
+
+import json
+import os
+import shlex
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .pipeline import BuildContext, FrameworkConfig, Pipeline
+from .sfr import load_device_registers
+from .size_report import build_size_report
+from .xc8_outputs import XC8Outputs
+
+DEFAULT_VARIANTS = "-O0\n-O1\n-O2\n-O3\n-Os"
+OBJECTIVES = ("size", "speed", "balanced")
+
+
+def parse_variants(text: str) -> List[Tuple[str, List[str]]]:
+    """Parse ``custom_sweep_options``: one option set per line.
+
+    A line is ``name: flags`` or just the flags, which then name the set
+    (``-O2``, ``fast: -O2 -fomit-frame-pointer``).
+    """
+    variants = []
+    for line in str(text).replace(";", "\n").splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        name, sep, flags = line.partition(":")
+        if not sep or name.strip().startswith("-"):
+            name, flags = line, line
+        name = "".join(c if c.isalnum() or c in "-_" else "_" for c in name.strip())
+        name = name.strip("-_") or f"set{len(variants)}"
+        variants.append((name, shlex.split(flags)))
+    return variants
+
+
+class SweepResult:
+    """Measurements of one option set.
+
+    Attributes:
+        name: Option set name (directory under ``sweep/``)
+        flags: XC8 flags of the set
+        ok: The build succeeded
+        flash: Program words used
+        ram: Data bytes used
+        cycles: Simulated cycles, or None if not measured
+        cycle_source: What ``cycles`` measures (``stop``, ``loop pass``)
+    """
+
+    def __init__(self, name: str, flags: List[str]):
+        self.name = name
+        self.flags = flags
+        self.ok = False
+        self.flash = 0
+        self.ram = 0
+        self.cycles: Optional[float] = None
+        self.cycle_source = ""
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "flags": self.flags,
+            "ok": self.ok,
+            "flash": self.flash,
+            "ram": self.ram,
+            "cycles": self.cycles,
+            "cycle_source": self.cycle_source,
+        }
+
+    def line(self) -> str:
+        flags = " ".join(self.flags)
+        if not self.ok:
+            return f"{self.name:<10} {flags:<24} build failed"
+        cycles = "-"
+        if self.cycles is not None:
+            cycles = f"{self.cycles:.0f} cycles ({self.cycle_source})"
+        sizes = f"{self.flash:>6} words {self.ram:>5} B"
+        return f"{self.name:<10} {flags:<24} {sizes}  {cycles}"
+
+
+def pick_best(
+    results: List[SweepResult], objective: str, flash_limit: int, ram_limit: int
+) -> Optional[SweepResult]:
+    """Return the best fitting result for ``objective``."""
+    fitting = [
+        result
+        for result in results
+        if result.ok and result.flash <= flash_limit and result.ram <= ram_limit
+    ]
+    if not fitting:
+        return None
+    timed = [result.cycles for result in fitting if result.cycles is not None]
+    slowest = max(timed) * 2 if timed else 0.0
+
+    def cycles(result: SweepResult) -> float:
+        # Unmeasured sets never win on speed
+        return result.cycles if result.cycles is not None else slowest
+
+    if objective == "speed":
+        return min(fitting, key=lambda r: (cycles(r), r.flash))
+    if objective == "balanced":
+        least_flash = min(r.flash for r in fitting) or 1
+        fastest = min(timed) if timed else 0.0
+
+        def score(r: SweepResult) -> float:
+            value = r.flash / least_flash
+            if fastest:
+                value += cycles(r) / fastest
+            return value
+
+        return min(fitting, key=lambda r: (score(r), r.flash))
+    return min(fitting, key=lambda r: (r.flash, cycles(r)))
+
+
+def _measure_cycles(ctx: BuildContext, result: SweepResult, hex_path: Path) -> None:
+    from ..sim import (
+        Profiler,
+        SimulationError,
+        STOP_BUDGET,
+        apply_inputs,
+        find_loop_head,
+        is_midrange,
+        load_firmware,
+    )
+
+    if not is_midrange(ctx.device):
+        return
+    board = ctx.env.BoardConfig()
+    try:
+        core = load_firmware(
+            hex_path,
+            ctx.device,
+            int(board.get("upload.maximum_size", 8192)),
+            int(board.get("upload.maximum_ram_size", 368)),
+            int(board.get("upload.info", {}).get("EepromSize", 0)),
+            registers=load_device_registers(ctx.device, ctx.toolchain),
+        )
+        apply_inputs(
+            core,
+            int(ctx.clean_f_cpu),
+            ctx.project_option("custom_sim_pins", ""),
+            ctx.project_option("custom_sim_adc", ""),
+        )
+    except (SimulationError, OSError, ValueError) as e:
+        print(f"[SWEEP] ⚠️  {result.name}: not simulated ({e})")
+        return
+
+    outputs = XC8Outputs(hex_path.parent)
+    profiler = Profiler(core, outputs, find_loop_head(core, outputs))
+    budget = int(ctx.project_option("custom_sweep_cycles", "200000"))
+    if core.run(budget) != STOP_BUDGET:
+        result.cycles, result.cycle_source = float(core.cycles), "stop"
+    elif profiler.loop_intervals:
+        passes = profiler.loop_intervals
+        result.cycles, result.cycle_source = sum(passes) / len(passes), "loop pass"
+
+
+def _run_stage(name: str, stages) -> bool:
+    try:
+        return bool(stages())
+    except Exception as e:
+        print(f"[SWEEP] ❌ {name}: {e}")
+        return False
+
+
+def run_sweep(env, config: FrameworkConfig, pipeline: Pipeline) -> int:
+    """Build and measure every option set (SCons action convention)."""
+    base = BuildContext(env, config)
+    variants = parse_variants(
+        base.project_option("custom_sweep_options", DEFAULT_VARIANTS)
+    )
+    objective = str(base.project_option("custom_sweep_objective", "size")).lower()
+    if objective not in OBJECTIVES:
+        print(
+            f"[SWEEP] ❌ custom_sweep_objective must be one of {', '.join(OBJECTIVES)}"
+        )
+        return 1
+    sweep_dir = base.build_dir / "sweep"
+
+    names = pipeline.names()
+    if "link" not in names:
+        print("[SWEEP] ❌ The framework pipeline has no link stage")
+        return 1
+    prepare = pipeline.stages[: names.index("link")]
+    link = pipeline.stages[names.index("link")][1]
+
+    contexts: List[Tuple[SweepResult, Optional[BuildContext]]] = []
+    for name, flags in variants:
+        ctx = BuildContext(env, config)
+        ctx.build_dir = sweep_dir / name
+        ctx.output_dir = ctx.build_dir / "output"
+        ctx.output_hex = ctx.output_dir / "firmware.hex"
+        ctx.optimization_flags = flags
+        print(f"[SWEEP] Preparing {name}: {' '.join(flags)}")
+        ok = _run_stage(name, lambda: all(stage(ctx) for _, stage in prepare))
+        contexts.append((SweepResult(name, flags), ctx if ok else None))
+
+    def link_variant(item) -> bool:
+        result, ctx = item
+        return ctx is not None and _run_stage(result.name, lambda: link(ctx))
+
+    jobs = int(base.project_option("custom_sweep_jobs", 0) or os.cpu_count() or 1)
+    print(f"[SWEEP] Linking {len(contexts)} option sets ({jobs} jobs)")
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        linked = list(pool.map(link_variant, contexts))
+
+    board = env.BoardConfig()
+    flash_limit = int(board.get("upload.maximum_size", 8192))
+    ram_limit = int(board.get("upload.maximum_ram_size", 368))
+    results = []
+    for (result, ctx), ok in zip(contexts, linked):
+        results.append(result)
+        if not ok or not ctx.output_hex.exists():
+            continue
+        report = build_size_report(
+            XC8Outputs(ctx.output_dir), ctx.device, flash_limit, ram_limit
+        )
+        result.ok = True
+        result.flash, result.ram = report["flash"]["used"], report["ram"]["used"]
+        _measure_cycles(ctx, result, ctx.output_hex)
+
+    for result in results:
+        print(f"[SWEEP] {result.line()}")
+    best = pick_best(results, objective, flash_limit, ram_limit)
+    sweep_dir.mkdir(parents=True, exist_ok=True)
+    (sweep_dir / "sweep.json").write_text(
+        json.dumps(
+            {
+                "objective": objective,
+                "results": [result.to_dict() for result in results],
+                "best": best.name if best else None,
+            },
+            indent=2,
+        )
+    )
+    if best is None:
+        print("[SWEEP] ❌ No option set built an image that fits the device")
+        return 1
+
+    print(f"[SWEEP] Best for {objective}: {best.name} ({' '.join(best.flags)})")
+    if len(best.flags) == 1 and best.flags[0].startswith("-O"):
+        print(f"[SWEEP] Use it with: custom_optimization_level = {best.flags[0][2:]}")
+    else:
+        print(f"[SWEEP] Use it with: build_flags = {' '.join(best.flags)}")
+    print(f"[SWEEP] Results: {sweep_dir / 'sweep.json'}")
+    return 0
+
+
+def make_sweep_action(config: FrameworkConfig, pipeline: Pipeline):
+    """Wrap :func:`run_sweep` into an SCons action."""
+
+    def sweep(target, source, env):
+        print("=" * 80)
+        print(f"[SWEEP] *** {config.name} optimization sweep ***")
+        print("=" * 80)
+        return run_sweep(env, config, pipeline)
+
+    return sweep
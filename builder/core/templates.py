@@ -0,0 +1,98 @@
+"""
+Shared Jinja2 template service
+
+One ``jinja2.Environment`` is created per build and shared by both
+frameworks. Compiled templates are kept in a bytecode cache under the
+platform cache directory, so ``pic_includes.h.j2`` and friends are only
+compiled again when they change. Rendered headers are memoized and written
+only when their content differs from the file on disk, which keeps their
+timestamps (and the rebuilds they trigger) stable.
+"""
+
+import functools
+from pathlib import Path
+from typing import Optional
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+from .cache import write_atomic
+
+TEMPLATES_DIR = Path(__file__).resolve().parent.parent / "frameworks" / "templates"
+PIC_INCLUDES_TEMPLATE = "pic_includes.h.j2"
+
+_environment = None
+
+
+def template_environment(cache_root: Optional[Path] = None) -> Environment:
+    """Return the shared template environment, creating it on first use.
+
+    Args:
+        cache_root: Platform cache directory holding the bytecode cache
+            (only used by the first call)
+    """
+    global _environment
+    if _environment is None:
+        bytecode_cache = None
+        if cache_root is not None:
+            bytecode_dir = Path(cache_root) / "jinja"
+            bytecode_dir.mkdir(parents=True, exist_ok=True)
+            bytecode_cache = FileSystemBytecodeCache(str(bytecode_dir))
+        _environment = Environment(
+            loader=FileSystemLoader(str(TEMPLATES_DIR)),
+            bytecode_cache=bytecode_cache,
+            auto_reload=False,
+        )
+    return _environment
+
+
+def render_template(name: str, **variables) -> str:
+    """Render a template from ``builder/frameworks/templates``."""
+    return template_environment().get_template(name).render(**variables)
+
+
+@functools.lru_cache(maxsize=None)
+def render_pic_includes(
+    device: str,
+    f_cpu: str,
+    stubs_file_path: str,
+    processor_header_path: Optional[str] = None,
+    device_stubs_path: Optional[str] = None,
+) -> str:
+    """Render ``pic_includes.h`` for a device configuration (memoized).
+
+    Args:
+        device: Value of ``build.mcu``
+        f_cpu: Value of ``build.f_cpu`` (suffixes such as ``L`` allowed)
+        stubs_file_path: Path of ``pic_universal_stubs.h``
+        processor_header_path: XC8 processor header of the device, if any
+        device_stubs_path: Generated per-device stubs, if any
+
+    Returns:
+        Header content
+    """
+    return render_template(
+        PIC_INCLUDES_TEMPLATE,
+        device=device,
+        device_upper=device.upper(),
+        f_cpu=f_cpu,
+        clean_f_cpu=str(f_cpu).rstrip("LUlu"),
+        stubs_file_path=stubs_file_path,
+        processor_header_path=processor_header_path,
+        device_stubs_path=device_stubs_path,
+    )
+
+
+def write_if_changed(path: Path, content: str) -> bool:
+    """Write ``content`` to ``path`` unless the file already holds it.
+
+    Returns:
+        True if the file was (re)written
+    """
+    path = Path(path)
+    try:
+        if path.read_text(encoding="utf-8") == content:
+            return False
+    except (OSError, UnicodeDecodeError):
+        pass
+    write_atomic(path, content)
+    return True
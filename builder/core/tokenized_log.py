@@ -0,0 +1,525 @@
+"""
+Tokenized logging: ``PIC_LOG()`` format strings stay on the host
+
+``PIC_LOG("adc=%u", value)`` would need ``printf`` on the target: kilobytes
+of flash and thousands of cycles per call. Instead, the logs stage pulls the
+format strings out of the C sources (transpiled ones included) into a string
+table, ``$BUILD_DIR/pic_log.json``, and compiles copies of the sources in
+which every call sends a frame: a start byte, a 16-bit token and the
+arguments in binary, little endian. The ``pic_log`` monitor filter rebuilds
+the log lines from the table.
+
+Tokens are a CRC of the format string, so they only change with the text
+and a firmware keeps matching the table of a later build. Two strings of a
+build with the same CRC fail it rather than shifting either token.
+"""
+
+import json
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .cache import write_atomic
+from .templates import write_if_changed
+
+LOG_DIR = Path(__file__).resolve().parent.parent / "frameworks" / "pic_log"
+TABLE_NAME = "pic_log.json"
+TABLE_VERSION = 1
+# ASCII record separator: never part of text output
+FRAME_START = 0x1E
+# Longest %s argument sent, the NUL excluded
+STRING_LIMIT = 32
+# Longer frames are corrupted ones: the decoder resynchronizes
+MAX_FRAME = 255
+
+# (bytes, signed) of each argument type, "str" is NUL terminated
+ARG_TYPES = {
+    "i8": (1, True),
+    "u8": (1, False),
+    "i16": (2, True),
+    "u16": (2, False),
+    "i32": (4, True),
+    "u32": (4, False),
+    "str": (0, False),
+}
+
+# Call sending each argument type
+_EMITTERS = {
+    "i8": "pic_log_u8((unsigned char)({}))",
+    "u8": "pic_log_u8((unsigned char)({}))",
+    "i16": "pic_log_u16((unsigned int)({}))",
+    "u16": "pic_log_u16((unsigned int)({}))",
+    "i32": "pic_log_u32((unsigned long)({}))",
+    "u32": "pic_log_u32((unsigned long)({}))",
+    "str": "pic_log_str((const char *)({}))",
+}
+
+_CONVERSION_RE = re.compile(
+    r"%(?P<flags>[-+ #0]*)(?P<width>\d+|\*)?(?:\.(?P<precision>\d+|\*))?"
+    r"(?P<length>hh|h|ll|l|z|j|t|L)?(?P<type>.)?"
+)
+_CALL_RE = re.compile(r"\bPIC_LOG\s*\(")
+_ESCAPES = {
+    "n": "\n",
+    "t": "\t",
+    "r": "\r",
+    "a": "\a",
+    "b": "\b",
+    "f": "\f",
+    "v": "\v",
+    "\\": "\\",
+    "'": "'",
+    '"': '"',
+    "?": "?",
+}
+
+
+class LogFormatError(ValueError):
+    """A ``PIC_LOG()`` call that cannot be tokenized."""
+
+
+def _conversions(format_string: str):
+    for match in _CONVERSION_RE.finditer(format_string):
+        if match.group("type") != "%":
+            yield match
+
+
+def parse_format(format_string: str) -> List[str]:
+    """Return the argument types of a format string (``ARG_TYPES`` keys).
+
+    Raises:
+        LogFormatError: for conversions the target cannot send (floats,
+            ``*`` widths, 64-bit integers)
+    """
+    types = []
+    for match in _conversions(format_string):
+        conversion, length = match.group("type"), match.group("length") or ""
+        if not conversion:
+            raise LogFormatError("incomplete % conversion at the end")
+        if "*" in (match.group("width") or "") + (match.group("precision") or ""):
+            raise LogFormatError(f"'*' width or precision in {match.group(0)!r}")
+        if conversion in "di":
+            bits = {"hh": "8", "": "16", "h": "16", "l": "32"}.get(length)
+            signed = "i"
+        elif conversion in "uxXoc":
+            bits = {"hh": "8", "": "16", "h": "16", "l": "32"}.get(length)
+            if conversion == "c":
+                bits = "8" if not length else None
+            signed = "u"
+        elif conversion == "p":
+            bits, signed = ("16" if not length else None), "u"
+        elif conversion == "s":
+            if length:
+                raise LogFormatError(f"unsupported conversion {match.group(0)!r}")
+            types.append("str")
+            continue
+        else:
+            raise LogFormatError(
+                f"unsupported conversion {match.group(0)!r} (integers and %s only)"
+            )
+        if bits is None:
+            raise LogFormatError(f"unsupported conversion {match.group(0)!r}")
+        types.append(signed + bits)
+    return types
+
+
+def host_format(format_string: str) -> str:
+    """Return the Python ``%`` format equivalent to a C format string."""
+
+    def convert(match) -> str:
+        conversion = match.group("type")
+        if conversion in ("%", None):
+            return "%%"
+        spec = match.group("flags") + (match.group("width") or "")
+        if match.group("precision") is not None:
+            spec += "." + match.group("precision")
+        if conversion in "iu":
+            conversion = "d"
+        elif conversion == "p":
+            spec, conversion = "#06", "x"
+        return f"%{spec}{conversion}"
+
+    return _CONVERSION_RE.sub(convert, format_string)
+
+
+def token_of(format_string: str) -> int:
+    """CRC-16/CCITT of the UTF-8 format string."""
+    crc = 0xFFFF
+    for byte in format_string.encode("utf-8"):
+        crc ^= byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else crc << 1
+            crc &= 0xFFFF
+    return crc
+
+
+def _skip_literal(text: str, pos: int) -> int:
+    """Return the position after the string or character literal at ``pos``."""
+    quote = text[pos]
+    pos += 1
+    while pos < len(text) and text[pos] != quote:
+        pos += 2 if text[pos] == "\\" else 1
+    return pos + 1
+
+
+def _skip_space(text: str, pos: int) -> int:
+    """Skip whitespace and comments."""
+    while pos < len(text):
+        if text[pos].isspace():
+            pos += 1
+        elif text.startswith("//", pos):
+            end = text.find("\n", pos)
+            pos = len(text) if end < 0 else end
+        elif text.startswith("/*", pos):
+            end = text.find("*/", pos + 2)
+            pos = len(text) if end < 0 else end + 2
+        else:
+            break
+    return pos
+
+
+def _decode_literal(body: str) -> str:
+    """Decode the escapes of a C string literal body."""
+    out = []
+    i = 0
+    while i < len(body):
+        char = body[i]
+        if char != "\\":
+            out.append(char)
+            i += 1
+            continue
+        i += 1
+        escape = body[i] if i < len(body) else ""
+        if escape == "x":
+            digits = re.match(r"[0-9A-Fa-f]+", body[i + 1 :])
+            value = digits.group(0) if digits else "0"
+            out.append(chr(int(value, 16) & 0xFF))
+            i += 1 + len(value) if digits else 1
+        elif escape in "01234567" and escape:
+            digits = re.match(r"[0-7]{1,3}", body[i:]).group(0)
+            out.append(chr(int(digits, 8) & 0xFF))
+            i += len(digits)
+        else:
+            out.append(_ESCAPES.get(escape, escape))
+            i += 1
+    return "".join(out)
+
+
+def _split_arguments(text: str, pos: int) -> Tuple[List[Tuple[int, int]], int]:
+    """Split the arguments of the call whose ``(`` is at ``pos - 1``.
+
+    Returns:
+        ``([(start, end)...], position after the closing parenthesis)``
+    """
+    spans = []
+    depth = 0
+    start = pos
+    while pos < len(text):
+        char = text[pos]
+        if char in "\"'":
+            pos = _skip_literal(text, pos)
+            continue
+        if text.startswith("//", pos) or text.startswith("/*", pos):
+            pos = _skip_space(text, pos)
+            continue
+        if char in "([{":
+            depth += 1
+        elif char in ")]}":
+            if depth == 0:
+                spans.append((start, pos))
+                return spans, pos + 1
+            depth -= 1
+        elif char == "," and depth == 0:
+            spans.append((start, pos))
+            start = pos + 1
+        pos += 1
+    raise LogFormatError("unterminated PIC_LOG( call")
+
+
+class LogCall:
+    """One ``PIC_LOG()`` call of a source file.
+
+    Attributes:
+        start: Offset of ``PIC_LOG`` in the source
+        end: Offset after the closing parenthesis
+        line: Line number of the call
+        format: Decoded format string
+        args: Source text of the arguments
+        types: Argument types from the format string
+    """
+
+    def __init__(self, start, end, line, format_string, args, types):
+        self.start = start
+        self.end = end
+        self.line = line
+        self.format = format_string
+        self.args = args
+        self.types = types
+
+
+def find_log_calls(text: str) -> List[LogCall]:
+    """Return the ``PIC_LOG()`` calls of a C source, outside comments,
+    literals and preprocessor lines.
+
+    Raises:
+        LogFormatError: for a call without a literal format, or whose
+            arguments do not match it (the message starts with its line)
+    """
+    calls = []
+    pos = 0
+    while pos < len(text):
+        char = text[pos]
+        if char in "\"'":
+            pos = _skip_literal(text, pos)
+        elif text.startswith("//", pos) or text.startswith("/*", pos):
+            pos = _skip_space(text, pos)
+        elif char == "#" and text[text.rfind("\n", 0, pos) + 1 : pos].strip() == "":
+            # Preprocessor line, with its continuations
+            while pos < len(text) and text[pos] != "\n":
+                pos += 2 if text.startswith("\\\n", pos) else 1
+        else:
+            match = _CALL_RE.match(text, pos)
+            if match and (
+                pos == 0 or not (text[pos - 1].isalnum() or text[pos - 1] == "_")
+            ):
+                calls.append(_parse_call(text, pos, match.end()))
+                pos = calls[-1].end
+            else:
+                pos += 1
+    return calls
+
+
+def _parse_call(text: str, start: int, open_end: int) -> LogCall:
+    line = text.count("\n", 0, start) + 1
+    spans, end = _split_arguments(text, open_end)
+    pieces = []
+    pos = _skip_space(text, spans[0][0])
+    while pos < spans[0][1] and text[pos] == '"':
+        literal_end = _skip_literal(text, pos)
+        pieces.append(_decode_literal(text[pos + 1 : literal_end - 1]))
+        pos = _skip_space(text, literal_end)
+    if not pieces or pos != spans[0][1]:
+        raise LogFormatError(f"{line}: PIC_LOG() needs a string literal format")
+
+    format_string = "".join(pieces)
+    args = [text[a:b] for a, b in spans[1:]]
+    try:
+        types = parse_format(format_string)
+    except LogFormatError as e:
+        raise LogFormatError(f"{line}: {e}") from None
+    if len(args) != len(types):
+        raise LogFormatError(
+            f"{line}: {len(types)} argument(s) expected by {format_string!r}, "
+            f"{len(args)} given"
+        )
+    return LogCall(start, end, line, format_string, args, types)
+
+
+def assign_tokens(formats: List[str]) -> Dict[str, int]:
+    """Give every format string its token.
+
+    Raises:
+        LogFormatError: for two format strings with the same CRC
+    """
+    tokens: Dict[str, int] = {}
+    owners: Dict[int, str] = {}
+    for format_string in sorted(set(formats)):
+        token = token_of(format_string)
+        if token in owners:
+            raise LogFormatError(
+                f"{owners[token]!r} and {format_string!r} share token "
+                f"0x{token:04X}: reword one of them"
+            )
+        owners[token] = format_string
+        tokens[format_string] = token
+    return tokens
+
+
+def rewrite_calls(text: str, calls: List[LogCall], tokens: Dict[str, int]) -> str:
+    """Replace each call with the frame it sends, keeping the line numbers."""
+    out = []
+    pos = 0
+    for call in calls:
+        out.append(text[pos : call.start])
+        parts = [f"pic_log_begin(0x{tokens[call.format]:04X}u)"]
+        parts.extend(
+            _EMITTERS[kind].format(arg.strip())
+            for kind, arg in zip(call.types, call.args)
+        )
+        replacement = f"({', '.join(parts)})"
+        lost = text.count("\n", call.start, call.end) - replacement.count("\n")
+        out.append(replacement[:-1] + "\n" * max(lost, 0) + ")")
+        pos = call.end
+    out.append(text[pos:])
+    return "".join(out)
+
+
+def _copy_name(ctx, source: Path) -> Path:
+    try:
+        relative = source.resolve().relative_to(ctx.project_dir.resolve())
+    except ValueError:
+        relative = Path(source.name)
+    return ctx.build_dir / "pic_log" / relative
+
+
+def _output_defines(ctx) -> Optional[List[str]]:
+    default = "serial" if ctx.results.get("arduino_core") else "uart"
+    output = str(ctx.project_option("custom_log_output", default)).strip()
+    if output == "uart":
+        return []
+    if output == "serial":
+        return ["PIC_LOG_OUTPUT_SERIAL"]
+    if re.fullmatch(r"[A-Za-z_]\w*", output):
+        return [f"PIC_LOG_PUTC={output}"]
+    print(f"[LOG] ❌ custom_log_output must be uart, serial or a C function: {output}")
+    return None
+
+
+def tokenize_logs(ctx) -> bool:
+    """Logs stage: replace ``PIC_LOG()`` calls with tokenized frames
+
+    Sources without calls are compiled as they are. ``custom_log = no``
+    compiles the calls out.
+    """
+    enabled = str(ctx.project_option("custom_log", "yes")).lower()
+    if enabled in ("no", "false", "0", "off"):
+        ctx.defines.append("PIC_LOG_DISABLED")
+        return True
+
+    calls_by_source: Dict[str, Tuple[str, List[LogCall]]] = {}
+    for source in ctx.sources:
+        if Path(source).suffix.lower() != ".c":
+            continue
+        text = Path(source).read_text(encoding="utf-8", errors="replace")
+        if "PIC_LOG" not in text:
+            continue
+        try:
+            calls = find_log_calls(text)
+        except LogFormatError as e:
+            print(f"[LOG] ❌ {source}:{e}")
+            return False
+        if calls:
+            calls_by_source[source] = (text, calls)
+    if not calls_by_source:
+        return True
+
+    defines = _output_defines(ctx)
+    if defines is None:
+        return False
+
+    try:
+        tokens = assign_tokens(
+            [call.format for _, calls in calls_by_source.values() for call in calls]
+        )
+    except LogFormatError as e:
+        print(f"[LOG] ❌ {e}")
+        return False
+    table: Dict[str, Dict] = {}
+    copies = {}
+    for source, (text, calls) in calls_by_source.items():
+        copy = _copy_name(ctx, Path(source))
+        relative = copy.relative_to(ctx.build_dir / "pic_log").as_posix()
+        # Diagnostics and listings point at the original file
+        header = f'#line 1 "{Path(source).as_posix()}"\n'
+        write_if_changed(copy, header + rewrite_calls(text, calls, tokens))
+        copies[source] = str(copy)
+        # Quoted includes are still looked up next to the original
+        if str(Path(source).parent) not in ctx.include_dirs:
+            ctx.include_dirs.append(str(Path(source).parent))
+        for call in calls:
+            entry = table.setdefault(
+                str(tokens[call.format]),
+                {"format": call.format, "args": call.types, "sites": []},
+            )
+            entry["sites"].append(f"{relative}:{call.line}")
+
+    ctx.sources = [copies.get(source, source) for source in ctx.sources]
+    ctx.sources.append(str(LOG_DIR / "pic_log.c"))
+    ctx.defines.extend(defines)
+    write_atomic(
+        ctx.build_dir / TABLE_NAME,
+        json.dumps(
+            {
+                "version": TABLE_VERSION,
+                "frame_start": FRAME_START,
+                "string_limit": STRING_LIMIT,
+                "tokens": table,
+            },
+            indent=2,
+            sort_keys=True,
+        ),
+    )
+    count = sum(len(calls) for _, calls in calls_by_source.values())
+    print(
+        f"[LOG] {count} PIC_LOG() calls, {len(table)} format strings -> "
+        f"{ctx.build_dir / TABLE_NAME}"
+    )
+    return True
+
+
+class LogDecoder:
+    """Rebuild log lines from a byte stream, using a string table.
+
+    Bytes outside frames are passed through, so tokenized logs can be mixed
+    with plain text output.
+    """
+
+    def __init__(self, table: Dict):
+        self.frame_start = table.get("frame_start", FRAME_START)
+        self.tokens = {int(token): entry for token, entry in table["tokens"].items()}
+        self._frame: Optional[bytearray] = None
+
+    @classmethod
+    def load(cls, path: Path) -> "LogDecoder":
+        return cls(json.loads(Path(path).read_text(encoding="utf-8")))
+
+    def _decode(self, frame: bytes) -> Tuple[Optional[str], int]:
+        """Return ``(line, bytes used)``, line None while incomplete."""
+        if len(frame) < 3:
+            return None, 0
+        token = frame[1] | frame[2] << 8
+        entry = self.tokens.get(token)
+        if entry is None:
+            return f"<unknown log token 0x{token:04X}>\n", 3
+        pos = 3
+        values = []
+        for kind in entry["args"]:
+            size, signed = ARG_TYPES[kind]
+            if kind == "str":
+                end = frame.find(0, pos)
+                if end < 0:
+                    return None, 0
+                values.append(frame[pos:end].decode("latin-1"))
+                pos = end + 1
+                continue
+            if len(frame) < pos + size:
+                return None, 0
+            values.append(
+                int.from_bytes(frame[pos : pos + size], "little", signed=signed)
+            )
+            pos += size
+        try:
+            text = host_format(entry["format"]) % tuple(values)
+        except (TypeError, ValueError) as e:
+            text = f"<{entry['format']!r}: {e}>"
+        return (text if text.endswith("\n") else text + "\n"), pos
+
+    def feed(self, data: bytes) -> str:
+        """Decode received bytes; returns the text ready to display."""
+        out = []
+        for byte in data:
+            if self._frame is None:
+                if byte == self.frame_start:
+                    self._frame = bytearray([byte])
+                else:
+                    out.append(chr(byte))
+                continue
+            self._frame.append(byte)
+            line, _ = self._decode(bytes(self._frame))
+            if line is not None:
+                out.append(line)
+                self._frame = None
+            elif len(self._frame) > MAX_FRAME:
+                out.append("<corrupted log frame>\n")
+                self._frame = None
+        return "".join(out)
@@ -0,0 +1,206 @@
+"""
+XC8 toolchain discovery
+
+Locates the XC8 installation used for the build and derives the paths the
+frameworks need from it (compiler binaries, ``pic/include`` directories and
+the per-device processor header). Lookups are memoized per installation so
+the filesystem is only scanned once per build.
+"""
+
+import functools
+import os
+import re
+import shutil
+import sys
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+# Environment variables that may point at an XC8 installation root
+XC8_ENV_VARS = ("XC8_PATH", "XC8_HOME", "XC8_ROOT")
+
+# Parent directories holding versioned installs (``v2.46``, ``v3.00``, ...)
+XC8_INSTALL_PARENTS = {
+    "win32": [
+        r"C:\Program Files\Microchip\xc8",
+        r"C:\Program Files (x86)\Microchip\xc8",
+    ],
+    "darwin": ["/Applications/microchip/xc8", "/opt/microchip/xc8"],
+    "linux": ["/opt/microchip/xc8", "/usr/local/microchip/xc8"],
+}
+
+# 12-bit (baseline) parts in boards/: 2-level stack, no interrupts
+BASELINE_DEVICES = {
+    "16f505",
+    "16f506",
+    "16f526",
+    "16f527",
+    "16f54",
+    "16f57",
+    "16f570",
+    "16f59",
+    "16hv540",
+}
+
+_VERSION_RE = re.compile(r"v?(\d+)\.(\d+)")
+_EEPROMSIZE_RE = re.compile(r"^\s*#define\s+_EEPROMSIZE\s+(\w+)", re.MULTILINE)
+
+
+def normalize_device(device: str) -> str:
+    """Return the bare part number used by XC8 (``16f877a``).
+
+    Args:
+        device: Value of ``build.mcu`` (``16f877a``, ``PIC16F877A``, ...)
+
+    Returns:
+        Lower-case part number without the ``pic`` prefix
+    """
+    device = device.strip().lower()
+    if device.startswith("pic"):
+        device = device[3:]
+    return device
+
+
+def _parse_version(name: str) -> Tuple[int, int]:
+    match = _VERSION_RE.search(name)
+    if not match:
+        return (0, 0)
+    return (int(match.group(1)), int(match.group(2)))
+
+
+class XC8Toolchain:
+    """An XC8 installation found on this host."""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        major, minor = _parse_version(self.root.name)
+        self.version = f"{major}.{minor:02d}" if major else "unknown"
+
+    def __repr__(self) -> str:
+        return f"XC8Toolchain(root={str(self.root)!r}, version={self.version!r})"
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, XC8Toolchain) and self.root == other.root
+
+    def __hash__(self) -> int:
+        return hash(self.root)
+
+    @property
+    def bin_dir(self) -> Path:
+        return self.root / "bin"
+
+    @property
+    def include_dir(self) -> Path:
+        return self.root / "pic" / "include"
+
+    @property
+    def proc_dir(self) -> Path:
+        return self.include_dir / "proc"
+
+    def tool(self, name: str) -> Path:
+        """Return the path of a compiler executable (``xc8-cc``, ``xc8-ar``...)."""
+        suffix = ".exe" if sys.platform == "win32" else ""
+        return self.bin_dir / f"{name}{suffix}"
+
+    def include_paths(self) -> List[str]:
+        """Return the existing ``pic/include`` and ``pic/include/proc`` paths."""
+        return [str(p) for p in (self.include_dir, self.proc_dir) if p.is_dir()]
+
+    def processor_header(self, device: str) -> Optional[Path]:
+        """Return the processor header for ``device`` or None if not shipped.
+
+        XC8 v2+ keeps them in ``pic/include/proc``, v1.x in ``pic/include``.
+        """
+        name = f"pic{normalize_device(device)}.h"
+        for directory in (self.proc_dir, self.include_dir):
+            candidate = directory / name
+            if candidate.is_file():
+                return candidate
+        return None
+
+    def eeprom_size(self, device: str) -> Optional[int]:
+        """Return the data EEPROM bytes of ``device`` (``_EEPROMSIZE``).
+
+        None if the processor header is missing or does not define it.
+        """
+        header = self.processor_header(device)
+        if header is None:
+            return None
+        match = _EEPROMSIZE_RE.search(header.read_text(errors="replace"))
+        return int(match.group(1), 0) if match else None
+
+
+def _root_from_compiler(compiler: Optional[str]) -> Optional[Path]:
+    """Map ``<root>/bin/xc8-cc`` back to ``<root>``."""
+    if not compiler:
+        return None
+    root = Path(compiler).resolve().parent.parent
+    return root if (root / "pic").is_dir() else None
+
+
+def _candidate_roots(hint: Optional[str]) -> List[Path]:
+    roots = []
+    if hint:
+        roots.append(Path(hint))
+    for var in XC8_ENV_VARS:
+        value = os.environ.get(var)
+        if value:
+            roots.append(Path(value))
+
+    from_path = _root_from_compiler(shutil.which("xc8-cc"))
+    if from_path:
+        roots.append(from_path)
+
+    platform_key = "linux" if sys.platform.startswith("linux") else sys.platform
+    for parent in XC8_INSTALL_PARENTS.get(platform_key, []):
+        parent_path = Path(parent)
+        if not parent_path.is_dir():
+            continue
+        # Newest version first
+        versions = sorted(
+            (p for p in parent_path.iterdir() if p.is_dir()),
+            key=lambda p: _parse_version(p.name),
+            reverse=True,
+        )
+        roots.extend(versions)
+    return roots
+
+
+@functools.lru_cache(maxsize=None)
+def find_xc8_toolchain(hint: Optional[str] = None) -> Optional[XC8Toolchain]:
+    """Find the active XC8 installation.
+
+    Search order: explicit ``hint``, the ``XC8_PATH``/``XC8_HOME``/``XC8_ROOT``
+    environment variables, ``xc8-cc`` on ``PATH`` and finally the default
+    install locations of the host OS (newest version first).
+
+    Args:
+        hint: Optional installation root (or path to its ``bin/xc8-cc``)
+
+    Returns:
+        XC8Toolchain instance, or None if no installation was found
+    """
+    for root in _candidate_roots(hint):
+        if root.is_file():
+            root = root.resolve().parent.parent
+        if (root / "pic" / "include").is_dir():
+            return XC8Toolchain(root)
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def transpiler_include_paths(
+    toolchain: Optional[XC8Toolchain], device: str
+) -> Tuple[Tuple[str, ...], Optional[str]]:
+    """Return the libclang include paths and processor header for a device.
+
+    Args:
+        toolchain: XC8 installation (None if XC8 could not be found)
+        device: Value of ``build.mcu``
+
+    Returns:
+        Tuple of (include paths, processor header path or None)
+    """
+    if toolchain is None:
+        return (), None
+    header = toolchain.processor_header(device)
+    return tuple(toolchain.include_paths()), header.as_posix() if header else None
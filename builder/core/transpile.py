@@ -0,0 +1,361 @@
+"""
+Transpile stage: C++ to C with xc8plusplus
+
+C++ sources are transpiled to C in a ``generated_c`` directory next to them.
+libclang sees the device through ``pic_includes.h`` (generated stubs, the
+XC8 processor header or the universal stubs), the generated C files include
+the real ``<xc.h>``. A transpiled ``main.cpp`` written Arduino-style gets a
+``main()`` calling ``setup()`` and ``loop()``.
+"""
+
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+from .device_header import ensure_device_header
+from .stubs import ensure_device_stubs
+from .templates import render_pic_includes, write_if_changed
+from .toolchain import transpiler_include_paths
+
+ARDUINO_MAIN = """
+
+/**
+ * @brief Main function - Arduino framework entry point
+ * @details Calls setup() once, then loop() repeatedly
+ * @note This function is automatically provided by the Arduino framework
+ */
+void main(void) {
+    setup();
+    while(1) {
+        loop();
+    }
+}
+"""
+
+# With the Arduino core linked, init() starts the I/O and the millis() tick
+ARDUINO_CORE_MAIN = """
+
+void init(void);
+
+/**
+ * @brief Main function - Arduino framework entry point
+ * @details Initializes the Arduino core, calls setup() once, then loop()
+ * @note This function is automatically provided by the Arduino framework
+ */
+void main(void) {
+    init();
+    setup();
+    while(1) {
+        loop();
+    }
+}
+"""
+
+ARDUINO_STUBS = """
+
+/**
+ * @brief Setup function - Arduino framework initialization
+ * @details This is a template stub - implement your initialization code here
+ * @note Original C++ code was not transpiled by xc8plusplus
+ */
+void setup(void) {
+    // TODO: Add your initialization code here
+    // The transpiler failed to convert the C++ setup() function
+    // You may need to manually port the C++ code to C
+}
+
+/**
+ * @brief Loop function - Arduino framework main loop
+ * @details This is a template stub - implement your main loop code here
+ * @note Original C++ code was not transpiled by xc8plusplus
+ */
+void loop(void) {
+    // TODO: Add your main loop code here
+    // The transpiler failed to convert the C++ loop() function
+    // You may need to manually port the C++ code to C
+}
+"""
+
+
+def cached_header_dir(ctx) -> Optional[Path]:
+    """Return the directory of the cached preprocessed <xc.h>, or None"""
+    enabled = str(ctx.board_option("xc8_header_cache", "yes"))
+    if enabled.lower() in ("no", "false", "0", "off"):
+        return None
+
+    # Only defines can change how the processor header expands
+    defines = [f"-D_XTAL_FREQ={ctx.clean_f_cpu}"] + [
+        flag for flag in ctx.env.get("BUILD_FLAGS", []) if flag.startswith(("-D", "-U"))
+    ]
+    return ensure_device_header(ctx.toolchain, ctx.device, defines, ctx.cache_dir)
+
+
+def attempt_manual_transpilation(ctx) -> Optional[List[str]]:
+    """Attempt to use manual transpilation script as fallback"""
+    print("[C++] Attempting manual transpilation fallback...")
+
+    try:
+        cpp_multi_dir = ctx.project_src_dir / "cpp-multi"
+        if not cpp_multi_dir.exists():
+            print("[ERROR] cpp-multi directory not found")
+            return None
+
+        transpile_script = cpp_multi_dir / "manual_transpile.py"
+        if not transpile_script.exists():
+            print("[ERROR] manual_transpile.py not found")
+            return None
+
+        result = subprocess.run(
+            [sys.executable, str(transpile_script)],
+            cwd=str(cpp_multi_dir),
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            print(f"[ERROR] Manual transpilation failed: {result.stderr}")
+            return None
+
+        print("[C++] Manual transpilation successful")
+        generated_dir = cpp_multi_dir / "generated_c"
+        if generated_dir.exists():
+            return [str(f) for f in generated_dir.glob("*.c")]
+        return None
+
+    except Exception as e:
+        print(f"[ERROR] Manual transpilation fallback failed: {e}")
+        return None
+
+
+def _copy_headers(header_files: List[str], output_dir: Path, tag: str) -> None:
+    """Copy project headers next to the transpiled files (.hpp become .h)"""
+    print(f"[{tag}] Copying header files to output directory...")
+    for header_file in header_files:
+        header_path = Path(header_file)
+        if header_path.suffix == ".hpp":
+            output_header = output_dir / f"{header_path.stem}.h"
+            content = header_path.read_text()
+            content = content.replace('.hpp"', '.h"')
+            content = content.replace("_HPP", "_H")
+
+            # Add XC8 include at the top of converted headers
+            if not content.startswith("#include <xc.h>"):
+                content = "#include <xc.h>\n" + content
+
+            write_if_changed(output_header, content)
+            print(f"[{tag}] Converted {header_path.name} -> {output_header.name}")
+        else:
+            output_header = output_dir / header_path.name
+            if header_path.resolve() != output_header.resolve():
+                shutil.copy2(header_path, output_header)
+                print(f"[{tag}] Copied {header_path.name}")
+            else:
+                print(
+                    f"[{tag}] Skipped {header_path.name} (already in output directory)"
+                )
+
+
+def _complete_main(ctx, c_content: str, output_file: Path) -> Optional[str]:
+    """Make sure a transpiled main.c has an entry point.
+
+    Returns:
+        Possibly extended C source, or None if no entry point can be provided
+    """
+    tag = ctx.config.tag
+    has_main = "void main(" in c_content or "int main(" in c_content
+    has_setup_loop = "void setup(" in c_content and "void loop(" in c_content
+    arduino_main = ARDUINO_MAIN
+    if ctx.results.get("arduino_core"):
+        arduino_main = ARDUINO_CORE_MAIN
+
+    if has_main:
+        print(f"[{tag}] ✓ Main function found in transpiled {output_file.name}")
+        return c_content
+    if has_setup_loop:
+        print(f"[{tag}] Arduino-style code detected in {output_file.name}")
+        print(f"[{tag}] ✓ Arduino framework main() added to {output_file.name}")
+        return c_content + arduino_main
+    if ctx.config.missing_main == "stub":
+        print(
+            "[WARNING] No main(), setup(), or loop() functions found in "
+            f"{output_file.name}"
+        )
+        print(
+            f"[{tag}] ⚠️  Arduino template stubs added - implement setup() and loop()"
+        )
+        return c_content + ARDUINO_STUBS + arduino_main
+
+    print(f"[ERROR] Main function not found in transpiled {output_file.name}")
+    print("[ERROR] The xc8plusplus transpiler generated the class definitions")
+    print("[ERROR] but failed to transpile the main() function implementation")
+    print("[ERROR] Solutions:")
+    print("[ERROR] 1. Use Arduino-style setup() and loop() functions")
+    print(f"[ERROR] 2. Manually add a C main() function to {output_file.name}")
+    print("[ERROR] 3. Simplify the C++ main() function")
+    print("[ERROR] 4. Use a different transpiler or write C code directly")
+    return None
+
+
+def transpile_cpp_files(ctx) -> Optional[List[str]]:
+    """Transpile the project C++ files to C using xc8plusplus
+
+    Returns:
+        C files to compile, or None if transpilation failed
+    """
+    tag = ctx.config.tag
+    print(f"[{tag}] Starting C++ to C transpilation...")
+
+    try:
+        from xc8plusplus import XC8Transpiler
+    except ImportError:
+        if ctx.config.manual_transpile_fallback:
+            print(
+                "[WARNING] xc8plusplus not available - attempting manual transpilation"
+            )
+            return attempt_manual_transpilation(ctx)
+        print(
+            f"[WARNING] xc8plusplus not available - {ctx.config.name} "
+            "requires transpiler"
+        )
+        return None
+
+    transpiler = XC8Transpiler()
+
+    # Include paths of the active XC8 installation, cached <xc.h> first
+    include_paths, processor_header = transpiler_include_paths(
+        ctx.toolchain, ctx.device
+    )
+    include_paths = list(include_paths)
+    header_dir = cached_header_dir(ctx)
+    if header_dir:
+        include_paths.insert(0, str(header_dir))
+    include_paths.extend(ctx.include_dirs)
+
+    if hasattr(transpiler, "add_include_path"):
+        for path in include_paths:
+            transpiler.add_include_path(path)
+    elif hasattr(transpiler, "include_paths"):
+        transpiler.include_paths.extend(include_paths)
+    print(f"[{tag}] Configured transpiler with XC8 include paths: {include_paths}")
+
+    output_dir = Path(ctx.cpp_files[0]).parent / "generated_c"
+    output_dir.mkdir(exist_ok=True)
+    print(f"[{tag}] Transpiling to: {output_dir} ({ctx.device} @ {ctx.f_cpu})")
+
+    # Header giving libclang the device SFRs; rewritten only when it changes
+    stubs_file = ctx.framework_dir / "pic_universal_stubs.h"
+    if not stubs_file.exists():
+        print(f"[ERROR] Universal stubs file not found: {stubs_file}")
+        return None
+    device_stubs = ensure_device_stubs(ctx.device, ctx.toolchain, ctx.cache_dir)
+    pic_header = output_dir / "pic_includes.h"
+    write_if_changed(
+        pic_header,
+        render_pic_includes(
+            ctx.device,
+            ctx.f_cpu,
+            stubs_file.as_posix(),
+            processor_header,
+            device_stubs.as_posix() if device_stubs else None,
+        ),
+    )
+    print(f"[{tag}] Device stubs: {device_stubs or processor_header or stubs_file}")
+
+    _copy_headers(ctx.header_files, output_dir, tag)
+
+    transpiled_files = []
+    main_file_found = False
+    for cpp_file in ctx.cpp_files:
+        cpp_path = Path(cpp_file)
+        output_file = output_dir / f"{cpp_path.stem}.c"
+        is_main = cpp_path.stem.lower() == "main"
+        print(f"[{tag}] Transpiling {cpp_path.name} -> {output_file.name}")
+
+        # Temporary copy with the PIC includes and .hpp -> .h includes
+        temp_cpp = output_dir / f"temp_{cpp_path.name}"
+        content = cpp_path.read_text().replace('.hpp"', '.h"')
+        temp_cpp.write_text(f'#include "pic_includes.h"\n{content}')
+
+        try:
+            if not transpiler.transpile(str(temp_cpp), str(output_file)):
+                print(f"[{tag}] ✗ Failed: {cpp_path.name}")
+                return None
+        except Exception as e:
+            print(f"[{tag}] Exception during transpilation of {cpp_path.name}: {e}")
+            return None
+        finally:
+            if temp_cpp.exists():
+                temp_cpp.unlink()
+
+        if output_file.exists():
+            # Replace our transpilation header with the real XC8 header
+            c_content = output_file.read_text().replace(
+                '#include "pic_includes.h"', "#include <xc.h>"
+            )
+            if is_main:
+                c_content = _complete_main(ctx, c_content, output_file)
+                if c_content is None:
+                    return None
+            output_file.write_text(c_content)
+
+        # Only main.c is compiled, the other files resolve its dependencies
+        if is_main:
+            transpiled_files.append(str(output_file))
+            main_file_found = True
+            print(
+                f"[{tag}] ✓ Success: {output_file.name} (main file - included in build)"
+            )
+        else:
+            print(
+                f"[{tag}] ✓ Success: {output_file.name} "
+                "(dependency - not directly compiled)"
+            )
+
+    if not main_file_found:
+        if ctx.config.missing_main == "stub":
+            print(
+                f"[ERROR] No main file found - {ctx.config.name} "
+                "requires a main.cpp file"
+            )
+            print("[ERROR] main.cpp should contain setup() and loop() or main()")
+            return None
+        # Fallback: compile every transpiled file (may cause redefinitions)
+        transpiled_files = [
+            str(output_dir / f"{Path(f).stem}.c")
+            for f in ctx.cpp_files
+            if (output_dir / f"{Path(f).stem}.c").exists()
+        ]
+        if not transpiled_files:
+            print("[ERROR] No files were successfully transpiled!")
+            return None
+        print(
+            f"[WARNING] No main.c - using all {len(transpiled_files)} transpiled files"
+        )
+
+    print(
+        f"[{tag}] Transpilation completed - {len(transpiled_files)} C files generated"
+    )
+    return transpiled_files
+
+
+def transpile_sources(ctx) -> bool:
+    """Transpile stage: replace the C++ sources by their C translation"""
+    if not ctx.cpp_files:
+        print("[SOURCES] No C++ files found - using C files only")
+        return True
+
+    print(f"[{ctx.config.tag}] *** C++ FILES DETECTED - TRANSPILATION REQUIRED ***")
+    transpiled_files = transpile_cpp_files(ctx)
+    if not transpiled_files:
+        print("[ERROR] C++ transpilation failed!")
+        return False
+
+    # Stale files in generated_c are replaced by the freshly transpiled ones
+    other_c_files = [f for f in ctx.c_files if "generated_c" not in str(f)]
+    sources = transpiled_files + other_c_files + ctx.asm_files
+    ctx.sources = list(dict.fromkeys(sources))
+    print(f"[SOURCES] *** FINAL SOURCE FILES FOR COMPILATION ({len(ctx.sources)}) ***")
+    for src in ctx.sources:
+        print(f"[SOURCES]   ✓ {src}")
+    return True
@@ -0,0 +1,136 @@
+"""
+Compile, link and postprocess stages: drive XC8 through xc8-wrapper
+
+XC8 compiles and links in one invocation, so the compile stage only builds
+the argument list and the link stage runs ``xc8-wrapper cc`` (or ``as`` for
+pure assembly projects) on every source at once.
+"""
+
+import shutil
+from pathlib import Path
+from typing import List
+
+from .sources import ASSEMBLY_EXTENSIONS
+from .transpile import cached_header_dir
+
+
+def compile_arguments(ctx) -> bool:
+    """Compile stage: build the XC8 argument list"""
+    print("[SETUP] Starting argument construction")
+
+    ctx.has_assembly = any(
+        Path(src).suffix.lower() in ASSEMBLY_EXTENSIONS for src in ctx.sources
+    )
+    ctx.has_c_files = any(Path(src).suffix.lower() == ".c" for src in ctx.sources)
+
+    # Base arguments for all file types - F_CPU without any L/U suffix
+    ctx.xc8_args = [f"-mcpu={ctx.device}", f"-D_XTAL_FREQ={ctx.clean_f_cpu}"]
+
+    # Add build_flags from platformio.ini, optimization flags last
+    build_flags = [
+        flag for flag in ctx.env.get("BUILD_FLAGS", []) if not _is_optimization(flag)
+    ]
+    if build_flags:
+        print(f"[SETUP] Adding build_flags from platformio.ini: {build_flags}")
+        ctx.xc8_args.extend(build_flags)
+    ctx.xc8_args.extend(optimization_arguments(ctx))
+
+    # Definitions and include directories of framework stages (Arduino core...)
+    ctx.xc8_args.extend(f"-D{define}" for define in ctx.defines)
+    ctx.xc8_args.extend(f"-I{path}" for path in ctx.include_dirs)
+
+    # Use the cached preprocessed <xc.h> for C sources when available
+    header_dir = cached_header_dir(ctx) if ctx.has_c_files else None
+    if header_dir:
+        ctx.xc8_args.insert(0, f"-I{header_dir}")
+        print(f"[SETUP] Using cached device header from: {header_dir}")
+
+    if ctx.has_assembly and not ctx.has_c_files:
+        print("[SETUP] Building pure assembly project")
+    elif ctx.has_c_files:
+        print("[SETUP] Building C project")
+        if ctx.has_assembly:
+            print("[SETUP] Mixed C/assembly project detected")
+    else:
+        print("[WARNING] No recognized source files found")
+
+    print(f"[SETUP] xc8_args={ctx.xc8_args}")
+    return True
+
+
+def _is_optimization(flag: str) -> bool:
+    """True for XC8 flags selecting the optimizations (``-O2``, ``--opt=...``)"""
+    return flag.startswith("-O") or flag.startswith("--opt")
+
+
+def optimization_arguments(ctx) -> List[str]:
+    """Return the XC8 optimization flags of the build.
+
+    A sweep build's own flags win, then ``-O``/``--opt`` flags of
+    ``build_flags``, then ``-O<OPTIMIZATION_LEVEL>``.
+    """
+    if ctx.optimization_flags is not None:
+        return list(ctx.optimization_flags)
+    flags = [flag for flag in ctx.env.get("BUILD_FLAGS", []) if _is_optimization(flag)]
+    if flags:
+        return flags
+    level = str(ctx.env.get("OPTIMIZATION_LEVEL", "")).strip()
+    return [f"-O{level}"] if level else []
+
+
+def _listing_arguments(ctx, args) -> list:
+    """Ask for the map file and assembly listing the analysis tools read"""
+    extra = []
+    if not any(arg.startswith("-Wl,-Map") for arg in args):
+        extra.append(f"-Wl,-Map={ctx.output_dir / 'firmware.map'}")
+    if "-Wa,-a" not in args:
+        extra.append("-Wa,-a")
+    return extra
+
+
+def link_firmware(ctx) -> bool:
+    """Link stage: compile and link every source into firmware.hex"""
+    try:
+        from xc8_wrapper import run_command
+    except ImportError as e:
+        print(f"[ERROR] xc8-wrapper not available: {e}")
+        return False
+
+    ctx.output_dir.mkdir(parents=True, exist_ok=True)
+
+    # Everything goes through --passthrough, each argument quoted
+    passthrough_args = [arg for arg in ctx.xc8_args if arg not in ctx.sources]
+    passthrough_args.extend(["-o", str(ctx.output_hex)])
+    passthrough_args.extend(_listing_arguments(ctx, passthrough_args))
+    passthrough_args.extend(ctx.sources)
+    passthrough_args.extend(ctx.libraries)
+    passthrough_str = " ".join(f'"{arg}"' for arg in passthrough_args)
+
+    # Pure assembly projects go to pic-as, everything else to xc8-cc
+    driver = "as" if ctx.has_assembly and not ctx.has_c_files else "cc"
+    xc8_cmd = ["xc8-wrapper", driver, "--passthrough", passthrough_str]
+    print(f"[INFO] Full command: {' '.join(xc8_cmd)}")
+
+    if not run_command(xc8_cmd, f"Building PIC firmware ({ctx.config.name})"):
+        print("[ERROR] Compilation/linking failed!")
+        return False
+
+    print("[OK] Build completed successfully!")
+    print(f"[OUTPUT] Firmware ready: {ctx.output_hex}")
+    return True
+
+
+def copy_firmware(ctx) -> bool:
+    """Postprocess stage: copy firmware.hex to the PlatformIO target"""
+    if not ctx.target:
+        return True
+
+    target_path = Path(str(ctx.target[0]))
+    target_path.parent.mkdir(parents=True, exist_ok=True)
+    if not ctx.output_hex.exists():
+        print(f"[ERROR] Output file not found: {ctx.output_hex}")
+        return False
+
+    shutil.copy2(ctx.output_hex, target_path)
+    print(f"[INFO] Created target: {target_path}")
+    return True
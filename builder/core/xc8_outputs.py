@@ -0,0 +1,220 @@
+"""
+Symbols, functions and line information from the XC8 link outputs
+
+Next to ``firmware.hex`` XC8 writes ``firmware.sym`` (one symbol per line:
+name, value, flags, class, space, psect), ``firmware.map`` (psect and symbol
+tables) and, with ``-Wa,-a``, the assembly listing ``firmware.lst`` where
+each instruction line carries its program address and is preceded by the C
+source line it came from (``;main.c: 12: PORTB = 0;``). Program addresses
+are word addresses on PIC16.
+"""
+
+import re
+from bisect import bisect_right
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+
+class Symbol:
+    """A linker symbol.
+
+    Attributes:
+        name: Assembly name (C functions and variables start with ``_``)
+        address: Value (word address for code)
+        cls: Linker class (``CODE``, ``BANK0``, ``ABS``...) if known
+        psect: Program section the symbol belongs to
+    """
+
+    def __init__(self, name: str, address: int, cls: str = "", psect: str = ""):
+        self.name = name
+        self.address = address
+        self.cls = cls
+        self.psect = psect
+
+    def __repr__(self) -> str:
+        return f"Symbol({self.name!r}, 0x{self.address:04X}, {self.cls or self.psect})"
+
+    @property
+    def is_code(self) -> bool:
+        if self.cls:
+            return self.cls.upper() in ("CODE", "ENTRY", "STRCODE", "CONST")
+        return bool(_CODE_PSECT_RE.match(self.psect))
+
+    @property
+    def is_function(self) -> bool:
+        """True for C function entry points (``_main``, not ``__end_of_main``)."""
+        name = self.name
+        return (
+            self.is_code
+            and name.startswith("_")
+            and not name.startswith("__")
+            and "@" not in name
+            and "$" not in name
+        )
+
+
+def c_name(symbol_name: str) -> str:
+    """Return the C name of an assembly symbol (``_main`` -> ``main``)."""
+    return symbol_name[1:] if symbol_name.startswith("_") else symbol_name
+
+
+_CODE_PSECT_RE = re.compile(
+    r"^(text\d*|maintext|intentry|cinit|init|end_init|reset_vec|powerup|"
+    r"functab|stringtext\d*|jmp_tab)$"
+)
+_MAP_SYMBOL_RE = re.compile(r"(\S+)\s+(\S+)\s+([0-9A-Fa-f]+)(?=\s|$)")
+_LST_CODE_RE = re.compile(r"^\s*\d+\s+([0-9A-Fa-f]{4,6})\s+([0-9A-Fa-f]{4})\s+\S")
+_LST_SOURCE_RE = re.compile(r"^\s*\d*\s*;\s*([^;:\s][^;:]*?\.\w+):\s*(\d+):")
+_LST_FUNCTION_RE = re.compile(r";;\s*\*+\s*function\s+(\S+)\s*\*+")
+
+
+def read_sym_file(path: Path) -> List[Symbol]:
+    """Parse an XC8 ``.sym`` file."""
+    symbols = []
+    for line in path.read_text(errors="replace").splitlines():
+        tokens = line.split()
+        if len(tokens) < 2:
+            continue
+        try:
+            address = int(tokens[1], 16)
+        except ValueError:
+            continue
+        cls = tokens[3] if len(tokens) > 3 else ""
+        psect = tokens[5] if len(tokens) > 5 else ""
+        symbols.append(Symbol(tokens[0], address, cls, psect))
+    return symbols
+
+
+def read_map_symbols(path: Path) -> List[Symbol]:
+    """Parse the symbol table of an XC8 ``.map`` file."""
+    symbols = []
+    in_table = False
+    for line in path.read_text(errors="replace").splitlines():
+        if "Symbol Table" in line:
+            in_table = True
+            continue
+        if not in_table:
+            continue
+        if line and not line[0].isspace() and line.strip().endswith(":"):
+            break  # next section
+        for name, psect, value in _MAP_SYMBOL_RE.findall(line):
+            symbols.append(Symbol(name, int(value, 16), "", psect))
+    return symbols
+
+
+class ListingLine:
+    """One instruction of the assembly listing."""
+
+    def __init__(
+        self,
+        address: int,
+        opcode: int,
+        source: Optional[Tuple[str, int]],
+        function: Optional[str],
+        text: str,
+    ):
+        self.address = address
+        self.opcode = opcode
+        self.source = source
+        self.function = function
+        self.text = text
+
+
+def read_listing(path: Path) -> List[ListingLine]:
+    """Parse the instructions of an XC8 ``.lst`` file."""
+    lines = []
+    source = None
+    function = None
+    for text in path.read_text(errors="replace").splitlines():
+        marker = _LST_FUNCTION_RE.search(text)
+        if marker:
+            function = marker.group(1)
+            continue
+        code = _LST_CODE_RE.match(text)
+        if code:
+            lines.append(
+                ListingLine(
+                    int(code.group(1), 16),
+                    int(code.group(2), 16),
+                    source,
+                    function,
+                    text,
+                )
+            )
+            continue
+        src = _LST_SOURCE_RE.match(text)
+        if src:
+            source = (src.group(1).strip(), int(src.group(2)))
+    return lines
+
+
+class XC8Outputs:
+    """Lazily parsed link outputs of one build.
+
+    Args:
+        output_dir: Directory holding ``firmware.hex`` and its siblings
+        stem: Base name of the outputs
+    """
+
+    def __init__(self, output_dir, stem: str = "firmware"):
+        self.output_dir = Path(output_dir)
+        self.stem = stem
+        self._symbols: Optional[List[Symbol]] = None
+        self._listing: Optional[List[ListingLine]] = None
+        self._functions: Optional[List[Tuple[int, str]]] = None
+
+    def path(self, suffix: str) -> Path:
+        return self.output_dir / f"{self.stem}{suffix}"
+
+    def available(self) -> List[str]:
+        """Return the suffixes of the outputs present."""
+        return [s for s in (".sym", ".map", ".lst") if self.path(s).exists()]
+
+    def symbols(self) -> List[Symbol]:
+        if self._symbols is None:
+            if self.path(".sym").exists():
+                self._symbols = read_sym_file(self.path(".sym"))
+            elif self.path(".map").exists():
+                self._symbols = read_map_symbols(self.path(".map"))
+            else:
+                self._symbols = []
+        return self._symbols
+
+    def symbol(self, name: str) -> Optional[Symbol]:
+        for symbol in self.symbols():
+            if symbol.name == name:
+                return symbol
+        return None
+
+    def listing(self) -> List[ListingLine]:
+        if self._listing is None:
+            path = self.path(".lst")
+            self._listing = read_listing(path) if path.exists() else []
+        return self._listing
+
+    def functions(self) -> List[Tuple[int, str]]:
+        """Return ``(start address, assembly name)`` of every function, sorted."""
+        if self._functions is None:
+            starts: Dict[int, str] = {}
+            for line in self.listing():
+                if line.function and line.function not in starts.values():
+                    starts.setdefault(line.address, line.function)
+            for symbol in self.symbols():
+                if symbol.is_function:
+                    starts[symbol.address] = symbol.name
+            self._functions = sorted(starts.items())
+        return self._functions
+
+    def function_owners(self, size: int) -> List[Optional[str]]:
+        """Return the function owning each of ``size`` program addresses."""
+        functions = self.functions()
+        addresses = [address for address, _ in functions]
+        owners: List[Optional[str]] = []
+        for address in range(size):
+            i = bisect_right(addresses, address) - 1
+            owners.append(functions[i][1] if i >= 0 else None)
+        return owners
+
+    def line_table(self) -> Dict[int, Tuple[str, int]]:
+        """Return ``{address: (source file, line)}`` from the listing."""
+        return {line.address: line.source for line in self.listing() if line.source}
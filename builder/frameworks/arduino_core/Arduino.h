@@ -0,0 +1,48 @@
+// Arduino-style core for PIC16 (pio framework = arduino)
+// Compiled once per MCU and F_CPU into libarduino.a in the platform cache;
+// the generated main() calls init() before setup()
+#ifndef ARDUINO_H
+#define ARDUINO_H
+
+#include <xc.h>
+
+#define HIGH 1
+#define LOW 0
+
+#define INPUT 0
+#define OUTPUT 1
+#define INPUT_PULLUP 2
+
+// Pin numbers: port * 8 + bit (RA0 = 0, RB0 = 8, RC0 = 16...)
+#define PIN_PORT(pin) ((unsigned char)(pin) >> 3)
+#define PIN_BIT(pin) ((unsigned char)(pin) & 7)
+
+typedef unsigned char boolean;
+typedef unsigned char byte;
+
+// Called by the generated main() before setup(): digital I/O, Timer0 tick
+void init(void);
+
+void pinMode(unsigned char pin, unsigned char mode);
+void digitalWrite(unsigned char pin, unsigned char value);
+unsigned char digitalRead(unsigned char pin);
+
+// PIN_<name> numbers and the digitalWriteFast()/digitalReadFast()/
+// pinModeFast() macros of the part (generated per MCU, found on the
+// include path before the generic copy)
+#include <pins_arduino.h>
+
+// Timer0 overflow interrupt; the core owns the interrupt vector and calls
+// arduino_serial_isr once Serial_begin() has set it
+extern void (*arduino_serial_isr)(void);
+// Call isr (NULL: none) on every interrupt, after the core's handlers; it
+// checks and clears the flags of its own sources
+void attachISR(void (*isr)(void));
+unsigned long millis(void);
+unsigned long micros(void);
+void delay(unsigned long ms);
+void delayMicroseconds(unsigned int us);
+
+#include "HardwareSerial.h"
+
+#endif // ARDUINO_H
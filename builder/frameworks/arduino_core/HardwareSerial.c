@@ -0,0 +1,232 @@
+// Interrupt-driven USART of the Arduino core
+#include "Arduino.h"
+
+// Parts without a (single) USART build this file empty
+#if defined(TXSTA) && defined(RCSTA)
+
+#if (SERIAL_RX_BUFFER_SIZE & (SERIAL_RX_BUFFER_SIZE - 1)) != 0
+#error "SERIAL_RX_BUFFER_SIZE must be a power of two"
+#endif
+#if (SERIAL_TX_BUFFER_SIZE & (SERIAL_TX_BUFFER_SIZE - 1)) != 0
+#error "SERIAL_TX_BUFFER_SIZE must be a power of two"
+#endif
+
+#define RX_MASK (SERIAL_RX_BUFFER_SIZE - 1)
+#define TX_MASK (SERIAL_TX_BUFFER_SIZE - 1)
+
+// USART bits, identical on every mid-range part
+#define TXSTA_TXEN 0x20
+#define TXSTA_SYNC 0x10
+#define TXSTA_BRGH 0x04
+#define TXSTA_TRMT 0x02
+#define RCSTA_SPEN 0x80
+#define RCSTA_CREN 0x10
+#define RCSTA_OERR 0x02
+#define PIR1_RCIF 0x20
+#define PIR1_TXIF 0x10
+#define PIE1_RCIE 0x20
+#define PIE1_TXIE 0x10
+#define INTCON_PEIE 0x40
+#define BAUD_BRG16 0x08
+
+#ifdef SPBRGL
+#define SERIAL_SPBRG SPBRGL
+#else
+#define SERIAL_SPBRG SPBRG
+#endif
+#if defined(BAUDCTL)
+#define SERIAL_BAUD BAUDCTL
+#elif defined(BAUDCON)
+#define SERIAL_BAUD BAUDCON
+#endif
+
+// The interrupt writes rx_head and tx_tail, the functions below the others
+static volatile unsigned char rx_buffer[SERIAL_RX_BUFFER_SIZE];
+static volatile unsigned char rx_head;
+static volatile unsigned char rx_tail;
+static volatile unsigned char tx_buffer[SERIAL_TX_BUFFER_SIZE];
+static volatile unsigned char tx_head;
+static volatile unsigned char tx_tail;
+
+static void serial_isr(void)
+{
+    if ((PIR1 & PIR1_RCIF) && (PIE1 & PIE1_RCIE)) {
+        unsigned char c;
+        unsigned char next;
+
+        // An overrun stops the receiver until CREN is toggled
+        if (RCSTA & RCSTA_OERR) {
+            RCSTA &= (unsigned char)~RCSTA_CREN;
+            RCSTA |= RCSTA_CREN;
+        }
+        c = RCREG;
+        next = (rx_head + 1) & RX_MASK;
+        // Bytes arriving with a full buffer are dropped
+        if (next != rx_tail) {
+            rx_buffer[rx_head] = c;
+            rx_head = next;
+        }
+    }
+    if ((PIR1 & PIR1_TXIF) && (PIE1 & PIE1_TXIE)) {
+        if (tx_head != tx_tail) {
+            TXREG = tx_buffer[tx_tail];
+            tx_tail = (tx_tail + 1) & TX_MASK;
+        }
+        if (tx_head == tx_tail) {
+            PIE1 &= (unsigned char)~PIE1_TXIE;
+        }
+    }
+}
+
+void Serial_begin(unsigned long baud)
+{
+    unsigned long divisor;
+
+#ifdef ARDUINO_SERIAL_TRIS
+    ARDUINO_SERIAL_TRIS |= ARDUINO_SERIAL_TRIS_MASK;
+#endif
+    rx_head = rx_tail = 0;
+    tx_head = tx_tail = 0;
+
+    // High speed clock, rounded to the nearest divisor
+#ifdef SERIAL_BAUD
+    divisor = (_XTAL_FREQ / 4UL + baud / 2) / baud - 1;
+    SERIAL_BAUD |= BAUD_BRG16;
+    SPBRGH = (unsigned char)(divisor >> 8);
+    SERIAL_SPBRG = (unsigned char)divisor;
+    TXSTA = TXSTA_TXEN | TXSTA_BRGH;
+#else
+    divisor = (_XTAL_FREQ / 16UL + baud / 2) / baud - 1;
+    if (divisor > 255) {
+        divisor = (_XTAL_FREQ / 64UL + baud / 2) / baud - 1;
+        TXSTA = TXSTA_TXEN;
+    } else {
+        TXSTA = TXSTA_TXEN | TXSTA_BRGH;
+    }
+    SERIAL_SPBRG = (unsigned char)divisor;
+#endif
+    RCSTA = RCSTA_SPEN | RCSTA_CREN;
+
+    arduino_serial_isr = serial_isr;
+    PIE1 = (PIE1 & (unsigned char)~PIE1_TXIE) | PIE1_RCIE;
+    INTCON |= INTCON_PEIE;
+}
+
+void Serial_end(void)
+{
+    Serial_flush();
+    PIE1 &= (unsigned char)~(PIE1_RCIE | PIE1_TXIE);
+    RCSTA = 0;
+    TXSTA = 0;
+}
+
+unsigned char Serial_available(void)
+{
+    return (rx_head - rx_tail) & RX_MASK;
+}
+
+int Serial_peek(void)
+{
+    if (rx_head == rx_tail) {
+        return -1;
+    }
+    return rx_buffer[rx_tail];
+}
+
+int Serial_read(void)
+{
+    unsigned char c;
+
+    if (rx_head == rx_tail) {
+        return -1;
+    }
+    c = rx_buffer[rx_tail];
+    rx_tail = (rx_tail + 1) & RX_MASK;
+    return c;
+}
+
+unsigned char Serial_availableForWrite(void)
+{
+    return (tx_tail - tx_head - 1) & TX_MASK;
+}
+
+unsigned char Serial_write(unsigned char c)
+{
+    unsigned char next;
+
+    // Idle transmitter: no need to queue (the interrupt is off while the
+    // buffer is empty)
+    if (tx_head == tx_tail && (PIR1 & PIR1_TXIF)) {
+        TXREG = c;
+        return 1;
+    }
+    next = (tx_head + 1) & TX_MASK;
+    if (next == tx_tail) {
+        return 0;
+    }
+    tx_buffer[tx_head] = c;
+    tx_head = next;
+    PIE1 |= PIE1_TXIE;
+    return 1;
+}
+
+unsigned int Serial_print(const char *s)
+{
+    unsigned int count = 0;
+
+    while (*s && Serial_write((unsigned char)*s)) {
+        s++;
+        count++;
+    }
+    return count;
+}
+
+unsigned int Serial_println(const char *s)
+{
+    unsigned int count = Serial_print(s);
+
+    count += Serial_write('\r');
+    count += Serial_write('\n');
+    return count;
+}
+
+unsigned int Serial_printNumber(long value)
+{
+    char digits[12];
+    unsigned char i = sizeof(digits) - 1;
+    unsigned long n = value < 0 ? -(unsigned long)value : (unsigned long)value;
+
+    digits[i] = '\0';
+    do {
+        digits[--i] = (char)('0' + n % 10);
+        n /= 10;
+    } while (n);
+    if (value < 0) {
+        digits[--i] = '-';
+    }
+    return Serial_print(&digits[i]);
+}
+
+void Serial_flush(void)
+{
+    while (tx_head != tx_tail) {
+    }
+    while (!(TXSTA & TXSTA_TRMT)) {
+    }
+}
+
+const HardwareSerial Serial = {
+    Serial_begin,
+    Serial_end,
+    Serial_available,
+    Serial_read,
+    Serial_peek,
+    Serial_availableForWrite,
+    Serial_write,
+    Serial_print,
+    Serial_println,
+    Serial_printNumber,
+    Serial_flush,
+};
+
+#endif // TXSTA && RCSTA
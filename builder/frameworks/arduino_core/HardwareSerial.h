@@ -0,0 +1,50 @@
+// Interrupt-driven USART of the Arduino core: Serial.begin(9600)...
+// Received bytes are queued by the interrupt, writes return at once and are
+// sent from the interrupt. Buffer sizes are powers of two chosen from the
+// RAM of the part (SERIAL_RX_BUFFER_SIZE, SERIAL_TX_BUFFER_SIZE).
+#ifndef HARDWARE_SERIAL_H
+#define HARDWARE_SERIAL_H
+
+#ifndef SERIAL_RX_BUFFER_SIZE
+#define SERIAL_RX_BUFFER_SIZE 16
+#endif
+#ifndef SERIAL_TX_BUFFER_SIZE
+#define SERIAL_TX_BUFFER_SIZE 16
+#endif
+
+void Serial_begin(unsigned long baud);
+void Serial_end(void);
+// Bytes received and not read yet
+unsigned char Serial_available(void);
+// Next received byte, -1 if none
+int Serial_read(void);
+int Serial_peek(void);
+// Free space of the transmit buffer
+unsigned char Serial_availableForWrite(void);
+// Queue one byte: 1 if queued, 0 if the transmit buffer is full
+unsigned char Serial_write(unsigned char c);
+// Queue a string, as much as fits: number of bytes queued
+unsigned int Serial_print(const char *s);
+unsigned int Serial_println(const char *s);
+unsigned int Serial_printNumber(long value);
+// Wait until every queued byte has been sent
+void Serial_flush(void);
+
+// Arduino syntax: Serial.begin(9600), Serial.write('A')...
+typedef struct {
+    void (*begin)(unsigned long baud);
+    void (*end)(void);
+    unsigned char (*available)(void);
+    int (*read)(void);
+    int (*peek)(void);
+    unsigned char (*availableForWrite)(void);
+    unsigned char (*write)(unsigned char c);
+    unsigned int (*print)(const char *s);
+    unsigned int (*println)(const char *s);
+    unsigned int (*printNumber)(long value);
+    void (*flush)(void);
+} HardwareSerial;
+
+extern const HardwareSerial Serial;
+
+#endif // HARDWARE_SERIAL_H
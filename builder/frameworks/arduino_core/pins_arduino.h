@@ -0,0 +1,58 @@
+// Generic Arduino pin map, used when the SFR layout of the part is unknown
+// (no XC8 installation nor SFR data file). Builds with a known layout get a
+// generated pins_arduino.h with the implemented pins and fast macros.
+#ifndef PINS_ARDUINO_H
+#define PINS_ARDUINO_H
+
+#define PIN_RA0 0
+#define PIN_RA1 1
+#define PIN_RA2 2
+#define PIN_RA3 3
+#define PIN_RA4 4
+#define PIN_RA5 5
+#define PIN_RA6 6
+#define PIN_RA7 7
+#define PIN_RB0 8
+#define PIN_RB1 9
+#define PIN_RB2 10
+#define PIN_RB3 11
+#define PIN_RB4 12
+#define PIN_RB5 13
+#define PIN_RB6 14
+#define PIN_RB7 15
+#define PIN_RC0 16
+#define PIN_RC1 17
+#define PIN_RC2 18
+#define PIN_RC3 19
+#define PIN_RC4 20
+#define PIN_RC5 21
+#define PIN_RC6 22
+#define PIN_RC7 23
+#define PIN_RD0 24
+#define PIN_RD1 25
+#define PIN_RD2 26
+#define PIN_RD3 27
+#define PIN_RD4 28
+#define PIN_RD5 29
+#define PIN_RD6 30
+#define PIN_RD7 31
+#define PIN_RE0 32
+#define PIN_RE1 33
+#define PIN_RE2 34
+#define PIN_RE3 35
+
+#define NUM_DIGITAL_PINS 40
+
+#define ARDUINO_PORT_MASKS { 0xFF, 0xFF, 0xFF, 0xFF, 0xFF }
+
+// USART pins of most 28/40-pin parts: RC6 (TX) and RC7 (RX)
+#ifdef TRISC
+#define ARDUINO_SERIAL_TRIS TRISC
+#define ARDUINO_SERIAL_TRIS_MASK 0xC0
+#endif
+
+#define digitalWriteFast(pin, value) digitalWrite((pin), (value))
+#define digitalReadFast(pin) digitalRead(pin)
+#define pinModeFast(pin, mode) pinMode((pin), (mode))
+
+#endif // PINS_ARDUINO_H
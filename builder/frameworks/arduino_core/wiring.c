@@ -0,0 +1,144 @@
+// Time keeping of the Arduino core: Timer0 overflow interrupt
+#include "Arduino.h"
+
+// Timer0 counts instruction cycles (F_CPU / 4) through a 1:16 prescaler
+#define TIMER0_PRESCALE 16UL
+#define MICROSECONDS_PER_TIMER0_OVERFLOW \
+    ((256UL * TIMER0_PRESCALE * 4UL * 1000UL) / (_XTAL_FREQ / 1000UL))
+
+// Whole and fractional (1/8 ms) milliseconds per overflow, as on AVR
+#define MILLIS_INC (MICROSECONDS_PER_TIMER0_OVERFLOW / 1000UL)
+#define FRACT_INC ((MICROSECONDS_PER_TIMER0_OVERFLOW % 1000UL) >> 3)
+#define FRACT_MAX (1000UL >> 3)
+
+// INTCON bits, identical on every mid-range part
+#define INTCON_GIE 0x80
+#define INTCON_TMR0IE 0x20
+#define INTCON_TMR0IF 0x04
+
+static volatile unsigned long timer0_overflow_count;
+static volatile unsigned long timer0_millis;
+static volatile unsigned char timer0_fract;
+
+// Peripheral interrupt handler of the USART, null until Serial_begin(), so
+// sketches without Serial do not link it
+void (*arduino_serial_isr)(void);
+
+// Interrupt handler of the sketch (attachISR()), called after the core's
+static void (*user_isr)(void);
+
+void __interrupt() arduino_isr(void)
+{
+    if ((INTCON & (INTCON_TMR0IE | INTCON_TMR0IF)) == (INTCON_TMR0IE | INTCON_TMR0IF)) {
+        unsigned long m = timer0_millis;
+        unsigned char f = timer0_fract;
+
+        INTCON &= (unsigned char)~INTCON_TMR0IF;
+        m += MILLIS_INC;
+        f += FRACT_INC;
+        if (f >= FRACT_MAX) {
+            f -= FRACT_MAX;
+            m++;
+        }
+        timer0_fract = f;
+        timer0_millis = m;
+        timer0_overflow_count++;
+    }
+    if (arduino_serial_isr) {
+        arduino_serial_isr();
+    }
+    if (user_isr) {
+        user_isr();
+    }
+}
+
+void attachISR(void (*isr)(void))
+{
+    unsigned char gie = INTCON & INTCON_GIE;
+
+    // A pointer wider than a byte must not be read half written
+    INTCON &= (unsigned char)~INTCON_GIE;
+    user_isr = isr;
+    INTCON |= gie;
+}
+
+unsigned long millis(void)
+{
+    unsigned long m;
+    unsigned char gie = INTCON & INTCON_GIE;
+
+    INTCON &= (unsigned char)~INTCON_GIE;
+    m = timer0_millis;
+    INTCON |= gie;
+    return m;
+}
+
+unsigned long micros(void)
+{
+    unsigned long m;
+    unsigned char t;
+    unsigned char gie = INTCON & INTCON_GIE;
+
+    INTCON &= (unsigned char)~INTCON_GIE;
+    m = timer0_overflow_count;
+    t = TMR0;
+    // Overflow not serviced yet
+    if ((INTCON & INTCON_TMR0IF) && t < 255) {
+        m++;
+    }
+    INTCON |= gie;
+    return m * MICROSECONDS_PER_TIMER0_OVERFLOW
+        + ((unsigned long)t * MICROSECONDS_PER_TIMER0_OVERFLOW) / 256UL;
+}
+
+void delay(unsigned long ms)
+{
+    while (ms--) {
+        __delay_ms(1);
+    }
+}
+
+// At least us microseconds: the loop adds a few cycles per pass
+void delayMicroseconds(unsigned int us)
+{
+    while (us--) {
+        __delay_us(1);
+    }
+}
+
+void init(void)
+{
+    // Every pin digital
+#ifdef ANSEL
+    ANSEL = 0;
+#endif
+#ifdef ANSELH
+    ANSELH = 0;
+#endif
+#ifdef ANSELA
+    ANSELA = 0;
+#endif
+#ifdef ANSELB
+    ANSELB = 0;
+#endif
+#ifdef ANSELC
+    ANSELC = 0;
+#endif
+#ifdef ANSELD
+    ANSELD = 0;
+#endif
+#ifdef ANSELE
+    ANSELE = 0;
+#endif
+#if defined(ADCON1) && !defined(ANSEL) && !defined(ANSELA)
+    ADCON1 = 0x06; // PCFG: all port pins digital (16F87x, 16F7x)
+#endif
+#ifdef CMCON
+    CMCON = 0x07; // comparators off
+#endif
+
+    // Timer0 on the instruction clock, prescaler 1:16
+    OPTION_REG = (OPTION_REG & 0xC0) | 0x03;
+    TMR0 = 0;
+    INTCON = (INTCON & (unsigned char)~INTCON_TMR0IF) | INTCON_TMR0IE | INTCON_GIE;
+}
@@ -0,0 +1,158 @@
+// Digital I/O of the Arduino core
+#include "Arduino.h"
+
+#define PORT_COUNT 5
+
+// Variable shifts are loops on PIC16: masks come from tables
+static const unsigned char bit_masks[8] = {
+    0x01, 0x02, 0x04, 0x08, 0x10, 0x20, 0x40, 0x80
+};
+static const unsigned char port_masks[PORT_COUNT] = ARDUINO_PORT_MASKS;
+
+// PORT, TRIS and output latch of each port (A = 0), null when absent.
+// Parts without LAT registers write PORT directly.
+static volatile unsigned char * const port_registers[PORT_COUNT] = {
+#ifdef PORTA
+    &PORTA,
+#else
+    0,
+#endif
+#ifdef PORTB
+    &PORTB,
+#else
+    0,
+#endif
+#ifdef PORTC
+    &PORTC,
+#else
+    0,
+#endif
+#ifdef PORTD
+    &PORTD,
+#else
+    0,
+#endif
+#ifdef PORTE
+    &PORTE,
+#else
+    0,
+#endif
+};
+
+static volatile unsigned char * const tris_registers[PORT_COUNT] = {
+#ifdef TRISA
+    &TRISA,
+#else
+    0,
+#endif
+#ifdef TRISB
+    &TRISB,
+#else
+    0,
+#endif
+#ifdef TRISC
+    &TRISC,
+#else
+    0,
+#endif
+#ifdef TRISD
+    &TRISD,
+#else
+    0,
+#endif
+#ifdef TRISE
+    &TRISE,
+#else
+    0,
+#endif
+};
+
+static volatile unsigned char * const latch_registers[PORT_COUNT] = {
+#if defined(LATA)
+    &LATA,
+#elif defined(PORTA)
+    &PORTA,
+#else
+    0,
+#endif
+#if defined(LATB)
+    &LATB,
+#elif defined(PORTB)
+    &PORTB,
+#else
+    0,
+#endif
+#if defined(LATC)
+    &LATC,
+#elif defined(PORTC)
+    &PORTC,
+#else
+    0,
+#endif
+#if defined(LATD)
+    &LATD,
+#elif defined(PORTD)
+    &PORTD,
+#else
+    0,
+#endif
+#if defined(LATE)
+    &LATE,
+#elif defined(PORTE)
+    &PORTE,
+#else
+    0,
+#endif
+};
+
+void pinMode(unsigned char pin, unsigned char mode)
+{
+    unsigned char port = PIN_PORT(pin);
+    unsigned char mask = bit_masks[PIN_BIT(pin)];
+
+    if (port >= PORT_COUNT || !(port_masks[port] & mask) || !tris_registers[port]) {
+        return;
+    }
+    if (mode == OUTPUT) {
+        *tris_registers[port] &= (unsigned char)~mask;
+        return;
+    }
+    *tris_registers[port] |= mask;
+    if (mode == INPUT_PULLUP && port == 1) {
+        // Weak pull-ups exist on PORTB only
+#ifdef WPUB
+        WPUB |= mask;
+#endif
+#if defined(_OPTION_REG_nWPUEN_POSN)
+        OPTION_REGbits.nWPUEN = 0;
+#elif defined(_OPTION_REG_nRBPU_POSN)
+        OPTION_REGbits.nRBPU = 0;
+#endif
+    }
+}
+
+void digitalWrite(unsigned char pin, unsigned char value)
+{
+    unsigned char port = PIN_PORT(pin);
+    unsigned char mask = bit_masks[PIN_BIT(pin)];
+
+    if (port >= PORT_COUNT || !(port_masks[port] & mask) || !latch_registers[port]) {
+        return;
+    }
+    if (value) {
+        *latch_registers[port] |= mask;
+    } else {
+        *latch_registers[port] &= (unsigned char)~mask;
+    }
+}
+
+unsigned char digitalRead(unsigned char pin)
+{
+    unsigned char port = PIN_PORT(pin);
+    unsigned char mask = bit_masks[PIN_BIT(pin)];
+
+    if (port >= PORT_COUNT || !(port_masks[port] & mask) || !port_registers[port]) {
+        return LOW;
+    }
+    return (*port_registers[port] & mask) ? HIGH : LOW;
+}
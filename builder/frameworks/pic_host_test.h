@@ -0,0 +1,31 @@
+// Minimal assertions for PIC host unit tests (pio run -t hosttest)
+// A test is a C program: main() returns 0 when every assertion passed
+#ifndef PIC_HOST_TEST_H
+#define PIC_HOST_TEST_H
+
+#include <stdio.h>
+
+static int pic_test_failures;
+
+#define PIC_TEST_ASSERT(expr)                                              \
+    do {                                                                   \
+        if (!(expr)) {                                                     \
+            printf("%s:%d: FAIL: %s\n", __FILE__, __LINE__, #expr);        \
+            pic_test_failures++;                                           \
+        }                                                                  \
+    } while (0)
+
+#define PIC_TEST_ASSERT_EQUAL(expected, actual)                            \
+    do {                                                                   \
+        long pic_test_e = (long)(expected), pic_test_a = (long)(actual);   \
+        if (pic_test_e != pic_test_a) {                                    \
+            printf("%s:%d: FAIL: %s == %s (expected %ld, got %ld)\n",      \
+                   __FILE__, __LINE__, #expected, #actual, pic_test_e,     \
+                   pic_test_a);                                            \
+            pic_test_failures++;                                           \
+        }                                                                  \
+    } while (0)
+
+#define PIC_TEST_RESULT() (pic_test_failures ? 1 : 0)
+
+#endif // PIC_HOST_TEST_H
@@ -0,0 +1,67 @@
+// Frame output of the tokenized logs: start byte, token, arguments (LSB
+// first). Added to the build by the logs stage when PIC_LOG() is used.
+#include <xc.h>
+#include "pic_log.h"
+
+// Keep in sync with builder/core/tokenized_log.py
+#define PIC_LOG_FRAME_START 0x1E
+#define PIC_LOG_STRING_LIMIT 32
+
+#if defined(PIC_LOG_PUTC)
+// custom_log_output = <function>
+void PIC_LOG_PUTC(unsigned char c);
+#define log_putc PIC_LOG_PUTC
+#elif defined(PIC_LOG_OUTPUT_SERIAL)
+// custom_log_output = serial: the Arduino core's buffered Serial
+#include "HardwareSerial.h"
+static void log_putc(unsigned char c)
+{
+    while (!Serial_write(c)) {
+    }
+}
+#elif defined(TXREG)
+// custom_log_output = uart: the USART, set up by the application
+static void log_putc(unsigned char c)
+{
+    while (!(PIR1 & 0x10)) { // TXIF: TXREG empty
+    }
+    TXREG = c;
+}
+#else
+#error "No USART on this part: set custom_log_output to an output function"
+#endif
+
+void pic_log_begin(unsigned int token)
+{
+    log_putc(PIC_LOG_FRAME_START);
+    log_putc((unsigned char)token);
+    log_putc((unsigned char)(token >> 8));
+}
+
+void pic_log_u8(unsigned char value)
+{
+    log_putc(value);
+}
+
+void pic_log_u16(unsigned int value)
+{
+    log_putc((unsigned char)value);
+    log_putc((unsigned char)(value >> 8));
+}
+
+void pic_log_u32(unsigned long value)
+{
+    pic_log_u16((unsigned int)value);
+    pic_log_u16((unsigned int)(value >> 16));
+}
+
+void pic_log_str(const char *s)
+{
+    unsigned char n = 0;
+
+    while (*s && n < PIC_LOG_STRING_LIMIT) {
+        log_putc((unsigned char)*s++);
+        n++;
+    }
+    log_putc(0);
+}
@@ -0,0 +1,23 @@
+// Tokenized logging: PIC_LOG("adc=%u", value)
+// The build replaces every call in the C sources with a frame carrying a
+// token and the binary arguments; the format strings stay in
+// $BUILD_DIR/pic_log.json for the pic_log monitor filter. Integer (%d %u %x
+// %c, with h/hh/l) and string (%s) conversions only. Calls block while the
+// output is busy: do not log from the interrupt function.
+#ifndef PIC_LOG_H
+#define PIC_LOG_H
+
+#ifdef PIC_LOG_DISABLED
+#define PIC_LOG(...) ((void)0)
+#else
+// Never linked: a call left here (in a header...) was not tokenized
+void PIC_LOG(const char *format, ...);
+#endif
+
+void pic_log_begin(unsigned int token);
+void pic_log_u8(unsigned char value);
+void pic_log_u16(unsigned int value);
+void pic_log_u32(unsigned long value);
+void pic_log_str(const char *s);
+
+#endif // PIC_LOG_H
@@ -3,7 +3,7 @@
 #ifndef PIC_UNIVERSAL_STUBS_H
 #define PIC_UNIVERSAL_STUBS_H
 
-#ifdef __clang__
+#if defined(__clang__) || defined(PIC_HOST_TEST)
     // Universal transpilation stubs for ALL PICs in Microchip DFP
     #pragma clang diagnostic push
     #pragma clang diagnostic ignored "-Wunknown-pragmas"
@@ -11,10 +11,14 @@
     #pragma clang diagnostic ignored "-Wimplicit-function-declaration"
     #pragma clang diagnostic ignored "-Wignored-attributes"
     
-    // Basic types
+    // Basic types (PIC sizes for libclang, the host's own for host tests)
+#ifdef PIC_HOST_TEST
+    #include <stdint.h>
+#else
     typedef unsigned char uint8_t;
     typedef unsigned int uint16_t;
     typedef unsigned long uint32_t;
+#endif
     
     // Core CPU registers (common to all PICs)
     typedef struct { unsigned W : 8; } wreg_bits_t;
@@ -213,10 +217,14 @@
     extern volatile uint8_t ADRESL;
     
     // Delay functions for transpilation
+    #ifndef __delay_ms
     #define __delay_ms(x) do { /* XC8 provides real implementation */ } while(0)
+    #endif
+    #ifndef __delay_us
     #define __delay_us(x) do { /* XC8 provides real implementation */ } while(0)
+    #endif
     
     #pragma clang diagnostic pop
-#endif // __clang__
+#endif // __clang__ || PIC_HOST_TEST
 
 #endif // PIC_UNIVERSAL_STUBS_H
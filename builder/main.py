@@ -9,6 +9,7 @@ All build logic is delegated to the framework-specific builders.
 """
 
 import sys
+import time
 from os.path import join
 from pathlib import Path
 from SCons.Script import ARGUMENTS, COMMAND_LINE_TARGETS, Default, DefaultEnvironment
@@ -30,6 +31,10 @@ env = DefaultEnvironment()
 platform = env.PioPlatform()
 board = env.BoardConfig()
 
+# Make the shared builder.core package importable from the framework scripts
+if platform.get_dir() not in sys.path:
+    sys.path.insert(0, platform.get_dir())
+
 print("🔧 PIC8bit platform builder initialized")
 print(f"🎯 Target MCU: {board.get('build.mcu', 'pic16f876a').upper()}")
 print(f"⚡ CPU Frequency: {board.get('build.f_cpu', '4000000L')}")
@@ -39,7 +44,9 @@ print("🔨 Build system: SCons + xc8-wrapper")
 env.Replace(
     F_CPU=board.get("build.f_cpu", "4000000L"),
     BOARD_MCU=board.get("build.mcu", "pic16f876a").upper(),
-    OPTIMIZATION_LEVEL=int(ARGUMENTS.get("optimization_level", "2")),
+    OPTIMIZATION_LEVEL=ARGUMENTS.get(
+        "optimization_level", env.GetProjectOption("custom_optimization_level", "2")
+    ),
 )
 
 # Add board-specific defines
@@ -48,8 +55,89 @@ env.Append(CPPDEFINES=["$BOARD_MCU"])
 # Note: _XTAL_FREQ is handled by the framework, not here
 
 
-def upload_via_ipecmd(target, source, env):
-    """Upload firmware via IPECMD wrapper"""
+# IPECMD memory regions (-M<region>) of the partial upload targets
+UPLOAD_REGIONS = {"eeprom": "E", "config": "C"}
+
+
+def _patch_upload_firmware(hex_path, region=None):
+    """Write the custom_hex_patches values into a copy of the firmware
+
+    Args:
+        hex_path: Firmware to program
+        region: Memory programmed alone (``eeprom``...), None for all
+
+    Returns:
+        (HEX file to program, patches, their values)
+    """
+    from builder.core import normalize_device, parse_hex_patches, write_patched_firmware
+    from builder.core.hex_patch import PATCHED_HEX_NAME
+    from builder.core.toolchain import BASELINE_DEVICES
+
+    patches = parse_hex_patches(env.GetProjectOption("custom_hex_patches", ""))
+    if region is not None:
+        patches = [patch for patch in patches if patch.space == region]
+    if not patches:
+        return hex_path, [], {}
+    values = write_patched_firmware(
+        Path(hex_path),
+        patches,
+        _memory_regions(),
+        Path(env.subst("$PROJECT_DIR")),
+        baseline=normalize_device(board.get("build.mcu", "")) in BASELINE_DEVICES,
+    )
+    for patch in patches:
+        value = values[patch.name]
+        print(
+            f"🏷️  {patch.name} = {value} (0x{value:X}) "
+            f"at {patch.space}:0x{patch.address:04X}"
+        )
+    return str(Path(hex_path).with_name(PATCHED_HEX_NAME)), patches, values
+
+
+def _memory_regions():
+    """Memories of the board, defaults of build.mcu where upload.info is silent"""
+    from builder.core import find_xc8_toolchain, memory_regions
+
+    return memory_regions(
+        board.get("upload", {}),
+        board.get("build.mcu", "pic16f876a"),
+        find_xc8_toolchain(env.GetProjectOption("custom_xc8_path", None)),
+    )
+
+
+def _region_firmware(hex_path, region):
+    """Write the words of one memory region of the firmware to its own HEX file
+
+    Returns:
+        Path of ``firmware.<region>.hex``, or None if the board or the
+        firmware has nothing in that region
+    """
+    from builder.core import HexImage
+
+    regions = _memory_regions()
+    if region not in regions:
+        print(
+            f"❌ {board.get('name', '')} has no {region} "
+            "(EEPROM sizes come from upload.info or the XC8 processor header)"
+        )
+        return None
+    start, count = regions[region]
+    image = HexImage.load(hex_path).region(start, count)
+    if not image.data:
+        print(f"❌ {Path(hex_path).name} has no {region} data (words 0x{start:04X}+)")
+        return None
+    path = Path(env.subst("$BUILD_DIR")) / f"firmware.{region}.hex"
+    image.write(path)
+    print(f"📦 {region}: {image.used_words(start, count)} words from 0x{start:04X}")
+    return str(path)
+
+
+def upload_via_ipecmd(target, source, env, region=None):
+    """Upload firmware via IPECMD wrapper
+
+    With ``region`` (a key of UPLOAD_REGIONS) only that memory is
+    programmed, without erasing the rest of the part.
+    """
     print("📦 Starting upload via IPECMD...")
 
     try:
@@ -67,9 +155,11 @@ def upload_via_ipecmd(target, source, env):
                 self.tool = self._get_upload_option("tool", None)
                 self.file = str(source[0]) if source else None
                 self.power = self._get_upload_option("power", None)
-                self.memory = ""
+                self.memory = UPLOAD_REGIONS.get(region, "")
                 self.verify = ""
-                self.erase = self._get_upload_option("erase", True, is_boolean=True)
+                self.erase = region is None and self._get_upload_option(
+                    "erase", True, is_boolean=True
+                )
                 self.logout = True
                 self.vdd_first = False
                 self.test_programmer = False
@@ -128,10 +218,29 @@ def upload_via_ipecmd(target, source, env):
             print("❌ No HEX file to upload")
             return 1
 
+        # Per-unit serial numbers and calibration values, no relink
+        from builder.core import HexPatchError, advance_counters
+
+        try:
+            args.file, patches, values = _patch_upload_firmware(args.file, region)
+        except HexPatchError as e:
+            print(f"❌ custom_hex_patches: {e}")
+            return 1
+        if region is not None:
+            args.file = _region_firmware(args.file, region)
+            if args.file is None:
+                return 1
+
         print(f"📦 Uploading {args.file} to {args.part} via {args.tool}")
 
         # Call the main programming function
-        program_pic(args)
+        status = program_pic(args)
+        # Failures are raised or returned (False, non-zero exit code): the
+        # serial numbers are only used up by a programmed part
+        if status is False or (type(status) is int and status != 0):
+            print(f"❌ Upload failed: IPECMD returned {status}")
+            return 1
+        advance_counters(patches, values, Path(env.subst("$PROJECT_DIR")))
 
         print("✅ Upload completed successfully!")
         return 0
@@ -149,6 +258,358 @@ def upload_via_ipecmd(target, source, env):
         return 1
 
 
+def upload_eeprom_via_ipecmd(target, source, env):
+    """Program only the data EEPROM of the firmware"""
+    return upload_via_ipecmd(target, source, env, region="eeprom")
+
+
+def upload_config_via_ipecmd(target, source, env):
+    """Program only the configuration words of the firmware"""
+    return upload_via_ipecmd(target, source, env, region="config")
+
+
+def _device_registers():
+    """SFR layout of build.mcu (empty without XC8 or a cached layout)"""
+    from builder.core import find_xc8_toolchain, load_device_registers
+
+    return load_device_registers(
+        board.get("build.mcu", "pic16f876a"),
+        find_xc8_toolchain(env.GetProjectOption("custom_xc8_path", None)),
+    )
+
+
+def _load_simulated_firmware(hex_path, registers=None):
+    """Load a HEX file into a simulated core sized from the board manifest"""
+    from builder.sim import load_firmware
+
+    return load_firmware(
+        hex_path,
+        board.get("build.mcu", "pic16f876a"),
+        int(board.get("upload.maximum_size", 8192)),
+        int(board.get("upload.maximum_ram_size", 368)),
+        int(board.get("upload.info", {}).get("EepromSize", 0)),
+        registers=registers,
+    )
+
+
+def _report_coverage(coverage, build_dir):
+    """Print coverage and write it in lcov format next to the firmware"""
+    from builder.core import XC8Outputs
+
+    outputs = XC8Outputs(build_dir / "output")
+    for line in coverage.summary(outputs):
+        print(f"[SIM] Coverage: {line}")
+    if not outputs.listing():
+        print("[SIM] ⚠️  No XC8 listing (firmware.lst) - no line coverage")
+        return
+
+    src_dir = Path(env.subst("$PROJECT_SRC_DIR"))
+
+    def resolve(name):
+        # The listing names sources as they were passed to xc8-cc
+        path = Path(name)
+        if not path.is_absolute() and (src_dir / path.name).exists():
+            return str(src_dir / path.name)
+        return name
+
+    info = build_dir / "coverage.info"
+    coverage.write_lcov(info, outputs, env.subst("$PIOENV"), resolve)
+    print(f"[SIM] Coverage written to {info}")
+
+
+def simulate_firmware(target, source, env):
+    """Run the firmware on the PIC16 instruction-set simulator"""
+    from builder.sim import (
+        STOP_BUDGET,
+        Coverage,
+        DeviceLayout,
+        SimulationError,
+        VcdRecorder,
+        VcdWriter,
+        apply_inputs,
+        check_expectations,
+        check_pin_periods,
+        parse_expectations,
+        parse_pin_periods,
+        parse_trace_signals,
+    )
+
+    mcu = board.get("build.mcu", "pic16f876a")
+    hex_path = str(source[0]) if source else None
+    if not hex_path or not Path(hex_path).exists():
+        print("❌ No HEX file to simulate")
+        return 1
+
+    max_cycles = int(env.GetProjectOption("custom_sim_cycles", "1000000"))
+    require_stop = str(env.GetProjectOption("custom_sim_require_stop", "no"))
+    expect = env.GetProjectOption("custom_sim_expect", "")
+    pin_periods = env.GetProjectOption("custom_sim_pin_period", "")
+    uart_input = env.GetProjectOption("custom_sim_uart_input", "")
+    trace = env.GetProjectOption("custom_sim_vcd", "")
+    collect_coverage = str(env.GetProjectOption("custom_sim_coverage", "no"))
+    f_cpu = int(str(board.get("build.f_cpu", "4000000")).rstrip("Ll"))
+
+    try:
+        # Peripheral models and expectations use the SFR layout of the device
+        registers = _device_registers()
+        core = _load_simulated_firmware(hex_path, registers)
+        apply_inputs(
+            core,
+            f_cpu,
+            pins=env.GetProjectOption("custom_sim_pins", ""),
+            adc=env.GetProjectOption("custom_sim_adc", ""),
+        )
+        if uart_input:
+            if "usart" not in core.peripherals:
+                raise ValueError(
+                    f"{mcu.upper()} has no USART model for custom_sim_uart_input"
+                )
+            # Escapes such as \r\n are allowed in platformio.ini
+            core.peripherals["usart"].feed(
+                uart_input.encode("latin-1").decode("unicode_escape").encode("latin-1")
+            )
+        expectations = parse_expectations(expect, registers)
+        periods = parse_pin_periods(pin_periods)
+        recorder = None
+        if trace:
+            pins, traced, trace_w = parse_trace_signals(trace, DeviceLayout(registers))
+            limit = env.GetProjectOption("custom_sim_vcd_limit", "")
+            writer = VcdWriter(
+                Path(env.subst("$BUILD_DIR")) / "simulation.vcd",
+                4e9 / f_cpu,
+                limit=int(limit) if limit else None,
+            )
+            recorder = VcdRecorder(core, writer, pins, traced, trace_w, mcu.upper())
+        coverage = None
+        if collect_coverage.lower() in ("yes", "true", "1", "on"):
+            coverage = Coverage(core)
+    except (SimulationError, ValueError, OSError) as e:
+        print(f"[SIM] ❌ {e}")
+        return 1
+
+    print(
+        f"[SIM] Simulating {Path(hex_path).name} on {mcu.upper()} "
+        f"({len(core.program)} words, budget {max_cycles} cycles)"
+    )
+    started = time.perf_counter()
+    reason = core.run(max_cycles)
+    elapsed = time.perf_counter() - started
+    if recorder is not None:
+        recorder.close()
+        writer = recorder.writer
+        truncated = ", truncated" if writer.truncated else ""
+        print(
+            f"[SIM] VCD trace: {writer.path} ({len(writer.signals)} signals, "
+            f"{writer.changes} changes{truncated})"
+        )
+
+    print(f"[SIM] Peripherals: {', '.join(core.peripherals) or 'none'}")
+    print(f"[SIM] Stopped: {reason} at PC=0x{core.pc:04X}, W=0x{core.w:02X}")
+    print(
+        f"[SIM] {core.instructions} instructions, {core.cycles} cycles "
+        f"({core.cycles * 4 / f_cpu * 1000:.3f} ms device time)"
+    )
+    if elapsed > 0:
+        print(
+            f"[SIM] {elapsed:.3f} s host time, "
+            f"{core.instructions / elapsed / 1e6:.2f} MIPS"
+        )
+
+    if coverage is not None:
+        _report_coverage(coverage, Path(env.subst("$BUILD_DIR")))
+
+    usart = core.peripherals.get("usart")
+    if usart is not None and usart.output:
+        print(f"[SIM] UART output ({len(usart.output)} bytes):")
+        for line in usart.output.decode("latin-1").splitlines():
+            print(f"[SIM]   {line}")
+
+    failures = check_expectations(core, expectations)
+    timing = check_pin_periods(core, periods, f_cpu)
+    for message in timing["ok"]:
+        print(f"[SIM] ✅ {message}")
+    failures += timing["failed"]
+    for failure in failures:
+        print(f"[SIM] ❌ {failure}")
+    if reason == STOP_BUDGET and require_stop.lower() in ("yes", "true", "1", "on"):
+        print("[SIM] ❌ Firmware did not stop within the cycle budget")
+        return 1
+    if failures:
+        return 1
+    if expectations:
+        print(f"[SIM] ✅ {len(expectations)} expectations met")
+    return 0
+
+
+def profile_firmware(target, source, env):
+    """Profile the cycles of the firmware on the instruction-set simulator"""
+    from builder.core import XC8Outputs
+    from builder.sim import Profiler, SimulationError, find_loop_head
+
+    hex_path = str(source[0]) if source else None
+    if not hex_path or not Path(hex_path).exists():
+        print("❌ No HEX file to profile")
+        return 1
+
+    max_cycles = int(env.GetProjectOption("custom_sim_cycles", "1000000"))
+    build_dir = Path(env.subst("$BUILD_DIR"))
+    outputs = XC8Outputs(build_dir / "output")
+    if not outputs.available():
+        print("[PROFILE] ⚠️  No XC8 .sym/.map/.lst outputs - cycles per address only")
+
+    try:
+        core = _load_simulated_firmware(hex_path, _device_registers())
+    except (SimulationError, OSError) as e:
+        print(f"[PROFILE] ❌ {e}")
+        return 1
+
+    loop_option = env.GetProjectOption("custom_sim_loop", "")
+    if loop_option:
+        symbol = outputs.symbol(loop_option) or outputs.symbol(f"_{loop_option}")
+        loop_address = symbol.address if symbol else int(loop_option, 0)
+    else:
+        loop_address = find_loop_head(core, outputs)
+
+    profiler = Profiler(core, outputs, loop_address)
+    reason = core.run(max_cycles)
+
+    f_cpu = int(str(board.get("build.f_cpu", "4000000")).rstrip("Ll"))
+    report = profiler.report(f_cpu)
+    report_path = build_dir / "profile.txt"
+    folded_path = build_dir / "profile.folded"
+    report_path.write_text(report)
+    profiler.write_folded(folded_path)
+
+    print(f"[PROFILE] Stopped: {reason}")
+    for line in report.splitlines():
+        print(f"[PROFILE] {line}")
+    print(f"[PROFILE] Report: {report_path}")
+    print(f"[PROFILE] Flamegraph stacks: {folded_path} (flamegraph.pl, speedscope)")
+    return 0
+
+
+def _size_history():
+    from builder.core.size_report import HISTORY_NAME, SizeHistory
+
+    return SizeHistory(Path(env.subst("$PROJECT_WORKSPACE_DIR")) / HISTORY_NAME)
+
+
+def size_diff(target, source, env):
+    """Compare the size report of the last build with a baseline
+
+    ``custom_size_baseline`` is a report file or a git commit recorded in
+    the size history; by default the report of the previous build is used.
+    """
+    import json
+
+    from builder.core import diff_size_reports
+    from builder.core.size_report import PREVIOUS_REPORT_NAME, REPORT_NAME
+
+    build_dir = Path(env.subst("$BUILD_DIR"))
+    current_path = build_dir / REPORT_NAME
+    if not current_path.exists():
+        print(f"[SIZE] ❌ No size report in {build_dir} - build the project first")
+        return 1
+    current = json.loads(current_path.read_text())
+
+    baseline = env.GetProjectOption("custom_size_baseline", "")
+    if not baseline:
+        baseline_path = build_dir / PREVIOUS_REPORT_NAME
+        if not baseline_path.exists():
+            print("[SIZE] ⚠️  No previous build to compare with")
+            return 0
+        old = json.loads(baseline_path.read_text())
+    elif Path(baseline).is_file():
+        old = json.loads(Path(baseline).read_text())
+    else:
+        history = _size_history()
+        try:
+            old = history.report(env.subst("$PIOENV"), baseline)
+        finally:
+            history.close()
+        if old is None:
+            print(f"[SIZE] ❌ No report for '{baseline}' in the size history")
+            return 1
+
+    print(f"[SIZE] Baseline: {baseline or PREVIOUS_REPORT_NAME}")
+    for line in diff_size_reports(old, current):
+        print(f"[SIZE] {line}")
+    return 0
+
+
+def size_history(target, source, env):
+    """Print the flash and RAM use of the recorded builds"""
+    history = _size_history()
+    try:
+        entries = history.entries(env.subst("$PIOENV"), 30)
+    finally:
+        history.close()
+    if not entries:
+        print("[SIZE] No builds recorded yet")
+        return 0
+
+    previous = None
+    for revision, created, flash, ram in entries:
+        change = f"{flash - previous:+d}" if previous is not None else ""
+        stamp = time.strftime("%Y-%m-%d %H:%M", time.localtime(created))
+        print(
+            f"[SIZE] {stamp}  {revision or '-':<10} flash {flash:>6} {change:>6}"
+            f"  RAM {ram:>5}"
+        )
+        previous = flash
+    return 0
+
+
+def find_boards(target, source, env):
+    """List the boards the built firmware fits on, most headroom first"""
+    from builder.core import (
+        FirmwareUsage,
+        find_fitting_boards,
+        load_board_index,
+        platform_cache_dir,
+    )
+    from builder.core.size_report import REPORT_NAME
+
+    build_dir = Path(env.subst("$BUILD_DIR"))
+    if not (build_dir / REPORT_NAME).exists():
+        print("[FIT] ❌ No size report - build with custom_size_report enabled")
+        return 1
+
+    registers = {register.name for register in _device_registers()}
+    usage = FirmwareUsage.from_build(build_dir, registers)
+    index = load_board_index(platform_cache_dir(env.subst("$PROJECT_CORE_DIR")))
+    fits, rejected = find_fitting_boards(index, usage)
+
+    needs = f"{usage.flash} words, {usage.ram} bytes RAM"
+    if usage.eeprom:
+        needs += f", {usage.eeprom} bytes EEPROM"
+    if usage.stack:
+        needs += f", {usage.stack} stack levels"
+    if usage.sfrs is not None:
+        needs += f", {len(usage.sfrs)} SFRs"
+    print(f"[FIT] Firmware needs {needs}")
+
+    limit = int(env.GetProjectOption("custom_fit_limit", "20"))
+    for fit in fits[:limit]:
+        print(f"[FIT] {fit.line(usage)}")
+    if len(fits) > limit:
+        print(f"[FIT] ... {len(fits) - limit} more boards fit")
+    print(f"[FIT] {len(fits)} boards fit, {len(rejected)} too small or missing SFRs")
+    return 0
+
+
+def host_test_firmware(target, source, env):
+    """Build and run the project unit tests natively on the host"""
+    from builder.core import BuildContext, FrameworkConfig, run_host_tests
+    from builder.core.sources import discover_sources
+
+    ctx = BuildContext(
+        env, FrameworkConfig("host tests", "HOSTTEST", allow_assembly=False)
+    )
+    discover_sources(ctx)
+    return 0 if run_host_tests(ctx) else 1
+
+
 # Load the selected framework
 framework = env.get("PIOFRAMEWORK")
 if framework:
@@ -167,3 +628,50 @@ if "upload" in COMMAND_LINE_TARGETS:
     firmware_hex = "$BUILD_DIR/firmware.hex"
     upload_target = env.Alias("upload", firmware_hex, upload_via_ipecmd)
     env.AlwaysBuild(upload_target)
+
+# Program only the data EEPROM or the configuration words, flash untouched
+if "upload-eeprom" in COMMAND_LINE_TARGETS:
+    firmware_hex = "$BUILD_DIR/firmware.hex"
+    upload_eeprom_target = env.Alias(
+        "upload-eeprom", firmware_hex, upload_eeprom_via_ipecmd
+    )
+    env.AlwaysBuild(upload_eeprom_target)
+
+if "upload-config" in COMMAND_LINE_TARGETS:
+    firmware_hex = "$BUILD_DIR/firmware.hex"
+    upload_config_target = env.Alias(
+        "upload-config", firmware_hex, upload_config_via_ipecmd
+    )
+    env.AlwaysBuild(upload_config_target)
+
+# Run the firmware on the instruction-set simulator
+if "simulate" in COMMAND_LINE_TARGETS:
+    firmware_hex = "$BUILD_DIR/firmware.hex"
+    simulate_target = env.Alias("simulate", firmware_hex, simulate_firmware)
+    env.AlwaysBuild(simulate_target)
+
+# Profile the firmware cycles on the instruction-set simulator
+if "profile" in COMMAND_LINE_TARGETS:
+    firmware_hex = "$BUILD_DIR/firmware.hex"
+    profile_target = env.Alias("profile", firmware_hex, profile_firmware)
+    env.AlwaysBuild(profile_target)
+
+# Compare or list the size reports written by the build
+if "size-diff" in COMMAND_LINE_TARGETS:
+    size_diff_target = env.Alias("size-diff", [], size_diff)
+    env.AlwaysBuild(size_diff_target)
+
+if "size-history" in COMMAND_LINE_TARGETS:
+    size_history_target = env.Alias("size-history", [], size_history)
+    env.AlwaysBuild(size_history_target)
+
+# Search the board catalogue for parts the firmware fits on
+if "fit" in COMMAND_LINE_TARGETS:
+    firmware_hex = "$BUILD_DIR/firmware.hex"
+    fit_target = env.Alias("fit", firmware_hex, find_boards)
+    env.AlwaysBuild(fit_target)
+
+# Unit tests compiled and run on the host, no XC8 build needed
+if "hosttest" in COMMAND_LINE_TARGETS:
+    hosttest_target = env.Alias("hosttest", [], host_test_firmware)
+    env.AlwaysBuild(hosttest_target)
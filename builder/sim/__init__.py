@@ -0,0 +1,67 @@
+"""
+Instruction-set simulation of PIC16 mid-range firmware
+
+⚠️  UNOFFICIAL PLATFORM - NOT SUPPORTED BY MICROCHIP ⚠️
+
+Backs the ``pio run -t simulate`` target: ``firmware.hex`` runs on a Python
+model of the 14-bit core, sized from the board manifest, for a bounded
+number of instruction cycles, with event-driven models of the timers, USART,
+ADC and ports of ``build.mcu``, VCD traces and code coverage. ``BatchCore``
+steps thousands of instances of the same firmware in lockstep for parameter
+sweeps (requires NumPy).
+"""
+
+from .batch import BatchCore
+from .coverage import Coverage
+from .cpu import (
+    STOP_BREAKPOINT,
+    STOP_BUDGET,
+    STOP_HALT,
+    STOP_SLEEP,
+    MidrangeCore,
+    SimulationError,
+)
+from .events import EventQueue
+from .firmware import (
+    BASELINE_DEVICES,
+    apply_inputs,
+    check_expectations,
+    check_pin_periods,
+    is_midrange,
+    load_batch,
+    load_firmware,
+    parse_expectations,
+    parse_pin_periods,
+)
+from .layout import DeviceLayout
+from .peripherals import attach_peripherals
+from .profile import Profiler, find_loop_head
+from .vcd import VcdRecorder, VcdWriter, parse_trace_signals
+
+__all__ = [
+    "apply_inputs",
+    "attach_peripherals",
+    "BASELINE_DEVICES",
+    "BatchCore",
+    "check_expectations",
+    "check_pin_periods",
+    "Coverage",
+    "DeviceLayout",
+    "EventQueue",
+    "find_loop_head",
+    "is_midrange",
+    "load_batch",
+    "load_firmware",
+    "MidrangeCore",
+    "parse_expectations",
+    "parse_pin_periods",
+    "parse_trace_signals",
+    "Profiler",
+    "SimulationError",
+    "STOP_BREAKPOINT",
+    "STOP_BUDGET",
+    "STOP_HALT",
+    "STOP_SLEEP",
+    "VcdRecorder",
+    "VcdWriter",
+]
@@ -0,0 +1,476 @@
+"""
+Lockstep simulation of many PIC16 cores running the same firmware
+
+Every instance has its own register file, W, PC, stack and EEPROM, stored as
+rows of NumPy arrays. Each step fetches the next instruction of all running
+instances, groups them by opcode and executes each group with one vectorized
+operation, so sweeping thousands of inputs costs little more than one run.
+Instances only differ through their inputs: port levels (``set_inputs``),
+EEPROM contents and registers preset before the run. The peripheral models
+and interrupt dispatch of the scalar core are not available in batch mode.
+
+NumPy is optional; it is only needed when a ``BatchCore`` is created.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from ..core.sfr import Register
+from .cpu import (
+    FSR,
+    INDF,
+    INTCON,
+    OPTION_REG,
+    PCL,
+    PCLATH,
+    STACK_DEPTH,
+    STATUS,
+    STOP_BUDGET,
+    STOP_HALT,
+    STOP_SLEEP,
+    MidrangeCore,
+    SimulationError,
+)
+
+RUNNING, HALTED, SLEEPING = 0, 1, 2
+STOP_REASONS = {RUNNING: STOP_BUDGET, HALTED: STOP_HALT, SLEEPING: STOP_SLEEP}
+
+
+def _find_address(registers: List[Register], *names: str) -> Optional[int]:
+    for register in registers:
+        if register.name.upper() in names:
+            return register.address
+    return None
+
+
+class BatchCore:
+    """``count`` copies of a core stepped in lockstep.
+
+    Args:
+        core: Scalar core the program, memory map and reset state come from
+        count: Number of instances
+        registers: Device SFR layout, used to model EEPROM reads and writes
+            through EEDATA/EEADR/EECON1
+    """
+
+    def __init__(
+        self,
+        core: MidrangeCore,
+        count: int,
+        registers: Optional[List[Register]] = None,
+    ):
+        if np is None:
+            raise SimulationError("batch simulation requires NumPy - pip install numpy")
+        if count < 1:
+            raise SimulationError("batch simulation needs at least one instance")
+
+        self.count = count
+        self.pc_mask = core.pc_mask
+        self.address_map = np.array(core.address_map, dtype=np.int32)
+
+        # Decode table shared by all instances: opcode index and operands
+        handlers = []
+        op_id, arg_a, arg_b = [], [], []
+        for handler, a, b in core.decoded:
+            name = handler.__name__
+            if name not in handlers:
+                handlers.append(name)
+            op_id.append(handlers.index(name))
+            arg_a.append(a)
+            arg_b.append(b)
+        self.handlers = [getattr(self, name) for name in handlers]
+        self.op_id = np.array(op_id, dtype=np.int16)
+        self.arg_a = np.array(arg_a, dtype=np.int32)
+        self.arg_b = np.array(arg_b, dtype=np.int32)
+
+        registers = registers or []
+        self.eedata = _find_address(registers, "EEDATA", "EEDAT")
+        self.eeadr = _find_address(registers, "EEADR")
+        self.eecon1 = _find_address(registers, "EECON1")
+
+        self.inputs: Dict[int, "np.ndarray"] = {}
+        self._reset_state = bytes(core.data)
+        self._reset_eeprom = bytes(core.eeprom)
+        self.reset()
+
+    # State
+
+    def reset(self) -> None:
+        """Power-on reset of every instance (inputs are kept)."""
+        n = self.count
+        self.data = np.tile(np.frombuffer(self._reset_state, dtype=np.uint8), (n, 1))
+        self.eeprom = np.tile(np.frombuffer(self._reset_eeprom, dtype=np.uint8), (n, 1))
+        self.w = np.zeros(n, dtype=np.int32)
+        self.pc = np.zeros(n, dtype=np.int32)
+        self.stack = np.zeros((n, STACK_DEPTH), dtype=np.int32)
+        self.sp = np.zeros(n, dtype=np.int32)
+        self.cycles = np.zeros(n, dtype=np.int64)
+        self.instructions = np.zeros(n, dtype=np.int64)
+        self.state = np.full(n, RUNNING, dtype=np.int8)
+
+    def register(self, address: int) -> "np.ndarray":
+        """Return a data memory location of every instance."""
+        return self.data[:, self.address_map[address & 0x1FF]].copy()
+
+    def set_register(self, address: int, values) -> None:
+        """Preset a data memory location (scalar or one value per instance)."""
+        self.data[:, self.address_map[address & 0x1FF]] = np.asarray(values) & 0xFF
+
+    def set_inputs(self, port: int, levels) -> None:
+        """Drive the input pins of a PORT register.
+
+        Reads of the port return ``levels`` on pins configured as inputs
+        (TRIS bit set) and the output latch elsewhere.
+        """
+        levels = np.broadcast_to(np.asarray(levels, dtype=np.uint8), (self.count,))
+        self.inputs[self.address_map[port & 0x1FF]] = levels.copy()
+
+    def set_eeprom(self, contents) -> None:
+        """Load EEPROM contents, one row per instance or one row for all."""
+        contents = np.asarray(contents, dtype=np.uint8)
+        self.eeprom[:, : contents.shape[-1]] = contents
+
+    def stop_reasons(self) -> List[str]:
+        """Return why each instance stopped (``STOP_*``)."""
+        return [STOP_REASONS[state] for state in self.state.tolist()]
+
+    def passed(
+        self, expectations: List[Tuple[str, Optional[int], int]]
+    ) -> "np.ndarray":
+        """Return which instances meet every ``parse_expectations`` entry."""
+        ok = np.ones(self.count, dtype=bool)
+        for _label, address, expected in expectations:
+            actual = self.w if address is None else self.register(address)
+            ok &= actual == expected
+        return ok
+
+    # Data memory access, vectorized over instance indices
+
+    def _address(self, idx, f):
+        status = self.data[idx, STATUS].astype(np.int32)
+        direct = ((status & 0x60) << 2) | f
+        indirect = ((status & 0x80) << 1) | self.data[idx, FSR]
+        return self.address_map[np.where(f == 0, indirect, direct)]
+
+    def _read(self, idx, address):
+        value = self.data[idx, address].astype(np.int32)
+        value[address == INDF] = 0
+        pcl = address == PCL
+        if pcl.any():
+            value[pcl] = self.pc[idx[pcl]] & 0xFF
+        for port, levels in self.inputs.items():
+            sel = address == port
+            if sel.any():
+                j = idx[sel]
+                tris = self.data[j, port | 0x80].astype(np.int32)
+                value[sel] = (levels[j] & tris) | (value[sel] & ~tris & 0xFF)
+        return value
+
+    def _write(self, idx, address, value):
+        value = value & 0xFF
+        status = address == STATUS
+        if status.any():
+            # TO and PD are read-only
+            value = np.where(
+                status, (self.data[idx, STATUS] & 0x18) | (value & 0xE7), value
+            )
+        keep = address != INDF
+        self.data[idx[keep], address[keep]] = value[keep]
+
+        pcl = address == PCL
+        if pcl.any():
+            j = idx[pcl]
+            high = self.data[j, PCLATH].astype(np.int32) << 8
+            self.pc[j] = (high | value[pcl]) & self.pc_mask
+            self.cycles[j] += 1
+        if self.eecon1 is not None:
+            sel = address == self.eecon1
+            if sel.any():
+                self._eeprom_access(idx[sel])
+
+    def _eeprom_access(self, idx):
+        size = self.eeprom.shape[1]
+        control = self.data[idx, self.eecon1]
+        if size and self.eedata is not None and self.eeadr is not None:
+            cell = self.data[idx, self.eeadr].astype(np.int32) % size
+            read = (control & 0x81) == 0x01  # RD, data EEPROM
+            self.data[idx[read], self.eedata] = self.eeprom[idx[read], cell[read]]
+            write = (control & 0x86) == 0x06  # WR and WREN, data EEPROM
+            self.eeprom[idx[write], cell[write]] = self.data[idx[write], self.eedata]
+        self.data[idx, self.eecon1] = control & 0xFC
+
+    def _flags(self, idx, mask: int, bits) -> None:
+        self.data[idx, STATUS] = (self.data[idx, STATUS] & (~mask & 0xFF)) | bits
+
+    def _zero(self, idx, result) -> None:
+        self._flags(idx, 0x04, np.where(result & 0xFF == 0, 0x04, 0))
+
+    def _store(self, idx, address, d, value) -> None:
+        to_file = d != 0
+        if to_file.any():
+            self._write(idx[to_file], address[to_file], value[to_file])
+        to_w = ~to_file
+        self.w[idx[to_w]] = value[to_w] & 0xFF
+
+    def _add(self, idx, a, b):
+        result = a + b
+        self._flags(
+            idx,
+            0x07,
+            np.where(result > 0xFF, 1, 0)
+            | np.where((a & 0x0F) + (b & 0x0F) > 0x0F, 2, 0)
+            | np.where(result & 0xFF == 0, 4, 0),
+        )
+        return result & 0xFF
+
+    def _sub(self, idx, a, b):
+        result = (a - b) & 0xFF
+        self._flags(
+            idx,
+            0x07,
+            np.where(a >= b, 1, 0)
+            | np.where((a & 0x0F) >= (b & 0x0F), 2, 0)
+            | np.where(result == 0, 4, 0),
+        )
+        return result
+
+    def _skip_if(self, idx, condition):
+        j = idx[condition]
+        self.pc[j] = (self.pc[j] + 1) & self.pc_mask
+        return np.where(condition, 2, 1)
+
+    def _push(self, idx, address) -> None:
+        self.stack[idx, self.sp[idx]] = address
+        self.sp[idx] = (self.sp[idx] + 1) % STACK_DEPTH
+
+    def _pop(self, idx):
+        self.sp[idx] = (self.sp[idx] - 1) % STACK_DEPTH
+        return self.stack[idx, self.sp[idx]]
+
+    # Instructions, same names and semantics as MidrangeCore
+
+    def op_nop(self, idx, f, d):
+        return 1
+
+    def op_movwf(self, idx, f, d):
+        self._write(idx, self._address(idx, f), self.w[idx])
+        return 1
+
+    def op_clr(self, idx, f, d):
+        self._store(idx, self._address(idx, f), d, np.zeros(len(idx), dtype=np.int32))
+        self._flags(idx, 0x04, 0x04)
+        return 1
+
+    def op_addwf(self, idx, f, d):
+        address = self._address(idx, f)
+        self._store(
+            idx, address, d, self._add(idx, self._read(idx, address), self.w[idx])
+        )
+        return 1
+
+    def op_subwf(self, idx, f, d):
+        address = self._address(idx, f)
+        self._store(
+            idx, address, d, self._sub(idx, self._read(idx, address), self.w[idx])
+        )
+        return 1
+
+    def _logic(self, idx, f, d, operation):
+        address = self._address(idx, f)
+        result = operation(self._read(idx, address)) & 0xFF
+        self._store(idx, address, d, result)
+        self._zero(idx, result)
+        return 1
+
+    def op_andwf(self, idx, f, d):
+        return self._logic(idx, f, d, lambda value: value & self.w[idx])
+
+    def op_iorwf(self, idx, f, d):
+        return self._logic(idx, f, d, lambda value: value | self.w[idx])
+
+    def op_xorwf(self, idx, f, d):
+        return self._logic(idx, f, d, lambda value: value ^ self.w[idx])
+
+    def op_comf(self, idx, f, d):
+        return self._logic(idx, f, d, lambda value: ~value)
+
+    def op_decf(self, idx, f, d):
+        return self._logic(idx, f, d, lambda value: value - 1)
+
+    def op_incf(self, idx, f, d):
+        return self._logic(idx, f, d, lambda value: value + 1)
+
+    def op_movf(self, idx, f, d):
+        return self._logic(idx, f, d, lambda value: value)
+
+    def op_decfsz(self, idx, f, d):
+        address = self._address(idx, f)
+        result = (self._read(idx, address) - 1) & 0xFF
+        self._store(idx, address, d, result)
+        return self._skip_if(idx, result == 0)
+
+    def op_incfsz(self, idx, f, d):
+        address = self._address(idx, f)
+        result = (self._read(idx, address) + 1) & 0xFF
+        self._store(idx, address, d, result)
+        return self._skip_if(idx, result == 0)
+
+    def op_rlf(self, idx, f, d):
+        address = self._address(idx, f)
+        value = self._read(idx, address)
+        carry = self.data[idx, STATUS] & 1
+        self._store(idx, address, d, (value << 1) | carry)
+        self._flags(idx, 0x01, value >> 7)
+        return 1
+
+    def op_rrf(self, idx, f, d):
+        address = self._address(idx, f)
+        value = self._read(idx, address)
+        carry = (self.data[idx, STATUS].astype(np.int32) & 1) << 7
+        self._store(idx, address, d, (value >> 1) | carry)
+        self._flags(idx, 0x01, value & 1)
+        return 1
+
+    def op_swapf(self, idx, f, d):
+        address = self._address(idx, f)
+        value = self._read(idx, address)
+        self._store(idx, address, d, ((value << 4) | (value >> 4)) & 0xFF)
+        return 1
+
+    def op_bcf(self, idx, f, bit):
+        address = self._address(idx, f)
+        self._write(idx, address, self._read(idx, address) & ~(1 << bit))
+        return 1
+
+    def op_bsf(self, idx, f, bit):
+        address = self._address(idx, f)
+        self._write(idx, address, self._read(idx, address) | (1 << bit))
+        return 1
+
+    def op_btfsc(self, idx, f, bit):
+        value = self._read(idx, self._address(idx, f))
+        return self._skip_if(idx, (value >> bit) & 1 == 0)
+
+    def op_btfss(self, idx, f, bit):
+        value = self._read(idx, self._address(idx, f))
+        return self._skip_if(idx, (value >> bit) & 1 == 1)
+
+    def op_movlw(self, idx, k, _):
+        self.w[idx] = k
+        return 1
+
+    def op_addlw(self, idx, k, _):
+        self.w[idx] = self._add(idx, self.w[idx], k)
+        return 1
+
+    def op_sublw(self, idx, k, _):
+        self.w[idx] = self._sub(idx, k, self.w[idx])
+        return 1
+
+    def op_andlw(self, idx, k, _):
+        self.w[idx] &= k
+        self._zero(idx, self.w[idx])
+        return 1
+
+    def op_iorlw(self, idx, k, _):
+        self.w[idx] |= k
+        self._zero(idx, self.w[idx])
+        return 1
+
+    def op_xorlw(self, idx, k, _):
+        self.w[idx] ^= k
+        self._zero(idx, self.w[idx])
+        return 1
+
+    def op_retlw(self, idx, k, _):
+        self.w[idx] = k
+        self.pc[idx] = self._pop(idx)
+        return 2
+
+    def op_return(self, idx, f, d):
+        self.pc[idx] = self._pop(idx)
+        return 2
+
+    def op_retfie(self, idx, f, d):
+        self.pc[idx] = self._pop(idx)
+        self.data[idx, INTCON] |= 0x80
+        return 2
+
+    def op_call(self, idx, k, _):
+        self._push(idx, self.pc[idx])
+        high = (self.data[idx, PCLATH].astype(np.int32) & 0x18) << 8
+        self.pc[idx] = (high | k) & self.pc_mask
+        return 2
+
+    def op_goto(self, idx, k, here):
+        high = (self.data[idx, PCLATH].astype(np.int32) & 0x18) << 8
+        target = (high | k) & self.pc_mask
+        # 'goto $' with interrupts off: the firmware is done
+        done = (target == here) & (self.data[idx, INTCON] & 0x80 == 0)
+        self.state[idx[done]] = HALTED
+        self.pc[idx] = target
+        return 2
+
+    def op_sleep(self, idx, f, d):
+        self._flags(idx, 0x18, 0x10)  # TO=1, PD=0
+        self.state[idx] = SLEEPING
+        return 1
+
+    def op_clrwdt(self, idx, f, d):
+        self._flags(idx, 0x18, 0x18)
+        return 1
+
+    def op_option(self, idx, f, d):
+        self.data[idx, OPTION_REG] = self.w[idx]
+        return 1
+
+    def op_tris(self, idx, f, d):
+        self.data[idx, 0x80 | f] = self.w[idx]
+        return 1
+
+    # Execution
+
+    def step(self, limit=None) -> int:
+        """Execute one instruction on every running instance.
+
+        Returns:
+            Number of instances that executed an instruction
+        """
+        running = self.state == RUNNING
+        if limit is not None:
+            running &= self.cycles < limit
+        active = np.flatnonzero(running)
+        if not active.size:
+            return 0
+
+        pc = self.pc[active]
+        ops = self.op_id[pc]
+        a, b = self.arg_a[pc], self.arg_b[pc]
+        self.pc[active] = (pc + 1) & self.pc_mask
+
+        order = np.argsort(ops, kind="stable")
+        sorted_ops = ops[order]
+        starts = np.flatnonzero(np.r_[True, sorted_ops[1:] != sorted_ops[:-1]])
+        ends = np.r_[starts[1:], len(order)]
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            sel = order[start:end]
+            idx = active[sel]
+            self.cycles[idx] += self.handlers[sorted_ops[start]](idx, a[sel], b[sel])
+        self.instructions[active] += 1
+        return active.size
+
+    def run(self, max_cycles: int) -> int:
+        """Run every instance until its cycle budget is spent or it stops.
+
+        Returns:
+            Number of lockstep steps taken
+        """
+        limit = self.cycles + max_cycles
+        steps = 0
+        while self.step(limit):
+            steps += 1
+        return steps
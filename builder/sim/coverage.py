@@ -0,0 +1,133 @@
+"""
+Code coverage of simulated firmware
+
+The core marks each executed program address with a single byte store,
+the cheapest operation of the Python run loop (setting a bit would cost a
+third of the simulation speed); nothing is added to the firmware. The map
+packs into a bitmap of one bit per word (1 KB for 8K words) to be stored or
+merged with other runs. After the run it is joined with the line
+information of the XC8 listing: a C line is covered when one of its
+instructions ran, a function when its entry ran. The result is written in
+lcov tracefile format for ``genhtml`` or CI coverage services.
+"""
+
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from ..core.xc8_outputs import XC8Outputs, c_name
+from .cpu import MidrangeCore
+
+
+class Coverage:
+    """Executed addresses of a core.
+
+    Args:
+        core: Core to collect from (its ``coverage`` map is set)
+    """
+
+    def __init__(self, core: MidrangeCore):
+        self.core = core
+        self.executed_map = bytearray(len(core.program))
+        core.coverage = self.executed_map
+
+    def executed(self, address: int) -> bool:
+        return bool(self.executed_map[address])
+
+    def bitmap(self) -> bytes:
+        """Return the executed addresses packed one bit per word."""
+        packed = bytearray((len(self.executed_map) + 7) // 8)
+        for address, executed in enumerate(self.executed_map):
+            if executed:
+                packed[address >> 3] |= 1 << (address & 7)
+        return bytes(packed)
+
+    def merge(self, bitmap: bytes) -> None:
+        """Add the addresses of a bitmap from another run of the same image."""
+        for address in range(min(len(bitmap) * 8, len(self.executed_map))):
+            if bitmap[address >> 3] >> (address & 7) & 1:
+                self.executed_map[address] = 1
+
+    def executed_count(self) -> int:
+        return self.executed_map.count(1)
+
+    def used_words(self) -> int:
+        """Return the number of programmed (non-erased) program words."""
+        return sum(1 for word in self.core.program if word != 0x3FFF)
+
+    def line_hits(self, outputs: XC8Outputs) -> Dict[str, Dict[int, int]]:
+        """Return ``{file: {line: 0 or 1}}`` for every line with code."""
+        lines: Dict[str, Dict[int, int]] = {}
+        for address, (file, line) in outputs.line_table().items():
+            hit = int(address < len(self.core.program) and self.executed(address))
+            per_file = lines.setdefault(file, {})
+            per_file[line] = max(per_file.get(line, 0), hit)
+        return lines
+
+    def function_hits(
+        self, outputs: XC8Outputs
+    ) -> List[Tuple[str, Optional[Tuple[str, int]], int]]:
+        """Return ``(C name, first source line, 0 or 1)`` of every function."""
+        first_line: Dict[str, Tuple[str, int]] = {}
+        for line in outputs.listing():
+            if line.function and line.source:
+                first_line.setdefault(line.function, line.source)
+        return [
+            (c_name(name), first_line.get(name), int(self.executed(address)))
+            for address, name in outputs.functions()
+            if address < len(self.core.program)
+        ]
+
+    def write_lcov(
+        self,
+        path,
+        outputs: XC8Outputs,
+        test_name: str = "",
+        resolve: Optional[Callable[[str], str]] = None,
+    ) -> None:
+        """Write an lcov tracefile.
+
+        Args:
+            path: Output file (``coverage.info``)
+            outputs: XC8 link outputs of the simulated image
+            test_name: ``TN:`` record
+            resolve: Maps listing file names to paths on disk
+        """
+        resolve = resolve or (lambda name: name)
+        functions: Dict[str, List[Tuple[str, int, int]]] = {}
+        for name, source, hit in self.function_hits(outputs):
+            if source:
+                functions.setdefault(source[0], []).append((name, source[1], hit))
+
+        out = []
+        for file, lines in sorted(self.line_hits(outputs).items()):
+            out.append(f"TN:{test_name}")
+            out.append(f"SF:{resolve(file)}")
+            file_functions = functions.get(file, [])
+            for name, line, _ in file_functions:
+                out.append(f"FN:{line},{name}")
+            for name, _, hit in file_functions:
+                out.append(f"FNDA:{hit},{name}")
+            out.append(f"FNF:{len(file_functions)}")
+            out.append(f"FNH:{sum(hit for _, _, hit in file_functions)}")
+            for line, hit in sorted(lines.items()):
+                out.append(f"DA:{line},{hit}")
+            out.append(f"LF:{len(lines)}")
+            out.append(f"LH:{sum(lines.values())}")
+            out.append("end_of_record")
+        Path(path).write_text("\n".join(out) + "\n" if out else "")
+
+    def summary(self, outputs: Optional[XC8Outputs] = None) -> List[str]:
+        """Return one line per coverage measure."""
+
+        def ratio(hit: int, total: int) -> str:
+            return f"{hit}/{total} ({100 * hit / total:.1f}%)" if total else "0/0"
+
+        out = [f"instructions {ratio(self.executed_count(), self.used_words())}"]
+        if outputs is not None and outputs.listing():
+            per_file = self.line_hits(outputs).values()
+            lines_hit = sum(sum(lines.values()) for lines in per_file)
+            out.append(f"lines {ratio(lines_hit, sum(len(l) for l in per_file))}")
+            functions = self.function_hits(outputs)
+            functions_hit = sum(hit for _, _, hit in functions)
+            out.append(f"functions {ratio(functions_hit, len(functions))}")
+        return out
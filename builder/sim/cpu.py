@@ -0,0 +1,611 @@
+"""
+PIC16 mid-range (14-bit core) instruction-set simulator
+
+Program memory is an ``array('H')`` of 14-bit words and data memory a flat
+512-byte ``bytearray`` covering the four register banks. Every program
+address is decoded once per image into a ``(handler, operand, operand)``
+tuple, so the run loop is a table lookup and a call per instruction.
+
+Peripheral models (:mod:`builder.sim.peripherals`) hook register accesses
+and schedule events; the core services the event queue, wakes from SLEEP
+and dispatches interrupts only when ``cycles`` reaches ``attention``.
+"""
+
+from array import array
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .events import NEVER, EventQueue
+
+# Core registers present at the same offset in every bank
+INDF, TMR0, PCL, STATUS, FSR, PCLATH, INTCON = 0x00, 0x01, 0x02, 0x03, 0x04, 0x0A, 0x0B
+OPTION_REG = 0x81
+CORE_MIRRORS = (INDF, PCL, STATUS, FSR, PCLATH, INTCON)
+
+# STATUS bits
+C, DC, Z, PD, TO, RP0, RP1, IRP = range(8)
+
+STACK_DEPTH = 8
+RESET_VECTOR = 0x0000
+INTERRUPT_VECTOR = 0x0004
+
+# Reset values of the registers that do not power up as zero
+RESET_VALUES = {
+    STATUS: 0x18,
+    OPTION_REG: 0xFF,
+    0x85: 0xFF,  # TRISA
+    0x86: 0xFF,  # TRISB
+    0x87: 0xFF,  # TRISC
+    0x88: 0xFF,  # TRISD
+    0x89: 0x07,  # TRISE
+}
+
+# Why run() returned
+STOP_BUDGET = "cycle budget exhausted"
+STOP_SLEEP = "SLEEP executed"
+STOP_HALT = "halted on 'goto $'"
+STOP_BREAKPOINT = "breakpoint"
+
+
+class SimulationError(Exception):
+    """Raised when the firmware cannot be simulated."""
+
+
+class MidrangeCore:
+    """One PIC16 mid-range CPU.
+
+    Args:
+        program: Program memory words (``maximum_size`` of the board)
+        common_ram: Mirror 0x70-0x7F in every bank (most PIC16F87x/88x parts)
+        eeprom: Initial data EEPROM contents
+    """
+
+    def __init__(
+        self,
+        program: List[int],
+        common_ram: bool = True,
+        eeprom: Optional[List[int]] = None,
+    ):
+        if not program:
+            raise SimulationError("empty program memory")
+        self.pc_mask = (1 << max(len(program) - 1, 1).bit_length()) - 1
+        # Unimplemented words past the end read as erased flash
+        self.program = array("H", (w & 0x3FFF for w in program))
+        self.program.extend([0x3FFF] * (self.pc_mask + 1 - len(program)))
+        self.eeprom = bytearray(eeprom or [])
+        self.config_word = 0x3FFF
+
+        # Canonical address of each of the 512 data memory locations
+        self.address_map = array("H", range(512))
+        for bank in range(1, 4):
+            for offset in CORE_MIRRORS:
+                self.address_map[(bank << 7) | offset] = offset
+            if common_ram:
+                for offset in range(0x70, 0x80):
+                    self.address_map[(bank << 7) | offset] = offset
+
+        self.read_hooks: Dict[int, Callable[[int], int]] = {PCL: self._read_pcl}
+        self.write_hooks: Dict[int, Callable[[int, int], None]] = {
+            PCL: self._write_pcl,
+            STATUS: self._write_status,
+        }
+        self.write_hooks[INTCON] = self._write_interrupt_control
+        self.breakpoints = set()
+        # Observer called after every instruction (profiler, VCD trace...)
+        self.tracer = None
+        # Executed flag per program address (see builder.sim.coverage)
+        self.coverage: Optional[bytearray] = None
+        self.peripherals: Dict[str, object] = {}
+        # (PIRx, PIEx) address pairs gated by INTCON.PEIE
+        self.interrupt_sources: List[Tuple[int, int]] = []
+        self.decoded = self._decode_all()
+        self.reset()
+
+    # State
+
+    def reset(self) -> None:
+        """Power-on reset."""
+        self.data = bytearray(512)
+        for address, value in RESET_VALUES.items():
+            self.data[address] = value
+        self.w = 0
+        self.pc = RESET_VECTOR
+        self.stack = [0] * STACK_DEPTH
+        self.sp = 0
+        self.cycles = 0
+        self.instructions = 0
+        self.sleeping = False
+        self.stop_reason = None
+        self.events = EventQueue()
+        self.attention = NEVER
+        for peripheral in self.peripherals.values():
+            peripheral.reset()
+
+    def register(self, address: int) -> int:
+        """Read a data memory location without side effects."""
+        return self.data[self.address_map[address & 0x1FF]]
+
+    def set_register(self, address: int, value: int) -> None:
+        """Write a data memory location without side effects."""
+        self.data[self.address_map[address & 0x1FF]] = value & 0xFF
+
+    # Data memory access from instructions
+
+    def _address(self, f: int) -> int:
+        data = self.data
+        if f == 0:
+            return self.address_map[((data[STATUS] & 0x80) << 1) | data[FSR]]
+        return self.address_map[((data[STATUS] & 0x60) << 2) | f]
+
+    def _read(self, f: int) -> int:
+        address = self._address(f)
+        if address == INDF:
+            return 0
+        hook = self.read_hooks.get(address)
+        return hook(address) if hook else self.data[address]
+
+    def _write(self, f: int, value: int) -> None:
+        address = self._address(f)
+        if address == INDF:
+            return
+        hook = self.write_hooks.get(address)
+        if hook:
+            hook(address, value & 0xFF)
+        else:
+            self.data[address] = value & 0xFF
+
+    # Events and interrupts
+
+    def request_attention(self) -> None:
+        """Service events and interrupts after the current instruction."""
+        self.attention = 0
+
+    def schedule(self, cycle: int, callback: Callable[[int], None]):
+        """Schedule ``callback(cycle)`` (see :class:`EventQueue`)."""
+        event = self.events.schedule(cycle, callback)
+        if cycle < self.attention:
+            self.attention = cycle
+        return event
+
+    def add_interrupt_source(self, pir: int, pie: int) -> None:
+        """Register a peripheral flag/enable register pair."""
+        if (pir, pie) in self.interrupt_sources:
+            return
+        self.interrupt_sources.append((pir, pie))
+        for address in (pir, pie):
+            self.write_hooks.setdefault(address, self._write_interrupt_control)
+
+    def _write_interrupt_control(self, address: int, value: int) -> None:
+        self.data[address] = value
+        self.attention = 0
+
+    def interrupt_flagged(self) -> bool:
+        """True if an enabled interrupt flag is set (GIE not considered)."""
+        data = self.data
+        intcon = data[INTCON]
+        # T0IE/INTE/RBIE sit three bits above T0IF/INTF/RBIF
+        if intcon & (intcon >> 3) & 0x07:
+            return True
+        if intcon & 0x40:
+            for pir, pie in self.interrupt_sources:
+                if data[pir] & data[pie]:
+                    return True
+        return False
+
+    def _dispatch_interrupt(self) -> None:
+        self._push(self.pc)
+        self.pc = INTERRUPT_VECTOR
+        self.data[INTCON] &= 0x7F
+        self.cycles += 2  # interrupt latency
+        if self.tracer is not None and hasattr(self.tracer, "interrupt"):
+            self.tracer.interrupt(INTERRUPT_VECTOR)
+
+    def _service(self, limit: int) -> None:
+        """Run due events, wake from SLEEP and dispatch interrupts."""
+        events = self.events
+        while True:
+            while events.next_cycle() <= self.cycles:
+                events.run_next()
+            if not self.sleeping:
+                break
+            if self.interrupt_flagged():
+                self.sleeping = False
+                break
+            wake = events.next_cycle()
+            if wake == NEVER:
+                self.stop_reason = STOP_SLEEP
+                break
+            if wake >= limit:
+                # Budget spent asleep: idle until the end of the budget
+                self.cycles = max(self.cycles, limit)
+                break
+            self.cycles = wake
+
+        if self.sleeping:
+            self.attention = 0
+            return
+        if self.data[INTCON] & 0x80 and self.interrupt_flagged():
+            self._dispatch_interrupt()
+        self.attention = events.next_cycle()
+
+    def _read_pcl(self, address: int) -> int:
+        return self.pc & 0xFF
+
+    def _write_pcl(self, address: int, value: int) -> None:
+        self.data[PCL] = value
+        self.pc = ((self.data[PCLATH] << 8) | value) & self.pc_mask
+        self.cycles += 1  # a computed jump takes an extra cycle
+
+    def _write_status(self, address: int, value: int) -> None:
+        # TO and PD are read-only
+        self.data[STATUS] = (self.data[STATUS] & 0x18) | (value & 0xE7)
+
+    def _flags(self, mask: int, bits: int) -> None:
+        self.data[STATUS] = (self.data[STATUS] & ~mask & 0xFF) | bits
+
+    def _zero(self, result: int) -> None:
+        self._flags(0x04, 0x04 if result == 0 else 0)
+
+    def _store(self, f: int, d: int, value: int) -> None:
+        if d:
+            self._write(f, value)
+        else:
+            self.w = value & 0xFF
+
+    def _push(self, address: int) -> None:
+        self.stack[self.sp] = address
+        self.sp = (self.sp + 1) % STACK_DEPTH
+
+    def _pop(self) -> int:
+        self.sp = (self.sp - 1) % STACK_DEPTH
+        return self.stack[self.sp]
+
+    # Instructions: each handler takes two decoded operands and returns the
+    # number of instruction cycles it used
+
+    def _add(self, a: int, b: int) -> int:
+        result = a + b
+        self._flags(
+            0x07,
+            (1 if result > 0xFF else 0)
+            | (2 if (a & 0x0F) + (b & 0x0F) > 0x0F else 0)
+            | (4 if result & 0xFF == 0 else 0),
+        )
+        return result & 0xFF
+
+    def _sub(self, a: int, b: int) -> int:
+        """Return a - b; C and DC mean "no borrow"."""
+        result = (a - b) & 0xFF
+        self._flags(
+            0x07,
+            (1 if a >= b else 0)
+            | (2 if (a & 0x0F) >= (b & 0x0F) else 0)
+            | (4 if result == 0 else 0),
+        )
+        return result
+
+    def op_nop(self, f, d):
+        return 1
+
+    def op_movwf(self, f, d):
+        self._write(f, self.w)
+        return 1
+
+    def op_clr(self, f, d):
+        self._store(f, d, 0)
+        self._flags(0x04, 0x04)
+        return 1
+
+    def op_addwf(self, f, d):
+        self._store(f, d, self._add(self._read(f), self.w))
+        return 1
+
+    def op_subwf(self, f, d):
+        self._store(f, d, self._sub(self._read(f), self.w))
+        return 1
+
+    def op_andwf(self, f, d):
+        result = self._read(f) & self.w
+        self._store(f, d, result)
+        self._zero(result)
+        return 1
+
+    def op_iorwf(self, f, d):
+        result = self._read(f) | self.w
+        self._store(f, d, result)
+        self._zero(result)
+        return 1
+
+    def op_xorwf(self, f, d):
+        result = self._read(f) ^ self.w
+        self._store(f, d, result)
+        self._zero(result)
+        return 1
+
+    def op_comf(self, f, d):
+        result = ~self._read(f) & 0xFF
+        self._store(f, d, result)
+        self._zero(result)
+        return 1
+
+    def op_decf(self, f, d):
+        result = (self._read(f) - 1) & 0xFF
+        self._store(f, d, result)
+        self._zero(result)
+        return 1
+
+    def op_incf(self, f, d):
+        result = (self._read(f) + 1) & 0xFF
+        self._store(f, d, result)
+        self._zero(result)
+        return 1
+
+    def op_movf(self, f, d):
+        result = self._read(f)
+        self._store(f, d, result)
+        self._zero(result)
+        return 1
+
+    def op_decfsz(self, f, d):
+        result = (self._read(f) - 1) & 0xFF
+        self._store(f, d, result)
+        return self._skip_if(result == 0)
+
+    def op_incfsz(self, f, d):
+        result = (self._read(f) + 1) & 0xFF
+        self._store(f, d, result)
+        return self._skip_if(result == 0)
+
+    def op_rlf(self, f, d):
+        value = self._read(f)
+        self._store(f, d, (value << 1) | (self.data[STATUS] & 1))
+        self._flags(0x01, value >> 7)
+        return 1
+
+    def op_rrf(self, f, d):
+        value = self._read(f)
+        self._store(f, d, (value >> 1) | ((self.data[STATUS] & 1) << 7))
+        self._flags(0x01, value & 1)
+        return 1
+
+    def op_swapf(self, f, d):
+        value = self._read(f)
+        self._store(f, d, ((value << 4) | (value >> 4)) & 0xFF)
+        return 1
+
+    def op_bcf(self, f, bit):
+        self._write(f, self._read(f) & ~(1 << bit))
+        return 1
+
+    def op_bsf(self, f, bit):
+        self._write(f, self._read(f) | (1 << bit))
+        return 1
+
+    def op_btfsc(self, f, bit):
+        return self._skip_if(not (self._read(f) >> bit) & 1)
+
+    def op_btfss(self, f, bit):
+        return self._skip_if((self._read(f) >> bit) & 1)
+
+    def _skip_if(self, condition) -> int:
+        if condition:
+            self.pc = (self.pc + 1) & self.pc_mask
+            return 2
+        return 1
+
+    def op_movlw(self, k, _):
+        self.w = k
+        return 1
+
+    def op_addlw(self, k, _):
+        self.w = self._add(self.w, k)
+        return 1
+
+    def op_sublw(self, k, _):
+        self.w = self._sub(k, self.w)
+        return 1
+
+    def op_andlw(self, k, _):
+        self.w &= k
+        self._zero(self.w)
+        return 1
+
+    def op_iorlw(self, k, _):
+        self.w |= k
+        self._zero(self.w)
+        return 1
+
+    def op_xorlw(self, k, _):
+        self.w ^= k
+        self._zero(self.w)
+        return 1
+
+    def op_retlw(self, k, _):
+        self.w = k
+        self.pc = self._pop()
+        return 2
+
+    def op_return(self, f, d):
+        self.pc = self._pop()
+        return 2
+
+    def op_retfie(self, f, d):
+        self.pc = self._pop()
+        self.data[INTCON] |= 0x80
+        self.attention = 0  # another interrupt may be pending
+        return 2
+
+    def op_call(self, k, _):
+        self._push(self.pc)
+        self.pc = (((self.data[PCLATH] & 0x18) << 8) | k) & self.pc_mask
+        return 2
+
+    def op_goto(self, k, here):
+        target = (((self.data[PCLATH] & 0x18) << 8) | k) & self.pc_mask
+        if target == here and not self.data[INTCON] & 0x80:
+            # 'goto $' with interrupts off: the firmware is done
+            self.stop_reason = STOP_HALT
+        self.pc = target
+        return 2
+
+    def op_sleep(self, f, d):
+        self._flags(0x18, 1 << TO)  # TO=1, PD=0
+        self.sleeping = True
+        self.attention = 0
+        return 1
+
+    def op_clrwdt(self, f, d):
+        self._flags(0x18, 0x18)
+        return 1
+
+    def op_option(self, f, d):
+        self.data[OPTION_REG] = self.w
+        return 1
+
+    def op_tris(self, f, d):
+        self.data[0x80 | f] = self.w
+        return 1
+
+    # Decoding
+
+    def decode(self, address: int):
+        """Decode the instruction at ``address`` into (handler, a, b)."""
+        op = self.program[address]
+        top = op >> 12
+        if top == 0b00:
+            f, d = op & 0x7F, (op >> 7) & 1
+            nibble = (op >> 8) & 0x0F
+            if nibble == 0:
+                if d:
+                    return self.op_movwf, f, 0
+                special = {
+                    0x0008: self.op_return,
+                    0x0009: self.op_retfie,
+                    0x0062: self.op_option,
+                    0x0063: self.op_sleep,
+                    0x0064: self.op_clrwdt,
+                }.get(op)
+                if special:
+                    return special, 0, 0
+                if op in (0x0065, 0x0066, 0x0067):
+                    return self.op_tris, op & 0x7, 0
+                return self.op_nop, 0, 0
+            handler = {
+                0x1: self.op_clr,
+                0x2: self.op_subwf,
+                0x3: self.op_decf,
+                0x4: self.op_iorwf,
+                0x5: self.op_andwf,
+                0x6: self.op_xorwf,
+                0x7: self.op_addwf,
+                0x8: self.op_movf,
+                0x9: self.op_comf,
+                0xA: self.op_incf,
+                0xB: self.op_decfsz,
+                0xC: self.op_rrf,
+                0xD: self.op_rlf,
+                0xE: self.op_swapf,
+                0xF: self.op_incfsz,
+            }[nibble]
+            return handler, f, d
+        if top == 0b01:
+            handler = (self.op_bcf, self.op_bsf, self.op_btfsc, self.op_btfss)[
+                (op >> 10) & 0x3
+            ]
+            return handler, op & 0x7F, (op >> 7) & 0x7
+        if top == 0b10:
+            k = op & 0x7FF
+            if op & 0x0800:
+                return self.op_goto, k, address
+            return self.op_call, k, 0
+        k = op & 0xFF
+        sub = (op >> 8) & 0x0F
+        if sub < 0x4:
+            return self.op_movlw, k, 0
+        if sub < 0x8:
+            return self.op_retlw, k, 0
+        return (
+            {
+                0x8: self.op_iorlw,
+                0x9: self.op_andlw,
+                0xA: self.op_xorlw,
+                0xB: self.op_nop,
+                0xC: self.op_sublw,
+                0xD: self.op_sublw,
+                0xE: self.op_addlw,
+                0xF: self.op_addlw,
+            }[sub],
+            k,
+            0,
+        )
+
+    def _decode_all(self) -> list:
+        return [self.decode(address) for address in range(len(self.program))]
+
+    # Execution
+
+    def step(self) -> int:
+        """Execute one instruction and return the cycles it used."""
+        if self.sleeping:
+            self._service(self.cycles + 1)
+            return 0
+        pc = self.pc
+        handler, a, b = self.decoded[pc]
+        self.pc = (pc + 1) & self.pc_mask
+        if self.coverage is not None:
+            self.coverage[pc] = 1
+        before = self.cycles
+        self.cycles += handler(a, b)
+        self.instructions += 1
+        used = self.cycles - before
+        if self.tracer is not None:
+            self.tracer.instruction(pc, used)
+        if self.cycles >= self.attention:
+            self._service(self.cycles + 1)
+        return used
+
+    def run(self, max_cycles: int) -> str:
+        """Run until the cycle budget is spent or the firmware stops.
+
+        A ``tracer`` gets ``tracer.instruction(address, cycles)`` after each
+        instruction; a ``coverage`` map gets the byte of each executed
+        address set to 1.
+
+        Returns:
+            The reason execution stopped (``STOP_*``)
+        """
+        decoded = self.decoded
+        pc_mask = self.pc_mask
+        breakpoints = self.breakpoints
+        tracer = self.tracer
+        coverage = self.coverage
+        limit = self.cycles + max_cycles
+        self.stop_reason = None
+        instructions = 0
+        if self.sleeping:
+            self._service(limit)
+        while self.cycles < limit and not self.stop_reason:
+            if self.sleeping:
+                break
+            pc = self.pc
+            if breakpoints and pc in breakpoints and instructions:
+                self.stop_reason = STOP_BREAKPOINT
+                break
+            handler, a, b = decoded[pc]
+            self.pc = (pc + 1) & pc_mask
+            if coverage is not None:
+                coverage[pc] = 1
+            if tracer is None:
+                self.cycles += handler(a, b)
+            else:
+                before = self.cycles
+                self.cycles += handler(a, b)
+                tracer.instruction(pc, self.cycles - before)
+            instructions += 1
+            if self.cycles >= self.attention:
+                self._service(limit)
+            if self.stop_reason:
+                break
+        self.instructions += instructions
+        if self.stop_reason is None:
+            self.stop_reason = STOP_BUDGET
+        return self.stop_reason
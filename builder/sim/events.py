@@ -0,0 +1,66 @@
+"""
+Scheduled events of the simulated device
+
+Peripherals do not poll every cycle: they compute when something will
+happen next (a timer overflow, the end of a UART frame, an ADC conversion)
+and schedule a callback at that cycle. The core only looks at the queue
+when the earliest event is due.
+"""
+
+import heapq
+import itertools
+from typing import Callable, List
+
+# Cycle of an event that never happens
+NEVER = 1 << 62
+
+
+class Event:
+    """A scheduled callback; ``cancel()`` removes it lazily."""
+
+    __slots__ = ("cycle", "seq", "callback", "active")
+
+    def __init__(self, cycle: int, seq: int, callback: Callable[[int], None]):
+        self.cycle = cycle
+        self.seq = seq
+        self.callback = callback
+        self.active = True
+
+    def __lt__(self, other: "Event") -> bool:
+        return (self.cycle, self.seq) < (other.cycle, other.seq)
+
+    def cancel(self) -> None:
+        self.active = False
+
+
+class EventQueue:
+    """Min-heap of events ordered by cycle, then scheduling order."""
+
+    def __init__(self):
+        self._heap: List[Event] = []
+        self._seq = itertools.count()
+
+    def __len__(self) -> int:
+        return sum(1 for event in self._heap if event.active)
+
+    def schedule(self, cycle: int, callback: Callable[[int], None]) -> Event:
+        """Call ``callback(cycle)`` once the core reaches ``cycle``."""
+        event = Event(cycle, next(self._seq), callback)
+        heapq.heappush(self._heap, event)
+        return event
+
+    def next_cycle(self) -> int:
+        """Return the cycle of the earliest active event, or ``NEVER``."""
+        heap = self._heap
+        while heap and not heap[0].active:
+            heapq.heappop(heap)
+        return heap[0].cycle if heap else NEVER
+
+    def run_next(self) -> None:
+        """Pop the earliest event and run its callback."""
+        event = heapq.heappop(self._heap)
+        event.active = False
+        event.callback(event.cycle)
+
+    def clear(self) -> None:
+        self._heap.clear()
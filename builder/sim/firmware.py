@@ -0,0 +1,250 @@
+"""
+Load ``firmware.hex`` into a simulated core and check the result
+
+Memory sizes come from the board manifest: ``upload.maximum_size`` (program
+words), ``upload.maximum_ram_size`` (GPR bytes) and, when present,
+``upload.info.EepromSize``. Expectations such as ``PORTB=0x55, W=3`` are
+checked against the final register state, pin periods such as
+``RB0=1000ms~2%`` against the pin transitions logged by the port model.
+"""
+
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from ..core.hexfile import HexImage
+from ..core.sfr import Register
+from ..core.toolchain import BASELINE_DEVICES, normalize_device
+from .batch import BatchCore
+from .cpu import MidrangeCore, SimulationError
+from .layout import DeviceLayout
+from .peripherals import attach_peripherals
+
+# PIC16F83/84: bank 1 GPRs mirror bank 0 (no common RAM at 0x70)
+_BANK0_MIRROR_RE = re.compile(r"^16l?f8[34]a?$")
+
+# ID locations, then configuration words, calibration and device ID
+ID_WORD = 0x2000
+CONFIG_WORD = 0x2007
+EEPROM_WORD = 0x2100
+
+
+def is_midrange(device: str) -> bool:
+    """Return True if the device has the 14-bit mid-range core."""
+    return normalize_device(device) not in BASELINE_DEVICES
+
+
+def load_firmware(
+    hex_path,
+    device: str,
+    program_words: int,
+    ram_size: int,
+    eeprom_size: int = 0,
+    registers: Optional[List[Register]] = None,
+    peripherals: bool = True,
+) -> MidrangeCore:
+    """Create a core running the firmware of a board.
+
+    Args:
+        hex_path: Path to firmware.hex
+        device: MCU name (``16f876a``)
+        program_words: Program memory size in words
+        ram_size: General purpose RAM in bytes
+        eeprom_size: Data EEPROM size in bytes
+        registers: Device SFR layout (PIC16F87x addresses if empty)
+        peripherals: Attach the timer, USART, ADC and port models
+
+    Returns:
+        A reset core ready to run
+    """
+    device = normalize_device(device)
+    if not is_midrange(device):
+        raise SimulationError(
+            f"PIC{device.upper()} has a 12-bit baseline core - only 14-bit "
+            "mid-range devices can be simulated"
+        )
+
+    image = HexImage.load(hex_path)
+    oversized = [a for a in image.word_addresses() if program_words <= a < ID_WORD]
+    if oversized:
+        raise SimulationError(
+            f"{Path(hex_path).name} uses word 0x{oversized[0]:04X}, beyond the "
+            f"{program_words} words of program memory"
+        )
+
+    eeprom = [w & 0xFF for w in image.words(EEPROM_WORD, eeprom_size, fill=0xFF)]
+    core = MidrangeCore(
+        image.words(0, program_words),
+        common_ram=ram_size > 128,
+        eeprom=eeprom,
+    )
+    if _BANK0_MIRROR_RE.match(device):
+        for offset in range(0x0C, 0x80):
+            core.address_map[0x80 | offset] = offset
+    core.config_word = image.get_word(CONFIG_WORD, 0x3FFF)
+    if peripherals:
+        attach_peripherals(core, DeviceLayout(registers))
+    return core
+
+
+def load_batch(
+    hex_path,
+    device: str,
+    program_words: int,
+    ram_size: int,
+    eeprom_size: int = 0,
+    count: int = 1,
+    registers: Optional[List[Register]] = None,
+) -> BatchCore:
+    """Create ``count`` lockstep cores running the firmware of a board.
+
+    Takes the arguments of ``load_firmware`` plus the number of instances and
+    the device SFR layout (for EEPROM access). Requires NumPy.
+    """
+    core = load_firmware(
+        hex_path, device, program_words, ram_size, eeprom_size, peripherals=False
+    )
+    return BatchCore(core, count, registers)
+
+
+def parse_expectations(
+    text: str, registers: List[Register]
+) -> List[Tuple[str, Optional[int], int]]:
+    """Parse ``NAME=value`` pairs separated by commas or whitespace.
+
+    A name is ``W``, a register of the device or a data address (``0x06``).
+
+    Returns:
+        ``(label, address, value)`` tuples, address None for W
+    """
+    by_name = DeviceLayout(registers).names()
+    expectations = []
+    for item in re.split(r"[,\s]+", text.strip()):
+        if not item:
+            continue
+        name, sep, value = item.partition("=")
+        if not sep:
+            raise ValueError(f"expected NAME=value, got '{item}'")
+        name = name.strip().upper()
+        if name == "W":
+            address = None
+        elif name in by_name:
+            address = by_name[name]
+        else:
+            try:
+                address = int(name, 0)
+            except ValueError:
+                raise ValueError(f"unknown register '{name}'") from None
+        expectations.append((name, address, int(value, 0) & 0xFF))
+    return expectations
+
+
+def check_expectations(
+    core: MidrangeCore, expectations: List[Tuple[str, Optional[int], int]]
+) -> List[str]:
+    """Return a message for each expectation the final state does not meet."""
+    failures = []
+    for label, address, expected in expectations:
+        actual = core.w if address is None else core.register(address)
+        if actual != expected:
+            failures.append(f"{label} = 0x{actual:02X}, expected 0x{expected:02X}")
+    return failures
+
+
+_TIME_RE = re.compile(r"^([0-9.]+)\s*(s|ms|us)?$")
+_TIME_UNITS = {"s": 1.0, "ms": 1e-3, "us": 1e-6}
+
+
+def parse_time(text: str) -> float:
+    """Parse a duration such as ``500ms``, ``20us`` or ``1.5`` (seconds)."""
+    match = _TIME_RE.match(text.strip().lower())
+    if not match:
+        raise ValueError(f"expected a duration like 500ms, got '{text}'")
+    return float(match.group(1)) * _TIME_UNITS[match.group(2) or "s"]
+
+
+def _items(text: str) -> List[Tuple[str, str]]:
+    items = []
+    for item in re.split(r"[,\s]+", text.strip()):
+        if not item:
+            continue
+        name, sep, value = item.partition("=")
+        if not sep:
+            raise ValueError(f"expected NAME=value, got '{item}'")
+        items.append((name.strip().upper(), value.strip()))
+    return items
+
+
+def apply_inputs(core: MidrangeCore, f_cpu: int, pins: str = "", adc: str = "") -> None:
+    """Set the inputs of the peripheral models before running.
+
+    Args:
+        core: Core with peripherals attached
+        f_cpu: Oscillator frequency, to convert times into cycles
+        pins: Input pin levels, optionally timed: ``RB0=1, RB4=0@20ms``
+        adc: ADC channel values (0-1023): ``AN0=512, AN1=1023``
+    """
+    if pins:
+        ports = core.peripherals.get("ports")
+        if ports is None:
+            raise ValueError("the device has no port model for pin inputs")
+        for name, value in _items(pins):
+            level, _, when = value.partition("@")
+            at = round(parse_time(when) * f_cpu / 4) if when else None
+            ports.drive(name, int(level, 0), at)
+    if adc:
+        converter = core.peripherals.get("adc")
+        if converter is None:
+            raise ValueError("the device has no ADC model")
+        for name, value in _items(adc):
+            if not name.startswith("AN") or not name[2:].isdigit():
+                raise ValueError(f"expected an ADC channel like AN0, got '{name}'")
+            converter.inputs[int(name[2:])] = int(value, 0)
+
+
+def parse_pin_periods(text: str) -> List[Tuple[str, float, float]]:
+    """Parse ``PIN=period~tolerance%`` items (``RB0=1000ms~2%``).
+
+    Returns:
+        ``(pin, period in seconds, relative tolerance)``; 1% by default
+    """
+    periods = []
+    for name, value in _items(text):
+        period, _, tolerance = value.partition("~")
+        tolerance = float(tolerance.rstrip("%")) / 100 if tolerance else 0.01
+        periods.append((name, parse_time(period), tolerance))
+    return periods
+
+
+def measured_periods(core: MidrangeCore, pin: str) -> List[int]:
+    """Return the cycles between successive rising edges of a pin."""
+    ports = core.peripherals.get("ports")
+    transitions = ports.transitions.get(pin.upper(), ()) if ports else ()
+    rising = [cycle for cycle, level in transitions if level]
+    return [b - a for a, b in zip(rising, rising[1:])]
+
+
+def check_pin_periods(
+    core: MidrangeCore, periods: List[Tuple[str, float, float]], f_cpu: int
+) -> Dict[str, List[str]]:
+    """Check pin periods against the logged transitions.
+
+    Returns:
+        ``{"ok": [...], "failed": [...]}`` messages, one per pin
+    """
+    results: Dict[str, List[str]] = {"ok": [], "failed": []}
+    seconds_per_cycle = 4 / f_cpu
+    for pin, period, tolerance in periods:
+        intervals = measured_periods(core, pin)
+        if not intervals:
+            results["failed"].append(f"{pin}: fewer than two rising edges")
+            continue
+        worst = max(intervals, key=lambda c: abs(c * seconds_per_cycle - period))
+        error = abs(worst * seconds_per_cycle - period) / period
+        worst_ms = worst * seconds_per_cycle * 1e3
+        message = (
+            f"{pin}: {len(intervals)} periods, worst {worst_ms:.3f} ms "
+            f"(expected {period * 1e3:.3f} ms ~{tolerance:.1%})"
+        )
+        results["ok" if error <= tolerance else "failed"].append(message)
+    return results
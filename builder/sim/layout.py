@@ -0,0 +1,165 @@
+"""
+Register layout of the simulated device
+
+Peripheral models look their registers and bits up by name in the SFR layout
+of ``build.mcu`` (:mod:`builder.core.sfr`). When no layout is available the
+PIC16F87x addresses are used; they are shared by most mid-range parts.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+from ..core.sfr import Register
+
+# Registers at the same address on every mid-range part
+STANDARD_REGISTERS = {
+    "INDF": 0x00,
+    "TMR0": 0x01,
+    "PCL": 0x02,
+    "STATUS": 0x03,
+    "FSR": 0x04,
+    "PORTA": 0x05,
+    "PORTB": 0x06,
+    "PORTC": 0x07,
+    "PORTD": 0x08,
+    "PORTE": 0x09,
+    "PCLATH": 0x0A,
+    "INTCON": 0x0B,
+    "OPTION_REG": 0x81,
+    "TRISA": 0x85,
+    "TRISB": 0x86,
+    "TRISC": 0x87,
+    "TRISD": 0x88,
+    "TRISE": 0x89,
+}
+
+# PIC16F87x peripheral registers, used only without a device layout
+FALLBACK_REGISTERS = {
+    "PIR1": 0x0C,
+    "PIR2": 0x0D,
+    "TMR1L": 0x0E,
+    "TMR1H": 0x0F,
+    "T1CON": 0x10,
+    "RCSTA": 0x18,
+    "TXREG": 0x19,
+    "RCREG": 0x1A,
+    "ADRESH": 0x1E,
+    "ADCON0": 0x1F,
+    "PIE1": 0x8C,
+    "PIE2": 0x8D,
+    "TXSTA": 0x98,
+    "SPBRG": 0x99,
+    "ADRESL": 0x9E,
+    "ADCON1": 0x9F,
+}
+
+# PIC16F87x bit positions, used when the layout does not name a bit
+FALLBACK_BITS = {
+    ("INTCON", "RBIF"): 0,
+    ("INTCON", "INTF"): 1,
+    ("INTCON", "T0IF"): 2,
+    ("INTCON", "PEIE"): 6,
+    ("INTCON", "GIE"): 7,
+    ("OPTION_REG", "PS0"): 0,
+    ("OPTION_REG", "PSA"): 3,
+    ("OPTION_REG", "T0CS"): 5,
+    ("OPTION_REG", "INTEDG"): 6,
+    ("PIR1", "TMR1IF"): 0,
+    ("PIR1", "TXIF"): 4,
+    ("PIR1", "RCIF"): 5,
+    ("PIR1", "ADIF"): 6,
+    ("T1CON", "TMR1ON"): 0,
+    ("T1CON", "TMR1CS"): 1,
+    ("T1CON", "T1CKPS0"): 4,
+    ("TXSTA", "TRMT"): 1,
+    ("TXSTA", "BRGH"): 2,
+    ("TXSTA", "TXEN"): 5,
+    ("RCSTA", "OERR"): 1,
+    ("RCSTA", "CREN"): 4,
+    ("RCSTA", "SPEN"): 7,
+    ("ADCON0", "ADON"): 0,
+    ("ADCON0", "GO"): 2,
+    ("ADCON0", "CHS0"): 3,
+    ("ADCON0", "ADCS0"): 6,
+    ("ADCON1", "ADFM"): 7,
+}
+
+# PIC16F87x multi-bit fields as ``(position, width)``
+FALLBACK_FIELDS = {
+    ("OPTION_REG", "PS"): (0, 3),
+    ("T1CON", "T1CKPS"): (4, 2),
+    ("ADCON0", "CHS"): (3, 3),
+    ("ADCON0", "ADCS"): (6, 2),
+}
+
+# Alternate names of the same bit across device families
+BIT_ALIASES = {
+    "T0IF": ("TMR0IF",),
+    "INTF": ("INT0IF",),
+    "RBIF": ("RABIF",),
+    "GO": ("GO_nDONE", "GO_DONE", "nDONE"),
+}
+
+
+class DeviceLayout:
+    """Register addresses and bit positions of one device.
+
+    Args:
+        registers: SFR layout of the device (may be empty)
+    """
+
+    def __init__(self, registers: Optional[List[Register]] = None):
+        self.registers: Dict[str, Register] = {
+            reg.name.upper(): reg for reg in registers or []
+        }
+        self.known = bool(self.registers)
+
+    def address(self, name: str) -> Optional[int]:
+        """Return the data address of a register, or None if absent."""
+        name = name.upper()
+        if name in self.registers:
+            return self.registers[name].address
+        if name in STANDARD_REGISTERS:
+            return STANDARD_REGISTERS[name]
+        if not self.known:
+            return FALLBACK_REGISTERS.get(name)
+        return None
+
+    def bit(self, register: str, name: str) -> Optional[int]:
+        """Return the position of a bit, falling back to the PIC16F87x one."""
+        reg = self.registers.get(register.upper())
+        if reg is not None:
+            for candidate in (name,) + BIT_ALIASES.get(name, ()):
+                position = reg.bit(candidate)
+                if position is not None:
+                    return position
+        return FALLBACK_BITS.get((register.upper(), name))
+
+    def field(self, register: str, name: str) -> Optional[Tuple[int, int]]:
+        """Return ``(position, width)`` of a field such as ``CHS``.
+
+        A field the layout only names bit by bit (``CHS0``, ``CHS1``...)
+        spans its consecutive numbered bits.
+        """
+        reg = self.registers.get(register.upper())
+        if reg is not None:
+            for layout in [reg.fields] + reg.aliases:
+                position = 0
+                for field_name, width in layout:
+                    if field_name == name:
+                        return position, width
+                    position += width
+            start = reg.bit(f"{name}0")
+            if start is not None:
+                width = 1
+                while reg.bit(f"{name}{width}") == start + width:
+                    width += 1
+                return start, width
+        return FALLBACK_FIELDS.get((register.upper(), name))
+
+    def names(self) -> Dict[str, int]:
+        """Return every known register name with its address."""
+        names = dict(STANDARD_REGISTERS)
+        if not self.known:
+            names.update(FALLBACK_REGISTERS)
+        names.update((name, reg.address) for name, reg in self.registers.items())
+        return names
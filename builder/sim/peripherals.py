@@ -0,0 +1,567 @@
+"""
+Event-driven peripheral models of the simulated device
+
+Each model hooks the registers it owns, found by name in the SFR layout of
+``build.mcu``, and schedules its next event instead of being polled every
+cycle: a timer derives its count from the elapsed cycles and schedules its
+overflow, the USART schedules the end of each frame. Modelled are Timer0,
+Timer1, the USART, the ADC (conversion results come from values given by
+the test) and the digital ports, with the RB0/INT and RB4-RB7 change
+interrupts and a log of pin transitions for timing checks.
+"""
+
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from .cpu import INTCON, MidrangeCore
+from .layout import DeviceLayout
+
+# Transitions kept per pin (the oldest are dropped)
+MAX_TRANSITIONS = 4096
+
+PORT_LETTERS = "ABCDE"
+
+
+class Peripheral:
+    """Base of the peripheral models.
+
+    Args:
+        core: Core whose register hooks and event queue the model uses
+        layout: Register layout of the device
+    """
+
+    # Registers the model cannot work without
+    REQUIRED: Tuple[str, ...] = ()
+
+    def __init__(self, core: MidrangeCore, layout: DeviceLayout):
+        self.core = core
+        self.layout = layout
+
+    @classmethod
+    def supported(cls, core: MidrangeCore, layout: DeviceLayout) -> bool:
+        return all(
+            _data_address(core, layout, name) is not None for name in cls.REQUIRED
+        )
+
+    def reset(self) -> None:
+        """Return to the power-on state (the event queue is already empty)."""
+
+    def _address(self, name: str) -> Optional[int]:
+        return _data_address(self.core, self.layout, name)
+
+    def _set_bit(self, address: int, bit: int) -> None:
+        self.core.data[address] |= 1 << bit
+        self.core.request_attention()
+
+    def _clear_bit(self, address: int, bit: int) -> None:
+        self.core.data[address] &= ~(1 << bit) & 0xFF
+
+    def _bit(self, address: int, bit: Optional[int]) -> bool:
+        return bit is not None and bool(self.core.data[address] >> bit & 1)
+
+
+def _data_address(core: MidrangeCore, layout: DeviceLayout, name: str) -> Optional[int]:
+    address = layout.address(name)
+    if address is None or address >= len(core.address_map):
+        return None
+    return core.address_map[address]
+
+
+class CounterTimer(Peripheral, ABC):
+    """A free-running counter clocked by the instruction cycle.
+
+    The count is not stored: it is ``(cycles - origin) // prescale`` while
+    the timer runs, and only the next overflow is scheduled.
+    """
+
+    BITS = 8
+
+    def reset(self) -> None:
+        self.running = False
+        self.prescale = 1
+        self.value = 0
+        self.origin = self.core.cycles
+        self.overflow = None
+        self._configure()
+
+    @abstractmethod
+    def settings(self) -> Tuple[bool, int]:
+        """Return ``(running, prescale)`` from the control registers."""
+
+    @abstractmethod
+    def overflowed(self) -> None:
+        """Set the overflow interrupt flag."""
+
+    def count(self) -> int:
+        if self.running:
+            ticks = (self.core.cycles - self.origin) // self.prescale
+            return ticks & ((1 << self.BITS) - 1)
+        return self.value
+
+    def _configure(self) -> None:
+        count = self.count()
+        self.running, self.prescale = self.settings()
+        self._restart(count)
+
+    def _restart(self, count: int) -> None:
+        core = self.core
+        if self.overflow is not None:
+            self.overflow.cancel()
+            self.overflow = None
+        self.value = count
+        self.origin = core.cycles - count * self.prescale
+        if self.running:
+            period = self.prescale << self.BITS
+            self.overflow = core.schedule(self.origin + period, self._overflow)
+
+    def _overflow(self, cycle: int) -> None:
+        self.origin = cycle
+        self.overflow = self.core.schedule(
+            cycle + (self.prescale << self.BITS), self._overflow
+        )
+        self.overflowed()
+
+
+class Timer0(CounterTimer):
+    """TMR0 with the OPTION_REG prescaler; the T0CKI clock is not modelled."""
+
+    REQUIRED = ("TMR0", "OPTION_REG")
+
+    def __init__(self, core: MidrangeCore, layout: DeviceLayout):
+        super().__init__(core, layout)
+        self.tmr0 = self._address("TMR0")
+        self.option = self._address("OPTION_REG")
+        self.t0cs = layout.bit("OPTION_REG", "T0CS")
+        self.psa = layout.bit("OPTION_REG", "PSA")
+        self.ps = layout.field("OPTION_REG", "PS")
+        self.t0if = layout.bit("INTCON", "T0IF")
+        core.read_hooks[self.tmr0] = self._read_tmr0
+        core.write_hooks[self.tmr0] = self._write_tmr0
+        core.write_hooks[self.option] = self._write_option
+
+    def settings(self) -> Tuple[bool, int]:
+        option = self.core.data[self.option]
+        if self._bit(self.option, self.psa):
+            prescale = 1  # prescaler assigned to the watchdog
+        else:
+            position, width = self.ps
+            prescale = 2 << (option >> position & ((1 << width) - 1))
+        return not self._bit(self.option, self.t0cs), prescale
+
+    def overflowed(self) -> None:
+        self._set_bit(INTCON, self.t0if)
+
+    def _read_tmr0(self, address: int) -> int:
+        self.core.data[address] = self.count()
+        return self.core.data[address]
+
+    def _write_tmr0(self, address: int, value: int) -> None:
+        self.core.data[address] = value
+        self._restart(value)
+
+    def _write_option(self, address: int, value: int) -> None:
+        self.core.data[address] = value
+        self._configure()
+
+
+class Timer1(CounterTimer):
+    """16-bit TMR1 with the T1CON prescaler; external clocks are not modelled."""
+
+    BITS = 16
+    REQUIRED = ("TMR1L", "TMR1H", "T1CON", "PIR1", "PIE1")
+
+    def __init__(self, core: MidrangeCore, layout: DeviceLayout):
+        super().__init__(core, layout)
+        self.low = self._address("TMR1L")
+        self.high = self._address("TMR1H")
+        self.t1con = self._address("T1CON")
+        self.pir1 = self._address("PIR1")
+        self.tmr1on = layout.bit("T1CON", "TMR1ON")
+        self.tmr1cs = layout.bit("T1CON", "TMR1CS")
+        self.ckps = layout.field("T1CON", "T1CKPS")
+        self.tmr1if = layout.bit("PIR1", "TMR1IF")
+        core.add_interrupt_source(self.pir1, self._address("PIE1"))
+        for address in (self.low, self.high):
+            core.read_hooks[address] = self._read_tmr1
+            core.write_hooks[address] = self._write_tmr1
+        core.write_hooks[self.t1con] = self._write_t1con
+
+    def settings(self) -> Tuple[bool, int]:
+        t1con = self.core.data[self.t1con]
+        position, width = self.ckps
+        external = self._bit(self.t1con, self.tmr1cs)
+        running = self._bit(self.t1con, self.tmr1on) and not external
+        return running, 1 << (t1con >> position & ((1 << width) - 1))
+
+    def overflowed(self) -> None:
+        self._set_bit(self.pir1, self.tmr1if)
+
+    def _read_tmr1(self, address: int) -> int:
+        count = self.count()
+        self.core.data[self.low] = count & 0xFF
+        self.core.data[self.high] = count >> 8
+        return self.core.data[address]
+
+    def _write_tmr1(self, address: int, value: int) -> None:
+        count = self.count()
+        if address == self.low:
+            count = (count & 0xFF00) | value
+        else:
+            count = (value << 8) | (count & 0xFF)
+        self.core.data[address] = value
+        self._restart(count)
+
+    def _write_t1con(self, address: int, value: int) -> None:
+        self.core.data[address] = value
+        self._configure()
+
+
+class Usart(Peripheral):
+    """Asynchronous USART with frame timing from the baud rate generator.
+
+    Transmitted bytes are collected in ``output`` (``tx_log`` keeps their
+    completion cycles). Bytes given to :meth:`feed` arrive one frame apart
+    into the two-deep receive FIFO; an overrun sets OERR.
+    """
+
+    REQUIRED = ("TXSTA", "RCSTA", "TXREG", "RCREG", "SPBRG", "PIR1", "PIE1")
+
+    def __init__(self, core: MidrangeCore, layout: DeviceLayout):
+        super().__init__(core, layout)
+        self.txsta = self._address("TXSTA")
+        self.rcsta = self._address("RCSTA")
+        self.txreg = self._address("TXREG")
+        self.rcreg = self._address("RCREG")
+        self.spbrg = self._address("SPBRG")
+        self.spbrgh = self._address("SPBRGH")
+        self.baudctl = self._address("BAUDCTL")
+        self.pir1 = self._address("PIR1")
+        self.txif = layout.bit("PIR1", "TXIF")
+        self.rcif = layout.bit("PIR1", "RCIF")
+        self.trmt = layout.bit("TXSTA", "TRMT")
+        self.brgh = layout.bit("TXSTA", "BRGH")
+        self.txen = layout.bit("TXSTA", "TXEN")
+        self.spen = layout.bit("RCSTA", "SPEN")
+        self.cren = layout.bit("RCSTA", "CREN")
+        self.oerr = layout.bit("RCSTA", "OERR")
+        self.brg16 = (
+            layout.bit("BAUDCTL", "BRG16") if self.baudctl is not None else None
+        )
+        core.add_interrupt_source(self.pir1, self._address("PIE1"))
+        core.write_hooks[self.txreg] = self._write_txreg
+        core.write_hooks[self.txsta] = self._write_txsta
+        core.write_hooks[self.rcsta] = self._write_rcsta
+        core.read_hooks[self.rcreg] = self._read_rcreg
+        self.output = bytearray()
+        self.tx_log: List[Tuple[int, int]] = []
+        self.rx_pending: Deque[int] = deque()
+
+    def reset(self) -> None:
+        self.output.clear()
+        self.tx_log.clear()
+        self.rx_pending.clear()
+        self.rx_fifo: Deque[int] = deque()
+        self.rx_event = None
+        self.tx_buffer: Optional[int] = None
+        self.shifting = False
+        # TXREG and the shift register start empty
+        self.core.data[self.pir1] |= 1 << self.txif
+        self.core.data[self.txsta] |= 1 << self.trmt
+
+    def frame_cycles(self) -> int:
+        """Return the instruction cycles of one 10-bit frame."""
+        data = self.core.data
+        divisor = data[self.spbrg]
+        high_speed = self._bit(self.txsta, self.brgh)
+        if self.brg16 is not None and self._bit(self.baudctl, self.brg16):
+            divisor |= data[self.spbrgh] << 8 if self.spbrgh is not None else 0
+            bit_cycles = (divisor + 1) * (1 if high_speed else 4)
+        else:
+            bit_cycles = (divisor + 1) * (4 if high_speed else 16)
+        return 10 * bit_cycles
+
+    def feed(self, data: bytes) -> None:
+        """Queue bytes to be received on RX."""
+        self.rx_pending.extend(data)
+        self._schedule_rx()
+
+    # Transmitter
+
+    def _enabled(self) -> bool:
+        return self._bit(self.rcsta, self.spen) and self._bit(self.txsta, self.txen)
+
+    def _write_txreg(self, address: int, value: int) -> None:
+        self.core.data[address] = value
+        self.tx_buffer = value
+        self._clear_bit(self.pir1, self.txif)
+        self._start_tx()
+
+    def _write_txsta(self, address: int, value: int) -> None:
+        trmt = 1 << self.trmt
+        data = self.core.data
+        data[address] = (value & ~trmt & 0xFF) | (data[address] & trmt)
+        self._start_tx()
+
+    def _start_tx(self) -> None:
+        if self.shifting or self.tx_buffer is None or not self._enabled():
+            return
+        byte, self.tx_buffer = self.tx_buffer, None
+        self.shifting = True
+        self._clear_bit(self.txsta, self.trmt)
+        self._set_bit(self.pir1, self.txif)
+        self.core.schedule(
+            self.core.cycles + self.frame_cycles(),
+            lambda cycle: self._tx_done(cycle, byte),
+        )
+
+    def _tx_done(self, cycle: int, byte: int) -> None:
+        self.output.append(byte)
+        self.tx_log.append((cycle, byte))
+        self.shifting = False
+        self.core.data[self.txsta] |= 1 << self.trmt
+        self._start_tx()
+
+    # Receiver
+
+    def _write_rcsta(self, address: int, value: int) -> None:
+        data = self.core.data
+        data[address] = value
+        if not self._bit(address, self.cren):
+            self._clear_bit(address, self.oerr)  # clearing CREN resets an overrun
+        self._schedule_rx()
+
+    def _schedule_rx(self) -> None:
+        if (
+            self.rx_event is not None
+            or not self.rx_pending
+            or not self._bit(self.rcsta, self.spen)
+            or not self._bit(self.rcsta, self.cren)
+            or self._bit(self.rcsta, self.oerr)
+        ):
+            return
+        self.rx_event = self.core.schedule(
+            self.core.cycles + self.frame_cycles(), self._rx_done
+        )
+
+    def _rx_done(self, cycle: int) -> None:
+        self.rx_event = None
+        byte = self.rx_pending.popleft()
+        if len(self.rx_fifo) < 2:
+            self.rx_fifo.append(byte)
+            self._set_bit(self.pir1, self.rcif)
+        else:
+            self.core.data[self.rcsta] |= 1 << self.oerr
+        self._schedule_rx()
+
+    def _read_rcreg(self, address: int) -> int:
+        if self.rx_fifo:
+            self.core.data[address] = self.rx_fifo.popleft()
+        if not self.rx_fifo:
+            self._clear_bit(self.pir1, self.rcif)
+        return self.core.data[address]
+
+
+class Adc(Peripheral):
+    """10-bit ADC; a conversion returns ``inputs[channel]`` (0-1023).
+
+    The conversion takes 12 TAD with the TAD selected by the ADCS bits
+    (the RC clock counts as 8 TOSC).
+    """
+
+    REQUIRED = ("ADCON0", "ADRESH", "PIR1", "PIE1")
+
+    def __init__(self, core: MidrangeCore, layout: DeviceLayout):
+        super().__init__(core, layout)
+        self.adcon0 = self._address("ADCON0")
+        self.adcon1 = self._address("ADCON1")
+        self.adresh = self._address("ADRESH")
+        self.adresl = self._address("ADRESL")
+        self.pir1 = self._address("PIR1")
+        self.go = layout.bit("ADCON0", "GO")
+        self.adon = layout.bit("ADCON0", "ADON")
+        self.chs = layout.field("ADCON0", "CHS")
+        self.adcs = layout.field("ADCON0", "ADCS")
+        self.adfm = layout.bit("ADCON1", "ADFM") if self.adcon1 is not None else None
+        self.adif = layout.bit("PIR1", "ADIF")
+        core.add_interrupt_source(self.pir1, self._address("PIE1"))
+        core.write_hooks[self.adcon0] = self._write_adcon0
+        self.inputs: Dict[int, int] = {}
+
+    def reset(self) -> None:
+        self.conversion = None
+
+    def conversion_cycles(self) -> int:
+        tosc = 8
+        if self.adcs is not None:
+            position, width = self.adcs
+            adcs = self.core.data[self.adcon0] >> position & ((1 << width) - 1)
+            tosc = (2, 8, 32, 8)[adcs & 3]
+        return 12 * tosc // 4
+
+    def _write_adcon0(self, address: int, value: int) -> None:
+        self.core.data[address] = value
+        converting = self._bit(address, self.go) and self._bit(address, self.adon)
+        if converting and self.conversion is None:
+            self.conversion = self.core.schedule(
+                self.core.cycles + self.conversion_cycles(), self._converted
+            )
+        elif not converting and self.conversion is not None:
+            self.conversion.cancel()  # GO cleared: conversion aborted
+            self.conversion = None
+
+    def _converted(self, cycle: int) -> None:
+        self.conversion = None
+        data = self.core.data
+        channel = 0
+        if self.chs is not None:
+            position, width = self.chs
+            channel = data[self.adcon0] >> position & ((1 << width) - 1)
+        value = max(0, min(1023, int(self.inputs.get(channel, 0))))
+        if self.adfm is not None and self._bit(self.adcon1, self.adfm):
+            high, low = value >> 8, value & 0xFF
+        else:
+            high, low = value >> 2, (value & 0x03) << 6
+        data[self.adresh] = high
+        if self.adresl is not None:
+            data[self.adresl] = low
+        self._clear_bit(self.adcon0, self.go)
+        self._set_bit(self.pir1, self.adif)
+
+
+class Ports(Peripheral):
+    """Digital I/O ports.
+
+    A port reads its pin levels: the latch on output pins, the level driven
+    with :meth:`drive` on input pins. Every level change is logged per pin
+    (``transitions['RB0']`` holds ``(cycle, level)`` pairs) and passed to
+    the ``listeners`` as ``listener(cycle, pin, level)``. RB0 edges set
+    INTF according to INTEDG; changes on RB4-RB7 inputs set RBIF.
+    """
+
+    REQUIRED = ("PORTB", "TRISB")
+
+    def __init__(self, core: MidrangeCore, layout: DeviceLayout):
+        super().__init__(core, layout)
+        # (letter, port, tris, lat) of every port of the device
+        self.ports: List[Tuple[str, int, int, Optional[int]]] = []
+        for letter in PORT_LETTERS:
+            port = self._address(f"PORT{letter}")
+            tris = self._address(f"TRIS{letter}")
+            if port is None or tris is None:
+                continue
+            index = len(self.ports)
+            self.ports.append((letter, port, tris, self._address(f"LAT{letter}")))
+            core.write_hooks[port] = lambda address, value, i=index: self._write_latch(
+                i, value
+            )
+            core.write_hooks[tris] = lambda address, value, i=index: self._write_tris(
+                i, value
+            )
+            lat = self.ports[-1][3]
+            if lat is not None:
+                core.write_hooks[lat] = (
+                    lambda address, value, i=index: self._write_latch(i, value)
+                )
+        self.portb = next(i for i, port in enumerate(self.ports) if port[0] == "B")
+        self.option = self._address("OPTION_REG")
+        self.intf = layout.bit("INTCON", "INTF")
+        self.rbif = layout.bit("INTCON", "RBIF")
+        self.intedg = layout.bit("OPTION_REG", "INTEDG")
+        self.transitions: Dict[str, Deque[Tuple[int, int]]] = {}
+        self.listeners: List[Callable[[int, str, int], None]] = []
+
+    def reset(self) -> None:
+        count = len(self.ports)
+        self.inputs = [0] * count
+        self.latches = [0] * count
+        self.levels = [self.level(i) for i in range(count)]
+        self.transitions.clear()
+        for i in range(count):
+            self._update(i)
+
+    def level(self, index: int) -> int:
+        """Return the pin levels of a port."""
+        tris = self.core.data[self.ports[index][2]]
+        return (self.inputs[index] & tris) | (self.latches[index] & ~tris & 0xFF)
+
+    def pin(self, name: str) -> Tuple[int, int]:
+        """Return ``(port index, bit)`` of a pin name such as ``RB0``."""
+        name = name.upper()
+        if len(name) == 3 and name[0] == "R" and name[2].isdigit():
+            for index, (letter, _, _, _) in enumerate(self.ports):
+                if letter == name[1] and int(name[2]) < 8:
+                    return index, int(name[2])
+        raise ValueError(f"unknown pin {name}")
+
+    def drive(self, name: str, level: int, at: Optional[int] = None) -> None:
+        """Drive an input pin, now or at cycle ``at``."""
+        index, bit = self.pin(name)
+        if at is not None and at > self.core.cycles:
+            self.core.schedule(at, lambda cycle: self.drive(name, level))
+            return
+        if level:
+            self.inputs[index] |= 1 << bit
+        else:
+            self.inputs[index] &= ~(1 << bit) & 0xFF
+        self._update(index)
+
+    def _write_latch(self, index: int, value: int) -> None:
+        self.latches[index] = value
+        lat = self.ports[index][3]
+        if lat is not None:
+            self.core.data[lat] = value
+        self._update(index)
+
+    def _write_tris(self, index: int, value: int) -> None:
+        self.core.data[self.ports[index][2]] = value
+        self._update(index)
+
+    def _update(self, index: int) -> None:
+        letter, port, tris, _ = self.ports[index]
+        data = self.core.data
+        new = self.level(index)
+        data[port] = new
+        changed = new ^ self.levels[index]
+        if not changed:
+            return
+        self.levels[index] = new
+        cycle = self.core.cycles
+        for bit in range(8):
+            if changed >> bit & 1:
+                pin, level = f"R{letter}{bit}", new >> bit & 1
+                log = self.transitions.setdefault(pin, deque(maxlen=MAX_TRANSITIONS))
+                log.append((cycle, level))
+                for listener in self.listeners:
+                    listener(cycle, pin, level)
+
+        if index != self.portb:
+            return
+        if changed & 0x01 and self.intf is not None:
+            rising = bool(new & 0x01)
+            if rising == self._bit(self.option, self.intedg):
+                self._set_bit(INTCON, self.intf)
+        if changed & data[tris] & 0xF0 and self.rbif is not None:
+            self._set_bit(INTCON, self.rbif)
+
+
+# Models attached by attach_peripherals(), in this order
+PERIPHERAL_MODELS = (
+    ("timer0", Timer0),
+    ("timer1", Timer1),
+    ("usart", Usart),
+    ("adc", Adc),
+    ("ports", Ports),
+)
+
+
+def attach_peripherals(
+    core: MidrangeCore, layout: DeviceLayout
+) -> Dict[str, Peripheral]:
+    """Attach the models whose registers the device has; return them by name."""
+    for name, model in PERIPHERAL_MODELS:
+        if model.supported(core, layout):
+            peripheral = model(core, layout)
+            peripheral.reset()
+            core.peripherals[name] = peripheral
+    return core.peripherals
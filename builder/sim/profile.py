@@ -0,0 +1,236 @@
+"""
+Cycle profiler for simulated firmware
+
+Counts the instruction cycles spent at every program address while the
+firmware runs, then attributes them to functions and source lines with the
+XC8 link outputs. A shadow call stack, maintained from CALL/RETURN and
+interrupt entries, gives inclusive costs and folded stacks for flamegraph
+tools (``flamegraph.pl``, speedscope). Also measured: the cycles of each
+interrupt service and the time between passes through the main loop head.
+"""
+
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from ..core.xc8_outputs import XC8Outputs, c_name
+from .cpu import INTERRUPT_VECTOR, MidrangeCore
+
+# Control flow kinds of the decoded instructions
+_PLAIN, _CALL, _RETURN, _RETFIE = range(4)
+_KINDS = {
+    "op_call": _CALL,
+    "op_return": _RETURN,
+    "op_retlw": _RETURN,
+    "op_retfie": _RETFIE,
+}
+
+STARTUP = "(startup)"
+
+# The shadow stack stops growing past this depth (runaway recursion)
+MAX_STACK_FRAMES = 32
+
+
+class Profiler:
+    """Tracer collecting cycle counts while a core runs.
+
+    Args:
+        core: Core to profile (its ``tracer`` is set)
+        outputs: XC8 link outputs of the firmware
+        loop_address: Main loop head whose pass-to-pass time is measured
+    """
+
+    def __init__(
+        self,
+        core: MidrangeCore,
+        outputs: Optional[XC8Outputs] = None,
+        loop_address: Optional[int] = None,
+    ):
+        size = len(core.program)
+        self.core = core
+        self.outputs = outputs
+        self.loop_address = loop_address
+
+        # Per-image tables: instruction kind and owning function per address
+        self.kinds = bytearray(
+            _KINDS.get(handler.__name__, _PLAIN) for handler, _, _ in core.decoded
+        )
+        owners = outputs.function_owners(size) if outputs else [None] * size
+        self.owners = [c_name(name) if name else STARTUP for name in owners]
+
+        self.address_cycles = array("Q", bytes(8 * size))
+        self.address_hits = array("Q", bytes(8 * size))
+        self.stacks: Dict[Tuple[str, ...], int] = {}
+        self.calls: Dict[str, int] = {}
+        self._stack: Tuple[str, ...] = (self.owners[core.pc],)
+
+        self.isr_cycles: List[int] = []
+        self._isr_start: Optional[int] = None
+        self.loop_intervals: List[int] = []
+        self._loop_last: Optional[int] = None
+
+        core.tracer = self
+
+    # Tracer interface
+
+    def instruction(self, address: int, cycles: int) -> None:
+        self.address_cycles[address] += cycles
+        self.address_hits[address] += 1
+        stack = self._stack
+        owner = self.owners[address]
+        if stack[-1] != owner:
+            # Jumped into another function (startup code, tail jumps)
+            stack = self._stack = stack[:-1] + (owner,)
+        self.stacks[stack] = self.stacks.get(stack, 0) + cycles
+
+        if address == self.loop_address:
+            start = self.core.cycles - cycles
+            if self._loop_last is not None:
+                self.loop_intervals.append(start - self._loop_last)
+            self._loop_last = start
+
+        kind = self.kinds[address]
+        if kind == _CALL:
+            callee = self.owners[self.core.pc]
+            self.calls[callee] = self.calls.get(callee, 0) + 1
+            if len(stack) < MAX_STACK_FRAMES:
+                self._stack = stack + (callee,)
+        elif kind == _RETURN:
+            if len(stack) > 1:
+                self._stack = stack[:-1]
+        elif kind == _RETFIE:
+            if len(stack) > 1:
+                self._stack = stack[:-1]
+            if self._isr_start is not None:
+                self.isr_cycles.append(self.core.cycles - self._isr_start)
+                self._isr_start = None
+
+    def interrupt(self, vector: int = INTERRUPT_VECTOR) -> None:
+        """Record the dispatch of an interrupt to ``vector``."""
+        isr = self.owners[vector]
+        self.calls[isr] = self.calls.get(isr, 0) + 1
+        self._stack = self._stack + (isr,)
+        self._isr_start = self.core.cycles
+
+    # Results
+
+    def function_cycles(self) -> Dict[str, int]:
+        """Return the cycles spent in the body of each function."""
+        totals: Dict[str, int] = {}
+        for address, cycles in enumerate(self.address_cycles):
+            if cycles:
+                owner = self.owners[address]
+                totals[owner] = totals.get(owner, 0) + cycles
+        return totals
+
+    def inclusive_cycles(self) -> Dict[str, int]:
+        """Return the cycles spent in each function and its callees."""
+        totals: Dict[str, int] = {}
+        for stack, cycles in self.stacks.items():
+            for name in set(stack):
+                totals[name] = totals.get(name, 0) + cycles
+        return totals
+
+    def line_cycles(self) -> Dict[Tuple[str, int], int]:
+        """Return the cycles spent on each source line."""
+        if not self.outputs:
+            return {}
+        totals: Dict[Tuple[str, int], int] = {}
+        for address, source in self.outputs.line_table().items():
+            if address < len(self.address_cycles) and self.address_cycles[address]:
+                totals[source] = totals.get(source, 0) + self.address_cycles[address]
+        return totals
+
+    def folded_stacks(self) -> str:
+        """Return the profile in folded-stack format (``main;delay 1234``)."""
+        return "".join(
+            f"{';'.join(stack)} {cycles}\n"
+            for stack, cycles in sorted(self.stacks.items())
+            if cycles
+        )
+
+    def write_folded(self, path) -> None:
+        Path(path).write_text(self.folded_stacks())
+
+    def report(self, f_cpu: int, top: int = 15) -> str:
+        """Return a text report; times use an instruction cycle of 4/f_cpu."""
+        total = max(self.core.cycles, 1)
+
+        def us(cycles: float) -> str:
+            return f"{cycles * 4e6 / f_cpu:.2f} us"
+
+        out = [
+            f"Profile: {self.core.cycles} cycles, {self.core.instructions} instructions"
+        ]
+        inclusive = self.inclusive_cycles()
+        out.append("")
+        out.append(f"{'Function':<28}{'Self':>12}{'%':>7}{'Total':>12}{'Calls':>8}")
+        for name, cycles in sorted(
+            self.function_cycles().items(), key=lambda item: -item[1]
+        )[:top]:
+            out.append(
+                f"{name:<28}{cycles:>12}{100 * cycles / total:>6.1f}%"
+                f"{inclusive.get(name, cycles):>12}{self.calls.get(name, 0):>8}"
+            )
+
+        lines = self.line_cycles()
+        if lines:
+            out.append("")
+            out.append(f"{'Source line':<40}{'Cycles':>12}{'%':>7}")
+            for (file, line), cycles in sorted(lines.items(), key=lambda i: -i[1])[
+                :top
+            ]:
+                location = f"{Path(file).name}:{line}"
+                out.append(f"{location:<40}{cycles:>12}{100 * cycles / total:>6.1f}%")
+
+        out.append("")
+        if self.isr_cycles:
+            runs = self.isr_cycles
+            out.append(
+                f"ISR: {len(runs)} runs, {sum(runs)} cycles "
+                f"({100 * sum(runs) / total:.1f}%), worst {max(runs)} cycles "
+                f"({us(max(runs))}), mean {sum(runs) / len(runs):.1f} cycles"
+            )
+        else:
+            out.append("ISR: not entered")
+
+        if self.loop_address is None:
+            out.append("Main loop: head not found")
+        elif self.loop_intervals:
+            runs = self.loop_intervals
+            out.append(
+                f"Main loop @0x{self.loop_address:04X}: {len(runs)} passes, "
+                f"worst {max(runs)} cycles ({us(max(runs))}), "
+                f"best {min(runs)} cycles, mean {us(sum(runs) / len(runs))}"
+            )
+        else:
+            out.append(f"Main loop @0x{self.loop_address:04X}: fewer than two passes")
+        return "\n".join(out) + "\n"
+
+
+def find_loop_head(core: MidrangeCore, outputs: XC8Outputs) -> Optional[int]:
+    """Return the main loop head of the firmware.
+
+    That is the entry of Arduino's ``loop()``, or else the target of the
+    widest backward ``goto`` inside ``main()`` (the ``while (1)``).
+    """
+    functions = outputs.functions()
+    bounds = {
+        name: (
+            start,
+            functions[i + 1][0] if i + 1 < len(functions) else len(core.program),
+        )
+        for i, (start, name) in enumerate(functions)
+    }
+    if "_loop" in bounds:
+        return bounds["_loop"][0]
+    if "_main" not in bounds:
+        return None
+    start, end = bounds["_main"]
+    heads = []
+    for address in range(start, end):
+        handler, target, _ = core.decoded[address]
+        target |= address & ~0x7FF  # GOTO stays in its 2K page
+        if handler.__name__ == "op_goto" and start <= target < address:
+            heads.append(target)
+    return min(heads) if heads else None
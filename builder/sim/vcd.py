@@ -0,0 +1,277 @@
+"""
+VCD waveform traces of simulated runs
+
+Pin transitions and register changes are written as a Value Change Dump
+that GTKWave (or any logic-analyzer viewer) opens. Changes go through a
+bounded buffer that is flushed to the file whenever it fills, so memory
+stays constant however long the simulation runs; a filter of ports, pins,
+SFR names and address ranges keeps the file small.
+
+Pins are traced at the exact cycle of each transition (from the port
+model). Registers are compared after every instruction; timer registers
+with lazily computed counts (TMR0, TMR1) show the value last read.
+"""
+
+import re
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from .cpu import MidrangeCore
+from .layout import DeviceLayout
+
+# Value changes held in memory before they are written out
+BUFFER_CHANGES = 4096
+
+_RANGE_RE = re.compile(r"^(0x[0-9a-f]+|\d+)(?:-(0x[0-9a-f]+|\d+))?$", re.IGNORECASE)
+_PIN_RE = re.compile(r"^R[A-E][0-7]$")
+
+
+def _identifier(index: int) -> str:
+    """Return the short VCD identifier of the n-th signal (``!``, ``"``...)."""
+    chars = ""
+    index += 1
+    while index:
+        index, digit = divmod(index - 1, 94)
+        chars = chr(33 + digit) + chars
+    return chars
+
+
+class VcdWriter:
+    """Writes value changes to a VCD file through a bounded buffer.
+
+    Args:
+        path: Output file
+        ns_per_cycle: Duration of an instruction cycle in nanoseconds
+        buffer_size: Value changes buffered before a write
+        limit: Stop recording after this many changes (None: no limit)
+    """
+
+    def __init__(
+        self,
+        path,
+        ns_per_cycle: float,
+        buffer_size: int = BUFFER_CHANGES,
+        limit: Optional[int] = None,
+    ):
+        self.path = Path(path)
+        self.ns_per_cycle = ns_per_cycle
+        self.buffer_size = buffer_size
+        self.limit = limit
+        self.changes = 0
+        self.truncated = False
+        # (scope, name, width, identifier) in declaration order
+        self.signals: List[Tuple[str, str, int, str]] = []
+        self._buffer: List[str] = []
+        self._time = -1
+        self._file = None
+
+    def add_signal(self, scope: str, name: str, width: int) -> str:
+        """Declare a signal; return its identifier."""
+        identifier = _identifier(len(self.signals))
+        self.signals.append((scope, name, width, identifier))
+        return identifier
+
+    def open(self, title: str, initial: List[int]) -> None:
+        """Write the header and the initial value of every signal."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = self.path.open("w", encoding="ascii")
+        out = [
+            f"$date {time.strftime('%Y-%m-%d %H:%M:%S')} $end",
+            "$version platform-pic8bit simulator $end",
+            "$timescale 1ns $end",
+            f"$scope module {title} $end",
+        ]
+        scopes = {}
+        for scope, name, width, identifier in self.signals:
+            kind = "wire" if width == 1 else "reg"
+            scopes.setdefault(scope, []).append(
+                f"$var {kind} {width} {identifier} {name} $end"
+            )
+        for scope, lines in scopes.items():
+            if scope:
+                out.append(f"$scope module {scope} $end")
+            out += lines
+            if scope:
+                out.append("$upscope $end")
+        out += ["$upscope $end", "$enddefinitions $end", "#0", "$dumpvars"]
+        for (_, _, width, identifier), value in zip(self.signals, initial):
+            out.append(self._value(width, identifier, value))
+        out.append("$end")
+        self._file.write("\n".join(out) + "\n")
+        self._time = 0
+
+    @staticmethod
+    def _value(width: int, identifier: str, value: int) -> str:
+        if width == 1:
+            return f"{value & 1}{identifier}"
+        return f"b{value:b} {identifier}"
+
+    def change(self, cycle: int, identifier: str, width: int, value: int) -> None:
+        """Record a new value at ``cycle``."""
+        if self.limit is not None and self.changes >= self.limit:
+            self.truncated = True
+            return
+        # Changes reported late (events between instructions) keep time monotonic
+        stamp = max(round(cycle * self.ns_per_cycle), self._time)
+        if stamp != self._time:
+            self._buffer.append(f"#{stamp}")
+            self._time = stamp
+        self._buffer.append(self._value(width, identifier, value))
+        self.changes += 1
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._file is not None and self._buffer:
+            self._file.write("\n".join(self._buffer) + "\n")
+        self._buffer.clear()
+
+    def close(self, cycle: Optional[int] = None) -> None:
+        """Flush the buffer, mark the end time and close the file."""
+        if self._file is None:
+            return
+        if cycle is not None:
+            stamp = round(cycle * self.ns_per_cycle)
+            if stamp > self._time:
+                self._buffer.append(f"#{stamp}")
+        self.flush()
+        self._file.close()
+        self._file = None
+
+
+def parse_trace_signals(
+    text: str, layout: DeviceLayout
+) -> Tuple[List[str], List[Tuple[str, int]], bool]:
+    """Parse a trace filter such as ``PORTB, RC6, INTCON, 0x20-0x2F, W``.
+
+    A port name traces its eight pins, ``RB0`` one pin, an SFR name or a
+    data address (range) the whole register. ``yes`` traces every pin.
+
+    Returns:
+        ``(pins, registers, trace W)``, registers as ``(name, address)``
+    """
+    pins: List[str] = []
+    registers: List[Tuple[str, int]] = []
+    trace_w = False
+    names = layout.names()
+    for item in re.split(r"[,\s]+", text.strip()):
+        upper = item.upper()
+        if not item:
+            continue
+        if upper in ("YES", "TRUE", "1", "ON", "PINS"):
+            pins += [f"R{letter}{bit}" for letter in "ABCDE" for bit in range(8)]
+        elif upper == "W":
+            trace_w = True
+        elif re.match(r"^PORT[A-E]$", upper):
+            pins += [f"R{upper[4]}{bit}" for bit in range(8)]
+        elif _PIN_RE.match(upper):
+            pins.append(upper)
+        elif upper in names:
+            registers.append((upper, names[upper]))
+        else:
+            match = _RANGE_RE.match(item)
+            if not match:
+                raise ValueError(f"unknown trace signal '{item}'")
+            first = int(match.group(1), 0)
+            last = int(match.group(2), 0) if match.group(2) else first
+            if not 0 <= first <= last < 0x200:
+                raise ValueError(f"invalid data address range '{item}'")
+            registers += [
+                (f"R{address:03X}", address) for address in range(first, last + 1)
+            ]
+    return list(dict.fromkeys(pins)), list(dict.fromkeys(registers)), trace_w
+
+
+class VcdRecorder:
+    """Tracer streaming the pins and registers of a running core to a VCD.
+
+    Args:
+        core: Core to trace (its ``tracer`` is set)
+        writer: Output writer
+        pins: Pin names (``RB0``); pins the device lacks are skipped
+        registers: ``(name, address)`` of the registers to trace
+        trace_w: Also trace the W register
+        title: Top-level scope name (the device)
+    """
+
+    def __init__(
+        self,
+        core: MidrangeCore,
+        writer: VcdWriter,
+        pins: List[str],
+        registers: List[Tuple[str, int]],
+        trace_w: bool = False,
+        title: str = "pic",
+    ):
+        self.core = core
+        self.writer = writer
+        initial = []
+
+        self.pins = {}
+        ports = core.peripherals.get("ports")
+        if ports is not None:
+            for pin in pins:
+                try:
+                    index, bit = ports.pin(pin)
+                except ValueError:
+                    continue
+                self.pins[pin] = writer.add_signal(f"PORT{pin[1]}", pin, 1)
+                initial.append(ports.levels[index] >> bit & 1)
+            ports.listeners.append(self._pin_changed)
+
+        # Registers compared by contiguous spans of canonical addresses
+        watched = {}
+        for name, address in registers:
+            canonical = core.address_map[address & 0x1FF]
+            if canonical not in watched:
+                watched[canonical] = writer.add_signal("", name, 8)
+                initial.append(core.data[canonical])
+        self.spans: List[Tuple[int, int, List[Optional[str]], bytearray]] = []
+        for address in sorted(watched):
+            if self.spans and self.spans[-1][1] == address:
+                lo, _, identifiers, _ = self.spans[-1]
+                identifiers.append(watched[address])
+                self.spans[-1] = (lo, address + 1, identifiers, None)
+            else:
+                self.spans.append((address, address + 1, [watched[address]], None))
+        self.spans = [
+            (lo, hi, identifiers, bytearray(core.data[lo:hi]))
+            for lo, hi, identifiers, _ in self.spans
+        ]
+
+        self.w_identifier = writer.add_signal("", "W", 8) if trace_w else None
+        if trace_w:
+            initial.append(core.w)
+        self._w = core.w
+
+        writer.open(title, initial)
+        core.tracer = self
+
+    def _pin_changed(self, cycle: int, pin: str, level: int) -> None:
+        identifier = self.pins.get(pin)
+        if identifier is not None:
+            self.writer.change(cycle, identifier, 1, level)
+
+    def instruction(self, address: int, cycles: int) -> None:
+        core = self.core
+        data = core.data
+        for lo, hi, identifiers, snapshot in self.spans:
+            current = data[lo:hi]
+            if current != snapshot:
+                for offset, (old, new) in enumerate(zip(snapshot, current)):
+                    if old != new:
+                        self.writer.change(core.cycles, identifiers[offset], 8, new)
+                snapshot[:] = current
+        if self.w_identifier is not None and core.w != self._w:
+            self._w = core.w
+            self.writer.change(core.cycles, self.w_identifier, 8, core.w)
+
+    def close(self) -> None:
+        """Write the remaining changes and close the file."""
+        ports = self.core.peripherals.get("ports")
+        if ports is not None and self._pin_changed in ports.listeners:
+            ports.listeners.remove(self._pin_changed)
+        if self.core.tracer is self:
+            self.core.tracer = None
+        self.writer.close(self.core.cycles)
@@ -0,0 +1,49 @@
+"""
+PlatformIO device monitor filter decoding the tokenized PIC_LOG() output
+
+    monitor_filters = pic_log
+    monitor_encoding = latin-1
+
+The string table is read from ``$BUILD_DIR/pic_log.json`` of the monitored
+environment, written by the logs stage of the build. ``latin-1`` hands every
+received byte to the filter unchanged.
+"""
+
+import sys
+from pathlib import Path
+
+from platformio.public import DeviceMonitorFilterBase
+
+# Make the shared builder.core package importable, as builder/main.py does
+PLATFORM_DIR = str(Path(__file__).resolve().parent.parent)
+if PLATFORM_DIR not in sys.path:
+    sys.path.insert(0, PLATFORM_DIR)
+
+from builder.core.tokenized_log import TABLE_NAME, LogDecoder  # noqa: E402
+
+
+class PicLog(DeviceMonitorFilterBase):
+    NAME = "pic_log"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.decoder = None
+        table = self._table_path()
+        if table is not None and table.is_file():
+            self.decoder = LogDecoder.load(table)
+            print(f"--- pic_log: {len(self.decoder.tokens)} log formats from {table}")
+        else:
+            print(f"--- pic_log: no {TABLE_NAME} - build the project first")
+
+    def _table_path(self):
+        if not self.project_dir or not self.environment:
+            return None
+        build_dir = Path(self.config.get("platformio", "build_dir"))
+        if not build_dir.is_absolute():
+            build_dir = Path(self.project_dir) / build_dir
+        return build_dir / self.environment / TABLE_NAME
+
+    def rx(self, text):
+        if self.decoder is None:
+            return text
+        return self.decoder.feed(text.encode("latin-1", errors="replace"))
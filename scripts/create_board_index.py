@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Create the board index used by ``pio run --target fit``
+
+The index (``builder/data/board_index.json``) summarizes the memory sizes,
+stack depth and SFR names of every board manifest. SFR names come from the
+SFR data files (``create_boards.py --sfr-dir``) or, with ``--xc8-path``,
+from the processor headers of an XC8 installation, which also give the
+EEPROM size of the parts whose manifest does not.
+"""
+
+import sys
+import json
+import argparse
+from pathlib import Path
+
+# Shared board index code of the platform builder
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from builder.core.board_index import (  # noqa: E402
+    BOARDS_DIR,
+    INDEX_FILE,
+    build_board_index,
+)
+from builder.core.toolchain import find_xc8_toolchain  # noqa: E402
+
+
+def main():
+    """Main function with command-line argument parsing."""
+    parser = argparse.ArgumentParser(
+        description="Index the board manifests for the board fit finder"
+    )
+    parser.add_argument(
+        "--boards-dir",
+        type=str,
+        help=f"Board manifests to index (default: {BOARDS_DIR})",
+    )
+    parser.add_argument(
+        "--sfr-dir",
+        type=str,
+        help="SFR data files (default: builder/sfr)",
+    )
+    parser.add_argument(
+        "--xc8-path",
+        type=str,
+        help="XC8 installation whose headers provide missing SFR layouts",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        help=f"Index file to write (default: {INDEX_FILE})",
+    )
+    args = parser.parse_args()
+
+    boards_dir = Path(args.boards_dir) if args.boards_dir else BOARDS_DIR
+    output = Path(args.output) if args.output else INDEX_FILE
+    toolchain = find_xc8_toolchain(args.xc8_path)
+    if toolchain is None:
+        print(
+            "⚠️ Warning: XC8 not found - SFRs only from the SFR data files, "
+            "EEPROM sizes only from the manifests"
+        )
+
+    index = build_board_index(boards_dir, toolchain, args.sfr_dir)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(index, indent=1) + "\n", encoding="utf-8")
+
+    with_sfrs = sum(1 for board in index["boards"] if board["sfrs"] is not None)
+    with_eeprom = sum(1 for board in index["boards"] if board["eeprom"] is not None)
+    print(
+        f"✅ Indexed {len(index['boards'])} boards ({with_sfrs} with SFR names, "
+        f"{with_eeprom} with EEPROM sizes)"
+    )
+    print(f"📁 Index: {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,8 +8,10 @@ This script generates PlatformIO board JSON files from device specifications
 import sys
 import json
 import argparse
+import zipfile
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
+from xml.etree import ElementTree
 
 # Add atpack-python-parser src to path
 atpack_parser_root = Path(__file__).parent.parent.parent / "atpack-python-parser"
@@ -23,6 +25,13 @@ except ImportError:
     )
     sys.exit(1)
 
+# Shared SFR data model of the platform builder
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from builder.core.sfr import Register, save_registers, sfr_data_file  # noqa: E402
+
+# Namespace of the MPLAB device description (.PIC) files of the AtPacks
+EDC_NS = "http://crownking/edc"
+
 # Import real DeviceID lookup table
 try:
     from deviceid_lookup import DEVICE_IDS
@@ -34,11 +43,12 @@ except ImportError:
 class BoardGenerator:
     """Generate PlatformIO board configurations from PIC device specifications."""
 
-    def __init__(self, output_dir: Path = None):
+    def __init__(self, output_dir: Path = None, sfr_dir: Path = None):
         """Initialize the board generator.
 
         Args:
             output_dir: Directory to output board JSON files (default: ../boards)
+            sfr_dir: Directory to output SFR data files (default: not exported)
         """
         if output_dir is None:
             self.output_dir = Path(__file__).parent.parent / "boards"
@@ -46,6 +56,7 @@ class BoardGenerator:
             self.output_dir = Path(output_dir)
 
         self.output_dir.mkdir(exist_ok=True)
+        self.sfr_dir = Path(sfr_dir) if sfr_dir else None
 
         # Default configuration templates
         self.pic16_protocols = ["pickit2", "pickit3", "pickit4", "mplab-ice", "custom"]
@@ -280,6 +291,86 @@ class BoardGenerator:
 
         return filepath
 
+    @staticmethod
+    def _edc_int(element, name: str, default: int = 0) -> int:
+        value = element.get(f"{{{EDC_NS}}}{name}")
+        return int(value, 0) if value is not None else default
+
+    def _edc_layout(self, mode) -> List[Tuple[Optional[str], int]]:
+        """Fields of an ``edc:SFRMode`` from bit 0 upwards."""
+        layout = []
+        for child in mode:
+            if child.tag == f"{{{EDC_NS}}}SFRFieldDef":
+                name = child.get(f"{{{EDC_NS}}}cname")
+                layout.append((name, self._edc_int(child, "nzwidth", 1)))
+            elif child.tag == f"{{{EDC_NS}}}AdjustPoint":
+                layout.append((None, self._edc_int(child, "offset")))
+        return layout
+
+    def extract_registers(self, atpack_path: str, device_name: str) -> List[Register]:
+        """Extract the SFR layout of a device from the AtPack.
+
+        The layout comes from the device's ``edc/<DEVICE>.PIC`` file, the
+        MPLAB device description packed in the AtPack: every ``edc:SFRDef``
+        and ``edc:JoinedSFRDef`` (16-bit pairs such as TMR1) of its data
+        space, with the field layouts of their ``edc:SFRMode`` elements.
+
+        Args:
+            atpack_path: Path to the AtPack file
+            device_name: Device name (e.g., 'PIC16F877A')
+
+        Returns:
+            List of registers (empty if the AtPack has no description)
+        """
+        try:
+            with zipfile.ZipFile(atpack_path) as atpack:
+                root = ElementTree.fromstring(
+                    atpack.read(f"edc/{device_name.upper()}.PIC")
+                )
+        except (KeyError, zipfile.BadZipFile, ElementTree.ParseError):
+            return []
+        data_space = root.find(f"{{{EDC_NS}}}DataSpace")
+        if data_space is None:
+            return []
+
+        registers = []
+        for tag in ("SFRDef", "JoinedSFRDef"):
+            for sfr in data_space.iter(f"{{{EDC_NS}}}{tag}"):
+                name = sfr.get(f"{{{EDC_NS}}}cname")
+                if not name or sfr.get(f"{{{EDC_NS}}}_addr") is None:
+                    continue
+                # The first mode names the bits, the others are alternate names
+                layouts = [
+                    self._edc_layout(mode)
+                    for mode in sfr.iter(f"{{{EDC_NS}}}SFRMode")
+                    if tag == "SFRDef"
+                ]
+                layouts = [layout for layout in layouts if layout]
+                registers.append(
+                    Register(
+                        name,
+                        self._edc_int(sfr, "_addr"),
+                        max(1, self._edc_int(sfr, "nzwidth", 8) // 8),
+                        layouts[0] if layouts else None,
+                        layouts[1:],
+                    )
+                )
+
+        return sorted(registers, key=lambda r: (r.address, r.name))
+
+    def generate_sfr_file(self, atpack_path: str, device_name: str) -> Optional[Path]:
+        """Export the SFR layout of a device to ``sfr_dir``.
+
+        Returns:
+            Path to the generated file, or None if no SFR data is available
+        """
+        registers = self.extract_registers(atpack_path, device_name)
+        if not registers:
+            return None
+        filepath = sfr_data_file(self.normalize_device_name(device_name), self.sfr_dir)
+        save_registers(filepath, device_name, registers)
+        return filepath
+
     def generate_from_atpack(
         self,
         atpack_path: str,
@@ -332,6 +423,13 @@ class BoardGenerator:
                     generated_files.append(filepath)
                     print(f"  ✅ Generated: {filepath.name}")
 
+                    if self.sfr_dir:
+                        sfr_path = self.generate_sfr_file(atpack_path, spec.device_name)
+                        if sfr_path:
+                            print(f"  ✅ Generated SFR data: {sfr_path.name}")
+                        else:
+                            print(f"  ⚠️ No SFR data for {spec.device_name}")
+
                 except Exception as e:
                     print(f"  ❌ Failed to generate board for {spec.device_name}: {e}")
 
@@ -362,6 +460,11 @@ Examples:
   # Generate specific devices only:
   python create_boards.py ../../../atpack-python-parser/atpacks/Microchip.PIC16Fxxx_DFP.1.7.162.atpack --devices PIC16F877A PIC16F84A
   
+  # Also export SFR data for the transpilation stubs and simulator:
+  python create_boards.py \\
+      ../../../atpack-python-parser/atpacks/Microchip.PIC16Fxxx_DFP.1.7.162.atpack \\
+      --pic16f-only --sfr-dir ../builder/sfr
+
   # Specify custom output directory:
   python create_boards.py ../../../atpack-python-parser/atpacks/Microchip.PIC16Fxxx_DFP.1.7.162.atpack --output-dir /custom/boards/dir
         """,
@@ -381,6 +484,12 @@ Examples:
         help="Output directory for board files (default: ../boards)",
     )
 
+    parser.add_argument(
+        "--sfr-dir",
+        type=str,
+        help="Also export SFR layouts as JSON to this directory (e.g. ../builder/sfr)",
+    )
+
     parser.add_argument(
         "--pic16f-only",
         action="store_true",
@@ -394,7 +503,8 @@ Examples:
 
     # Initialize generator with custom output directory if specified
     output_dir = Path(args.output_dir) if args.output_dir else None
-    generator = BoardGenerator(output_dir)
+    sfr_dir = Path(args.sfr_dir) if args.sfr_dir else None
+    generator = BoardGenerator(output_dir, sfr_dir)
 
     try:
         # Generate from AtPack file
@@ -0,0 +1,16 @@
+"""
+Shared setup of the unit tests
+
+The tests import ``builder.core`` and ``builder.sim`` directly. The
+repository root is appended to ``sys.path`` rather than prepended: its
+``platform.py`` (the PlatformIO platform class) would otherwise shadow the
+standard library module. Run ``pytest`` rather than ``python -m pytest`` from
+the root for the same reason.
+"""
+
+import sys
+from pathlib import Path
+
+ROOT = str(Path(__file__).resolve().parent.parent)
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
@@ -0,0 +1,170 @@
+"""
+Per-unit values patched into the HEX image at upload time
+"""
+
+import pytest
+
+from builder.core.hex_patch import (
+    PATCHED_HEX_NAME,
+    HexPatchError,
+    advance_counters,
+    apply_patches,
+    parse_hex_patches,
+    resolve_values,
+    write_patched_firmware,
+)
+from builder.core.hexfile import EEPROM_WORD, HexImage
+
+MIDRANGE = {"flash": (0, 0x800), "eeprom": (EEPROM_WORD, 128), "config": (0x2007, 2)}
+BASELINE = {"flash": (0, 0x800), "config": (0xFFF, 1)}
+
+
+def firmware(words):
+    """Image holding ``words`` from address 0."""
+    image = HexImage()
+    for address, word in enumerate(words):
+        image.set_word(address, word)
+    return image
+
+
+def patch(text, values, image=None, regions=MIDRANGE, baseline=False):
+    patches = parse_hex_patches(text)
+    return apply_patches(image or HexImage(), patches, values, regions, baseline)
+
+
+def test_parse():
+    patches = parse_hex_patches("""
+        serial  eeprom:0x00   4  counter:serial.txt   ; comment
+        # whole line comment
+        osccal  flash:0x1FF0  2  env:OSCCAL
+        trim    word:0x1FFE   1  0x2A5
+        """)
+    assert [(p.name, p.space, p.address, p.size) for p in patches] == [
+        ("serial", "eeprom", 0, 4),
+        ("osccal", "flash", 0x1FF0, 2),
+        ("trim", "word", 0x1FFE, 1),
+    ]
+    assert patches[0].counter_file == "serial.txt"
+    assert patches[1].counter_file is None
+    assert [p.bits for p in patches] == [32, 16, 14]
+
+
+@pytest.mark.parametrize(
+    "text, message",
+    [
+        ("serial eeprom:0 4", "expected <name>"),
+        ("serial ram:0 4 1", "location must be"),
+        ("serial eeprom:zero 4 1", "invalid address or size"),
+        ("serial eeprom:0 0 1", "size must be at least 1"),
+        ("a eeprom:0 1 1\na eeprom:4 1 1", "several patches named a"),
+        ("a eeprom:0 4 1\nb eeprom:3 1 1", "b overlaps a"),
+        ("a flash:0x10 2 1\nb word:0x11 1 1", "b overlaps a"),
+    ],
+)
+def test_parse_errors(text, message):
+    with pytest.raises(HexPatchError, match=message):
+        parse_hex_patches(text)
+
+
+def test_eeprom_and_flash_may_share_addresses():
+    assert len(parse_hex_patches("a eeprom:0 4 1\nb flash:0 4 1")) == 2
+
+
+def test_eeprom_bytes_are_little_endian():
+    image = patch("serial eeprom:0x10 3 1", {"serial": 0x123456})
+    assert image.words(EEPROM_WORD + 0x10, 3) == [0x56, 0x34, 0x12]
+
+
+def test_flash_bytes_become_retlw():
+    placeholder = firmware([0x0000] * 0x10 + [0x3400, 0x3400])
+    image = patch("osccal flash:0x10 2 0", {"osccal": 0xBEEF}, placeholder)
+    assert image.words(0x10, 2) == [0x34EF, 0x34BE]
+    # The original image is left alone
+    assert placeholder.words(0x10, 2) == [0x3400, 0x3400]
+
+
+def test_words_on_midrange_and_baseline_parts():
+    image = patch("trim word:0x100 2 0", {"trim": 0x2A5 | 0x1234 << 14})
+    assert image.words(0x100, 2) == [0x2A5, 0x1234]
+
+    image = patch(
+        "trim word:0x100 2 0", {"trim": 0x2A5 | 0x123 << 12}, None, BASELINE, True
+    )
+    assert image.words(0x100, 2) == [0x2A5, 0x123]
+    image = patch("osccal flash:0x100 1 0", {"osccal": 0x5A}, None, BASELINE, True)
+    assert image.get_word(0x100) == 0x85A
+
+
+def test_baseline_placeholders():
+    image = firmware([0x0FFF, 0x0800])
+    patched = patch("cal flash:0 2 0", {"cal": 0x0102}, image, BASELINE, True)
+    assert patched.words(0, 2) == [0x802, 0x801]
+    with pytest.raises(HexPatchError, match="holds code"):
+        patch("cal flash:0 2 0", {"cal": 0}, firmware([0x3FFF, 0x3400]), BASELINE, True)
+
+
+def test_code_is_not_overwritten():
+    with pytest.raises(HexPatchError, match=r"word 0x0001 holds code \(0x2805\)"):
+        patch("cal flash:0 2 0", {"cal": 0}, firmware([0x3400, 0x2805]))
+
+
+@pytest.mark.parametrize(
+    "text, values, regions, message",
+    [
+        ("s eeprom:0x7E 4 0", {"s": 1}, MIDRANGE, "is past its 128 bytes"),
+        ("s eeprom:0 1 0", {"s": 1}, BASELINE, "no data EEPROM known"),
+        ("s flash:0x7FF 2 0", {"s": 1}, MIDRANGE, "past the 2048 words of flash"),
+        ("s word:0 1 0", {"s": 1 << 14}, MIDRANGE, "does not fit in 1 14-bit words"),
+    ],
+)
+def test_patch_errors(text, values, regions, message):
+    with pytest.raises(HexPatchError, match=message):
+        patch(text, values, regions=regions)
+
+
+def test_baseline_word_size():
+    with pytest.raises(HexPatchError, match="does not fit in 1 12-bit words"):
+        patch("s word:0 1 0", {"s": 1 << 12}, None, BASELINE, True)
+
+
+def test_resolve_values(tmp_path):
+    patches = parse_hex_patches("""
+        serial eeprom:0 2 counter:serial.txt
+        osccal flash:0x100 1 env:OSCCAL
+        trim word:0x200 1 0x2A5
+        """)
+    values = resolve_values(patches, tmp_path, {"OSCCAL": "0x34"})
+    assert values == {"serial": 1, "osccal": 0x34, "trim": 0x2A5}
+
+    advance_counters(patches, values, tmp_path)
+    assert (tmp_path / "serial.txt").read_text() == "2\n"
+    assert resolve_values(patches, tmp_path, {"OSCCAL": "0"})["serial"] == 2
+
+
+@pytest.mark.parametrize(
+    "value, environ, message",
+    [
+        ("env:OSCCAL", {}, r"\$OSCCAL is not set"),
+        ("env:OSCCAL", {"OSCCAL": "high"}, "'high' is not a number"),
+        ("256", {}, "256 does not fit in 1 bytes"),
+    ],
+)
+def test_resolve_errors(tmp_path, value, environ, message):
+    patches = parse_hex_patches(f"osccal flash:0x100 1 {value}")
+    with pytest.raises(HexPatchError, match=message):
+        resolve_values(patches, tmp_path, environ)
+
+
+def test_write_patched_firmware(tmp_path):
+    hex_path = tmp_path / "firmware.hex"
+    hex_path.write_text(firmware([0x2800]).to_text())
+    patches = parse_hex_patches("serial eeprom:0 2 counter:serial.txt")
+    (tmp_path / "serial.txt").write_text("0x0102\n")
+
+    values = write_patched_firmware(hex_path, patches, MIDRANGE, tmp_path, {})
+    assert values == {"serial": 0x0102}
+    image = HexImage.load(tmp_path / PATCHED_HEX_NAME)
+    assert image.get_word(0) == 0x2800
+    assert image.words(EEPROM_WORD, 2) == [0x02, 0x01]
+    # Only a successful upload advances the counter
+    assert (tmp_path / "serial.txt").read_text() == "0x0102\n"
@@ -0,0 +1,113 @@
+"""
+Intel HEX reading and writing, and the memory regions of a board
+"""
+
+import pytest
+
+from builder.core.hexfile import (
+    CONFIG_WORD,
+    EEPROM_WORD,
+    HexFormatError,
+    HexImage,
+    memory_regions,
+)
+from builder.core.toolchain import XC8Toolchain
+
+# Two program words, the configuration word and one EEPROM byte, as XC8
+# writes them (byte addresses, extended linear address record)
+FIRMWARE_HEX = """\
+:040000008A110A1245
+:02400E00723FFF
+:02420000AB0011
+:00000001FF
+"""
+
+
+def test_reads_words_at_byte_addresses():
+    image = HexImage.from_text(FIRMWARE_HEX)
+    assert image.words(0, 2) == [0x118A, 0x120A]
+    assert image.get_word(CONFIG_WORD) == 0x3F72
+    assert image.get_word(EEPROM_WORD) & 0xFF == 0xAB
+    assert image.word_addresses() == [0, 1, CONFIG_WORD, EEPROM_WORD]
+
+
+def test_round_trip_recomputes_checksums():
+    image = HexImage.from_text(FIRMWARE_HEX)
+    image.set_word(1, 0x3412)
+    text = image.to_text()
+    for line in text.splitlines():
+        assert sum(bytes.fromhex(line[1:])) & 0xFF == 0
+    again = HexImage.from_text(text)
+    assert again.data == image.data
+    assert again.get_word(1) == 0x3412
+
+
+def test_round_trip_above_64k_uses_extended_addresses():
+    image = HexImage()
+    image.set_word(0x10000, 0x1234)  # byte 0x20000
+    text = image.to_text()
+    assert ":020000040002F8" in text
+    assert HexImage.from_text(text).get_word(0x10000) == 0x1234
+
+
+def test_records_are_split_at_16_bytes():
+    image = HexImage({address: address & 0xFF for address in range(40)})
+    data_records = [line for line in image.to_text().splitlines() if line[7:9] == "00"]
+    assert [int(line[1:3], 16) for line in data_records] == [16, 16, 8]
+
+
+@pytest.mark.parametrize(
+    "text, message",
+    [
+        ("040000008A110A1245\n", "missing ':'"),
+        (":040000008A110A1246\n", "bad checksum"),
+        (":050000008A110A1245\n", "bad record length"),
+        (":04000000ZZ110A1245\n", "invalid hex digits"),
+    ],
+)
+def test_malformed_input(text, message):
+    with pytest.raises(HexFormatError, match=message):
+        HexImage.from_text(text)
+
+
+def test_region_and_used_words():
+    image = HexImage.from_text(FIRMWARE_HEX)
+    eeprom = image.region(EEPROM_WORD, 256)
+    assert eeprom.word_addresses() == [EEPROM_WORD]
+    assert image.used_words(0, 8) == 2
+
+
+def test_regions_from_upload_info():
+    upload = {
+        "maximum_size": 8192,
+        "info": {
+            "Eeprom": "0x2100",
+            "EepromSize": 256,
+            "Config": "0x2007",
+            "ConfigSize": 1,
+        },
+    }
+    assert memory_regions(upload, "pic16f877a") == {
+        "flash": (0, 8192),
+        "eeprom": (0x2100, 256),
+        "config": (0x2007, 1),
+    }
+
+
+def test_region_defaults_of_the_core(tmp_path):
+    upload = {"maximum_size": 2048}
+    # Unknown EEPROM size without XC8: no region
+    assert memory_regions(upload, "pic16f628a") == {
+        "flash": (0, 2048),
+        "config": (0x2007, 2),
+    }
+    assert memory_regions(upload, "pic16f57") == {
+        "flash": (0, 2048),
+        "config": (0xFFF, 1),
+    }
+
+    proc = tmp_path / "v2.46" / "pic" / "include" / "proc"
+    proc.mkdir(parents=True)
+    (proc / "pic16f628a.h").write_text("#define _EEPROMSIZE 128\n")
+    toolchain = XC8Toolchain(tmp_path / "v2.46")
+    assert memory_regions(upload, "PIC16F628A", toolchain)["eeprom"] == (0x2100, 128)
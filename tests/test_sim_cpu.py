@@ -0,0 +1,330 @@
+"""
+Instruction semantics of the mid-range simulator, scalar and batch
+
+Each program leaves its results in general purpose registers and halts on
+``goto $``; the expected values are checked on ``MidrangeCore`` and the
+same program is then run on a ``BatchCore`` that must agree register for
+register.
+"""
+
+import pytest
+
+from builder.sim import batch as batch_module
+from builder.sim.batch import BatchCore
+from builder.sim.cpu import STATUS, STOP_HALT, STOP_SLEEP, MidrangeCore
+
+requires_numpy = pytest.mark.skipif(
+    batch_module.np is None, reason="batch simulation requires NumPy"
+)
+
+# STATUS bits
+C, DC, Z = 0x01, 0x02, 0x04
+W, F = 0, 1  # destination of byte oriented instructions
+
+PROGRAM_WORDS = 256
+RESULTS = range(0x20, 0x40)
+
+
+# Encodings of the mid-range instructions used below
+
+
+def movlw(k):
+    return 0x3000 | k
+
+
+def addlw(k):
+    return 0x3E00 | k
+
+
+def sublw(k):
+    return 0x3C00 | k
+
+
+def andlw(k):
+    return 0x3900 | k
+
+
+def iorlw(k):
+    return 0x3800 | k
+
+
+def xorlw(k):
+    return 0x3A00 | k
+
+
+def retlw(k):
+    return 0x3400 | k
+
+
+def movwf(f):
+    return 0x0080 | f
+
+
+def clrf(f):
+    return 0x0180 | f
+
+
+def _byte_op(opcode):
+    return lambda f, d: opcode | d << 7 | f
+
+
+addwf, subwf, andwf, iorwf = (_byte_op(op) for op in (0x0700, 0x0200, 0x0500, 0x0400))
+xorwf, comf, decf, incf = (_byte_op(op) for op in (0x0600, 0x0900, 0x0300, 0x0A00))
+movf, decfsz, incfsz = (_byte_op(op) for op in (0x0800, 0x0B00, 0x0F00))
+rlf, rrf, swapf = (_byte_op(op) for op in (0x0D00, 0x0C00, 0x0E00))
+
+
+def _bit_op(opcode):
+    return lambda f, b: opcode | b << 7 | f
+
+
+bcf, bsf, btfsc, btfss = (_bit_op(op) for op in (0x1000, 0x1400, 0x1800, 0x1C00))
+
+
+def call(k):
+    return 0x2000 | k
+
+
+def goto(k):
+    return 0x2800 | k
+
+
+RETURN, SLEEP, NOP = 0x0008, 0x0063, 0x0000
+
+
+def halt(program):
+    """Append ``goto $`` and pad to the program memory size."""
+    program = program + [goto(len(program))]
+    return program + [0x3FFF] * (PROGRAM_WORDS - len(program))
+
+
+def save_status(f):
+    """Copy STATUS to ``f``."""
+    return [movf(STATUS, W), movwf(f)]
+
+
+def run_scalar(program, cycles=10_000):
+    core = MidrangeCore(halt(program))
+    return core, core.run(cycles)
+
+
+def assert_batch_agrees(program, cycles=10_000, count=3):
+    core, reason = run_scalar(program, cycles)
+    batch = BatchCore(MidrangeCore(halt(program)), count)
+    batch.run(cycles)
+    assert batch.stop_reasons() == [reason] * count
+    assert batch.w.tolist() == [core.w] * count
+    for address in [STATUS, *RESULTS]:
+        assert batch.register(address).tolist() == [core.register(address)] * count
+    assert batch.cycles.tolist() == [core.cycles] * count
+
+
+ADD_SUB = [
+    # 0xF0 + 0x20: carry out, no digit carry
+    movlw(0xF0),
+    movwf(0x20),
+    movlw(0x20),
+    addwf(0x20, F),
+    *save_status(0x21),
+    # 0x0F + 0x01: digit carry only
+    movlw(0x0F),
+    addlw(0x01),
+    movwf(0x22),
+    *save_status(0x23),
+    # 0x10 - W(0x10) = 0: zero, no borrow (C set)
+    movlw(0x10),
+    sublw(0x10),
+    movwf(0x24),
+    *save_status(0x25),
+    # 0x05 - W(0x06): borrow (C clear)
+    movlw(0x06),
+    sublw(0x05),
+    movwf(0x26),
+    *save_status(0x27),
+    # f - W with the result in W
+    movlw(0x30),
+    movwf(0x28),
+    movlw(0x10),
+    subwf(0x28, W),
+    movwf(0x29),
+]
+
+
+def test_add_and_subtract_flags():
+    core, reason = run_scalar(ADD_SUB)
+    assert reason == STOP_HALT
+    assert core.register(0x20) == 0x10
+    assert core.register(0x21) & (C | DC | Z) == C
+    assert core.register(0x22) == 0x10
+    assert core.register(0x23) & (C | DC | Z) == DC
+    assert core.register(0x24) == 0x00
+    assert core.register(0x25) & (C | Z) == C | Z
+    assert core.register(0x26) == 0xFF
+    assert core.register(0x27) & C == 0
+    assert core.register(0x28) == 0x30
+    assert core.register(0x29) == 0x20
+
+
+LOGIC = [
+    movlw(0xF0),
+    andlw(0x3C),
+    movwf(0x20),  # 0x30
+    iorlw(0x03),
+    movwf(0x21),  # 0x33
+    xorlw(0x33),
+    movwf(0x22),  # 0x00
+    *save_status(0x23),  # Z
+    movlw(0xA5),
+    movwf(0x24),
+    comf(0x24, F),  # 0x5A
+    swapf(0x24, W),
+    movwf(0x25),  # 0xA5
+    movlw(0x0F),
+    andwf(0x24, F),  # 0x0A
+    iorwf(0x24, W),
+    movwf(0x26),  # 0x0F
+    xorwf(0x24, F),  # 0x05
+    clrf(0x27),
+    *save_status(0x28),  # Z after CLRF
+]
+
+
+def test_logic_operations():
+    core, _ = run_scalar(LOGIC)
+    assert [core.register(a) for a in (0x20, 0x21, 0x22)] == [0x30, 0x33, 0x00]
+    assert core.register(0x23) & Z
+    assert [core.register(a) for a in (0x24, 0x25, 0x26)] == [0x05, 0xA5, 0x0F]
+    assert core.register(0x27) == 0 and core.register(0x28) & Z
+
+
+ROTATE = [
+    bsf(STATUS, 0),  # C = 1
+    movlw(0x81),
+    movwf(0x20),
+    rlf(0x20, F),  # 0x03, C = 1
+    *save_status(0x21),
+    bcf(STATUS, 0),
+    movlw(0x81),
+    movwf(0x22),
+    rrf(0x22, F),  # 0x40, C = 1
+    *save_status(0x23),
+    rrf(0x22, W),  # 0xA0, C = 0
+    movwf(0x24),
+]
+
+
+def test_rotates_through_carry():
+    core, _ = run_scalar(ROTATE)
+    assert core.register(0x20) == 0x03 and core.register(0x21) & C
+    assert core.register(0x22) == 0x40 and core.register(0x23) & C
+    assert core.register(0x24) == 0xA0 and not core.register(STATUS) & C
+
+
+# Counts down from 5 with DECFSZ, adding 3 each pass
+LOOP = [
+    movlw(5),
+    movwf(0x20),
+    clrf(0x21),
+    movlw(3),
+    addwf(0x21, F),  # 4: loop
+    decfsz(0x20, F),
+    goto(4),
+    # INCFSZ skips when the result wraps to zero
+    movlw(0xFF),
+    movwf(0x22),
+    incfsz(0x22, F),
+    incf(0x23, F),  # skipped
+    incf(0x24, F),
+    btfss(0x24, 0),  # bit 0 set: skip
+    incf(0x25, F),
+    btfsc(0x25, 0),  # bit 0 clear: skip
+    incf(0x26, F),
+    decf(0x26, F),
+]
+
+
+def test_skips_and_loop():
+    core, _ = run_scalar(LOOP)
+    assert core.register(0x20) == 0
+    assert core.register(0x21) == 15
+    assert [core.register(a) for a in range(0x22, 0x27)] == [0, 0, 1, 0, 0xFF]
+
+
+# CALL/RETURN and a RETLW lookup table
+CALLS = [
+    movlw(2),
+    call(8),  # table, W = 0x22
+    movwf(0x20),
+    call(12),  # subroutine
+    movwf(0x21),
+    goto(16),
+    NOP,
+    NOP,
+    0x0782,  # 8: addwf PCL,f
+    retlw(0x11),
+    retlw(0x00),
+    retlw(0x22),
+    movlw(0x42),  # 12: subroutine
+    RETURN,
+    NOP,
+    NOP,
+]
+
+
+def test_call_return_and_table():
+    core, _ = run_scalar(CALLS)
+    assert core.register(0x20) == 0x22
+    assert core.register(0x21) == 0x42
+    assert core.sp == 0
+
+
+# Indirect addressing and bank selection
+INDIRECT = [
+    movlw(0x30),
+    movwf(0x04),  # FSR
+    movlw(0x99),
+    movwf(0x00),  # INDF -> 0x30
+    incf(0x04, F),
+    movlw(0x77),
+    movwf(0x00),  # INDF -> 0x31
+    bsf(STATUS, 5),  # RP0: bank 1
+    movlw(0x55),
+    movwf(0x20),  # 0xA0
+    bcf(STATUS, 5),
+    movf(0x20, W),  # bank 0: 0x20 untouched
+    movwf(0x32),
+]
+
+
+def test_indirect_and_banked_access():
+    core, _ = run_scalar(INDIRECT)
+    assert core.register(0x30) == 0x99
+    assert core.register(0x31) == 0x77
+    assert core.register(0xA0) == 0x55
+    assert core.register(0x32) == 0x00
+
+
+def test_sleep_stops_the_core():
+    core, reason = run_scalar([movlw(1), SLEEP])
+    assert reason == STOP_SLEEP
+    assert core.w == 1
+
+
+@requires_numpy
+@pytest.mark.parametrize(
+    "program",
+    [ADD_SUB, LOGIC, ROTATE, LOOP, CALLS, INDIRECT],
+    ids=["add-sub", "logic", "rotate", "loop", "calls", "indirect"],
+)
+def test_batch_matches_scalar(program):
+    assert_batch_agrees(program)
+
+
+@requires_numpy
+def test_batch_instances_follow_their_inputs():
+    # W = register 0x20 + 1, each instance preset differently
+    program = [incf(0x20, W), movwf(0x21)]
+    batch = BatchCore(MidrangeCore(halt(program)), 4)
+    batch.set_register(0x20, [0, 1, 0x7F, 0xFF])
+    batch.run(1000)
+    assert batch.register(0x21).tolist() == [1, 2, 0x80, 0x00]
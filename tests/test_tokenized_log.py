@@ -0,0 +1,177 @@
+"""
+PIC_LOG() calls found in C sources, and their frames decoded on the host
+"""
+
+import pytest
+
+from builder.core.tokenized_log import (
+    ARG_TYPES,
+    FRAME_START,
+    MAX_FRAME,
+    LogDecoder,
+    LogFormatError,
+    assign_tokens,
+    find_log_calls,
+    host_format,
+    parse_format,
+    rewrite_calls,
+    token_of,
+)
+
+SOURCE = r"""#include <xc.h>
+#define TRACE(x) PIC_LOG("in macro %u", x)
+
+// PIC_LOG("commented out %u", 1);
+/* PIC_LOG("commented out %s", "too"); */
+static const char *text = "PIC_LOG(\"in a string\")";
+
+void main(void)
+{
+    PIC_LOG("boot\n");
+    PIC_LOG("adc=%u temp=%d",
+            adc_read(0),
+            (int)(temp - 40));
+    PIC_LOG("name=" "%s" " id=%lx\n", name, id);
+    PIC_LOG("%hhd%%", level);
+    MY_PIC_LOG("not ours %u", 1);
+}
+"""
+
+
+def table_of(calls):
+    """String table as the logs stage writes it."""
+    tokens = assign_tokens([call.format for call in calls])
+    return {
+        "frame_start": FRAME_START,
+        "tokens": {
+            str(tokens[call.format]): {
+                "format": call.format,
+                "args": call.types,
+                "sites": [f"main.c:{call.line}"],
+            }
+            for call in calls
+        },
+    }
+
+
+def frame(format_string, types, *values):
+    """Bytes the target sends for one call."""
+    data = bytearray([FRAME_START])
+    data += token_of(format_string).to_bytes(2, "little")
+    for kind, value in zip(types, values):
+        if kind == "str":
+            data += value.encode("latin-1") + b"\0"
+        else:
+            size, signed = ARG_TYPES[kind]
+            data += value.to_bytes(size, "little", signed=signed)
+    return bytes(data)
+
+
+def test_finds_calls_outside_comments_strings_and_directives():
+    calls = find_log_calls(SOURCE)
+    assert [(call.line, call.format) for call in calls] == [
+        (10, "boot\n"),
+        (11, "adc=%u temp=%d"),
+        (14, "name=%s id=%lx\n"),
+        (15, "%hhd%%"),
+    ]
+    assert [call.types for call in calls] == [
+        [],
+        ["u16", "i16"],
+        ["str", "u32"],
+        ["i8"],
+    ]
+    assert [arg.strip() for arg in calls[1].args] == ["adc_read(0)", "(int)(temp - 40)"]
+    for call in calls:
+        assert SOURCE[call.start : call.end].startswith("PIC_LOG(")
+        assert SOURCE[call.start : call.end].endswith(")")
+
+
+@pytest.mark.parametrize(
+    "source, message",
+    [
+        ('\nPIC_LOG("a=%u b=%u", a);', r"^2: 2 argument\(s\) expected"),
+        ('PIC_LOG("a", a);', r"^1: 0 argument\(s\) expected"),
+        ("PIC_LOG(fmt, a);", "needs a string literal format"),
+        ('PIC_LOG("%f", x);', "unsupported conversion '%f'"),
+        ('PIC_LOG("%u", x', "unterminated PIC_LOG"),
+    ],
+)
+def test_malformed_calls(source, message):
+    with pytest.raises(LogFormatError, match=message):
+        find_log_calls(source)
+
+
+@pytest.mark.parametrize(
+    "format_string, types",
+    [
+        ("%c%hhu%hu%u%lu", ["u8", "u8", "u16", "u16", "u32"]),
+        ("%-5d|%08lX|%p|%s", ["i16", "u32", "u16", "str"]),
+        ("100%%", []),
+    ],
+)
+def test_argument_types(format_string, types):
+    assert parse_format(format_string) == types
+
+
+def test_host_format():
+    assert host_format("%u/%hhd %08lX %s %%") == "%d/%d %08X %s %%"
+
+
+def test_tokens_are_stable_and_collisions_fail():
+    tokens = assign_tokens(["b", "a", "b"])
+    assert tokens == {"a": token_of("a"), "b": token_of("b")}
+    assert token_of("x987") == token_of("x5420")
+    with pytest.raises(LogFormatError, match="share token 0xD2CA"):
+        assign_tokens(["x987", "x5420"])
+
+
+def test_rewrite_keeps_line_numbers():
+    calls = find_log_calls(SOURCE)
+    tokens = assign_tokens([call.format for call in calls])
+    rewritten = rewrite_calls(SOURCE, calls, tokens)
+    assert rewritten.count("\n") == SOURCE.count("\n")
+    lines = rewritten.splitlines()
+    boot = tokens[calls[0].format]
+    assert lines[9].strip() == f"(pic_log_begin(0x{boot:04X}u));"
+    assert "pic_log_u16((unsigned int)(adc_read(0)))" in lines[10]
+    assert lines[15].strip() == 'MY_PIC_LOG("not ours %u", 1);'
+    assert "PIC_LOG" not in "\n".join(lines[9:15])
+
+
+def test_decoder_round_trip():
+    calls = find_log_calls(SOURCE)
+    decoder = LogDecoder(table_of(calls))
+    boot, adc, name, level = calls
+    stream = b"".join(
+        [
+            b"reset\r\n",
+            frame(boot.format, boot.types),
+            frame(adc.format, adc.types, 1023, -12),
+            b"\n",
+            frame(name.format, name.types, "pump", 0xBEEF),
+            frame(level.format, level.types, -5),
+        ]
+    )
+    expected = "reset\r\nboot\nadc=1023 temp=-12\n\nname=pump id=beef\n-5%\n"
+    assert decoder.feed(stream) == expected
+
+    # Frames split across reads
+    decoder = LogDecoder(table_of(calls))
+    text = "".join(decoder.feed(stream[i : i + 3]) for i in range(0, len(stream), 3))
+    assert text == expected
+
+
+def test_unknown_and_corrupted_frames():
+    decoder = LogDecoder({"tokens": {}})
+    assert decoder.feed(bytes([FRAME_START, 0x34, 0x12]) + b"ok") == (
+        "<unknown log token 0x1234>\nok"
+    )
+
+    call = find_log_calls('PIC_LOG("%s", s);')[0]
+    decoder = LogDecoder(table_of([call]))
+    # A string that never ends is dropped after MAX_FRAME bytes
+    text = decoder.feed(
+        frame(call.format, call.types, "a" * (MAX_FRAME - 2))[:-1] + b"x"
+    )
+    assert text == "<corrupted log frame>\nx"